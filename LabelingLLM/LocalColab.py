@@ -1,12 +1,28 @@
-import re
-
+import argparse
 import requests
 import json
+import math
 import time
 import os
+import sys
 import subprocess
-from bs4 import BeautifulSoup
 import logging
+from contextlib import ExitStack
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # Moduli condivisi con il crawler
+
+from metrics import METRICS, profiling
+from search_index import DEFAULT_INDEX_PATH, SearchIndex
+from cache_llm import CacheRisultatiLLM
+from duplicati import IndiceDuplicati, canonicalizza_url
+from estrazione import dividi_in_blocchi, estrai_contenuto_principale, stima_token
+from pipeline import LimitatoreHost, Stadio, esegui_pipeline
+from prefiltro import Prefiltro
+from registro_risultati import CONFERMATO, SCARTATO, RegistroRisultati, compatta
+from ricerca import RISULTATI_PER_PAGINA, RicercaGoogle
+from scheduler_ollama import SchedulerOllama
+from risposta_ollama import CATEGORIE, SCHEMA_RISPOSTA, EsitoAnalisi, ParserRispostaOllama, esito_da_json
 
 # Configurazione del logging
 logging.basicConfig(
@@ -20,9 +36,31 @@ API_KEY = None
 CX = None
 URL_SEARCH = "https://www.googleapis.com/customsearch/v1"
 
+PARALLELISMO_DOWNLOAD = 8  # Pagine scaricate contemporaneamente
+PARALLELISMO_LLM = 1  # Richieste contemporanee a Ollama (aumentare solo con OLLAMA_NUM_PARALLEL > 1)
+INTERVALLO_HOST = 1.0  # Secondi minimi tra due richieste allo stesso sito
+
+VAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ObsidianNotes")  # Note seme del prefiltro
+LOTTO_PREFILTRO = 32  # Documenti valutati insieme dal prefiltro
+BUDGET_TOKEN = 1500  # Token stimati di testo inviati a Ollama per ogni richiesta
+MAX_BLOCCHI = 1  # Blocchi da BUDGET_TOKEN analizzati per documento (1 = testo troncato)
+
+URL_OLLAMA = "http://127.0.0.1:11434/api/generate"
+ENDPOINT_OLLAMA = ["http://127.0.0.1:11434"]  # Istanze usate da main(); configurabili con OLLAMA_ENDPOINTS
+MODELLO_OLLAMA = "deepseek-r1:8b"
+MODALITA = ("testo", "json")
+MODALITA_OLLAMA = "testo"  # "json" usa l'output vincolato da schema (vedi interroga_ollama_json)
+VERSIONE_PROMPT = 1  # Da incrementare a ogni modifica del prompt: invalida i risultati in cache
+VERSIONE_PROMPT_JSON = 1  # Come VERSIONE_PROMPT, per il prompt della modalità JSON
+NUM_PREDICT_JSON = 128  # Token massimi generati in modalità JSON: il record è breve
+KEEP_ALIVE = "30m"  # Permanenza in memoria del modello tra le richieste in modalità JSON
+
+PERCORSO_REGISTRO = "risultati_filtrati.jsonl"  # Esiti scritti man mano, per riprendere le esecuzioni interrotte
+PERCORSO_INDICE_TESTI = DEFAULT_INDEX_PATH  # Testi estratti, nello stesso indice di search_index.py
+
 # Funzione per caricare la configurazione da JSON
 def carica_configurazione():
-    global API_KEY, CX
+    global API_KEY, CX, ENDPOINT_OLLAMA
     config_path = "config/myconfig.json"  # Percorso del file di configurazione
 
     try:
@@ -30,6 +68,7 @@ def carica_configurazione():
             config = json.load(f)
             API_KEY = config.get("API_KEY_GOOGLE") # Utilizza .get() per evitare errori se la chiave manca
             CX = config.get("CX_GOOGLE")           # Utilizza .get() per evitare errori se la chiave manca
+            ENDPOINT_OLLAMA = config.get("OLLAMA_ENDPOINTS", ENDPOINT_OLLAMA)  # Facoltativo: più istanze di Ollama
 
             if not API_KEY or not CX:
                 raise ValueError("API_KEY_GOOGLE o CX_GOOGLE non trovate nel file di configurazione.")
@@ -46,55 +85,54 @@ def carica_configurazione():
         logger.error(f"Errore di configurazione: {e}")
         exit(1) # Esci dal programma con codice di errore
 
-def cerca_casi(categoria, query, num_results=1):
-    """Esegue la ricerca su Google Custom Search e restituisce una lista di risultati."""
-    params = {
-        "key": API_KEY,
-        "cx": CX,
-        "q": query,
-        #"num": num_results
-    }
+def cerca_casi(categoria, query, num_results=1, ricerca=None):
+    """Esegue la ricerca su Google Custom Search e restituisce una lista di risultati.
+
+    `num_results` è arrotondato a pagine intere da RISULTATI_PER_PAGINA risultati, tutte
+    restituite. Con una RicercaGoogle già aperta vengono usate la sua cache e la sua quota;
+    altrimenti ne viene creata una per la sola ricerca.
+    """
+    profondita = max(1, math.ceil(num_results / RISULTATI_PER_PAGINA))
+    if ricerca is not None:
+        return ricerca.cerca(categoria, query, profondita)
+    ricerca = RicercaGoogle(API_KEY, CX, url=URL_SEARCH)
     try:
-        logger.info(f"Ricerca su Google Custom Search: {query} ({categoria})...")
-        logger.debug(f"API_KEY: {API_KEY}, CX: {CX}")  # Debug log for API_KEY and CX
-        response = requests.get(URL_SEARCH, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        risultati = []
-        if "items" in data:
-            for item in data["items"]:
-                risultati.append({
-                    "categoria": categoria,
-                    "titolo": item["title"],
-                    "link": item["link"],
-                    "descrizione": item.get("snippet", "N/A")
-                })
-        logger.info(f"Trovati {len(risultati)} risultati per '{query}'.")
-        return risultati
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Errore durante la ricerca per '{query}': {e}")
-        return []
-
-def estrai_testo_da_url(url):
-    """Estrae il testo da una pagina web utilizzando Beautiful Soup."""
+        return ricerca.cerca(categoria, query, profondita)
+    finally:
+        ricerca.chiudi()
+
+def scarica_pagina(url):
+    """Scarica una pagina web e ne restituisce il contenuto HTML grezzo, o None in caso di errore."""
+    host = urlparse(url).netloc
+    inizio = time.perf_counter()
     try:
-        logger.info(f"Estrazione del testo da: {url}")
+        logger.info(f"Download della pagina: {url}")
         response = requests.get(url, timeout=10)  # Timeout di 10 secondi
+        METRICS.observe("http_request_seconds", time.perf_counter() - inizio, host=host)
+        METRICS.incr("http_requests_total", host=host, status=response.status_code)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        # Rimuovi script, stili e altri elementi non testuali
-        for script in soup(["script", "style"]):
-            script.extract()
-        testo = soup.get_text()
-        logger.info(f"Testo estratto con successo.")
-        return testo.strip()
+        METRICS.incr("http_response_bytes_total", len(response.content), host=host)
+        return response.content
 
     except requests.exceptions.RequestException as e:
+        if e.response is None:
+            METRICS.incr("http_requests_total", host=host, status="error")
         logger.error(f"Errore nel recupero della pagina {url}: {e}")
         return None
 
+def estrai_testo_da_html(contenuto):
+    """Estrae il testo del contenuto principale di un documento HTML, senza menu e piè di pagina."""
+    return estrai_contenuto_principale(contenuto)
+
+def estrai_testo_da_url(url):
+    """Estrae il testo del contenuto principale da una pagina web."""
+    contenuto = scarica_pagina(url)
+    if contenuto is None:
+        return None
+    testo = estrai_testo_da_html(contenuto)
+    logger.info(f"Testo estratto con successo.")
+    return testo
+
 def estrai_informazione(testo, chiave):
     """Estrae un'informazione specifica da un testo usando una chiave."""
     try:
@@ -157,15 +195,18 @@ def analizza_con_ollama_old(testo):
         logger.error(f"Errore nella decodifica della risposta JSON di Ollama: {e}")
         return False, None, None
 
-def analizza_con_ollama(testo):
-    """Interroga Ollama per categorizzare il testo e estrarre informazioni, gestendo lo streaming JSON."""
-    headers = {'Content-Type': 'application/json'}
-    testo_generato_completo = "" # Inizializza la stringa per il testo completo
+def interroga_ollama_testo(testo, sessione=requests, url=None):
+    """Interroga Ollama in streaming chiedendo le righe "Risposta:", "Titolo:", "Luogo:" e "Data:".
 
-    try:
-        data = {
-            "model": "deepseek-r1:8b",  # Modello Ollama (corretto, senza spazi finali)
-            "prompt": f"""Sono un bot, non sono un umano e ti sto usando per analizzare delle informazioni automaticamente.
+    La risposta viene analizzata man mano da ParserRispostaOllama e la generazione si interrompe
+    appena l'esito è definitivo. `sessione` permette di riutilizzare le connessioni di una
+    requests.Session; `url` è l'endpoint /api/generate (predefinito: URL_OLLAMA).
+    Restituisce un EsitoAnalisi.
+    """
+    headers = {'Content-Type': 'application/json'}
+    data = {
+        "model": MODELLO_OLLAMA,  # Modello Ollama (corretto, senza spazi finali)
+        "prompt": f"""Sono un bot, non sono un umano e ti sto usando per analizzare delle informazioni automaticamente.
                 Analizza il seguente testo e determina se si tratta di un caso di:
                 Vatican Murder, Disappearance, Politics, Serial Killers, Massacre, Mafia, Conspiracy, Misc.
 
@@ -180,55 +221,153 @@ def analizza_con_ollama(testo):
                 Testo da analizzare:
                 {testo}
             """,
-            "stream": True # Abilita lo streaming esplicito
-        }
-
-        logger.info(f"Inviando richiesta a Ollama per analizzare il testo (streaming)...")
-        with requests.post("http://127.0.0.1:11434/api/generate", headers=headers, json=data, stream=True) as response: # stream=True QUI!
-            response.raise_for_status()  # Lancia un'eccezione se la richiesta fallisce (es. 404, 500)
-
-            for line in response.iter_lines():
-                if line: # Salta linee vuote
-                    line_decoded = line.decode('utf-8') # Decodifica i byte in stringa UTF-8
-                    #logger.debug(f"Linea JSON ricevuta da Ollama: {line_decoded}") # Log di debug per ogni linea JSON
-
-                    try:
-                        oggetto_json = json.loads(line_decoded) # Parsifica la linea come JSON
-                        testo_parziale = oggetto_json.get("response", "") # Estrai la parte 'response' (testo parziale)
-                        testo_generato_completo += testo_parziale # Concatenala al testo completo
-
-                        if oggetto_json.get("done"): # Se 'done' è True, fine dello streaming
-                            logger.info("Streaming Ollama completato.")
-                            break # Esci dal loop di lettura delle linee
-
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Errore decodifica JSON per linea: {e}")
-                        logger.error(f"Linea non parsificabile: {line_decoded}")
-                        continue # Passa alla linea successiva, continuando lo streaming
-
-        logger.info("Richiesta a Ollama completata con successo (streaming gestito).")
-        logger.debug(f"Testo generato completo da Ollama:\n----\n{testo_generato_completo}\n----")
-
-        # **RIMUOVI LA SEZIONE <think>...</think> con regex**
-        testo_pulito = re.sub(r"<think>.*?</think>", "", testo_generato_completo, flags=re.DOTALL)  # Regex per rimuovere <think>...</think>
-        testo_pulito = testo_pulito.strip()  # Rimuove spazi extra all'inizio e alla fine
-
-        logger.debug(f"Testo generato completo da Ollama (DOPO la rimozione <think>):\n----\n{testo_pulito}\n----")  # Log DOPO la rimozione
-
-        # Analizza la risposta del modello per estrarre le informazioni (ORA SUL TESTO COMPLETO)
-        model_response = testo_pulito # Usa il testo completo ricostruito
-        logger.info(f"Risposta del modello (testo completo):\n----\n{model_response}\n----")
-
-        if "Si" in model_response:
-            titolo = estrai_informazione(model_response, "Titolo:")
-            luogo = estrai_informazione(model_response, "Luogo:")
-            data_caso = estrai_informazione(model_response, "Data:")
-            logger.info(f"Caso confermato. Titolo:{titolo}, Luogo: {luogo}, Data: {data_caso}")
-            return True, luogo, data_caso
-        else:
-            logger.info("Caso rigettato.")
-            return False, None, None
+        "stream": True # Abilita lo streaming esplicito
+    }
 
+    logger.info(f"Inviando richiesta a Ollama per analizzare il testo (streaming)...")
+    inizio = time.monotonic()
+    statistiche = {}
+    parser = ParserRispostaOllama()  # Riconosce i campi della risposta man mano che arrivano
+    with sessione.post(url or URL_OLLAMA, headers=headers, json=data, stream=True) as response: # stream=True QUI!
+        response.raise_for_status()  # Lancia un'eccezione se la richiesta fallisce (es. 404, 500)
+
+        for line in response.iter_lines():
+            if line: # Salta linee vuote
+                line_decoded = line.decode('utf-8') # Decodifica i byte in stringa UTF-8
+
+                try:
+                    oggetto_json = json.loads(line_decoded) # Parsifica la linea come JSON
+                except json.JSONDecodeError as e:
+                    logger.error(f"Errore decodifica JSON per linea: {e}")
+                    logger.error(f"Linea non parsificabile: {line_decoded}")
+                    continue # Passa alla linea successiva, continuando lo streaming
+
+                if parser.aggiungi(oggetto_json.get("response", "")):
+                    # Risposta definitiva: uscendo dal blocco la connessione viene chiusa
+                    # e Ollama interrompe la generazione
+                    logger.info(f"Risposta definitiva dopo {parser.frammenti} frammenti, generazione interrotta.")
+                    break
+
+                if oggetto_json.get("done"): # Se 'done' è True, fine dello streaming
+                    statistiche = oggetto_json  # L'ultimo messaggio riporta i conteggi dei token
+                    logger.info("Streaming Ollama completato.")
+                    break # Esci dal loop di lettura delle linee
+
+    parser.termina()
+    logger.info("Richiesta a Ollama completata con successo (streaming gestito).")
+
+    # Il blocco <think>...</think> è già stato scartato dal parser
+    model_response = parser.testo
+    logger.info(f"Risposta del modello:\n----\n{model_response}\n----")
+
+    esito = parser.esito()
+    esito.token_prompt = statistiche.get("prompt_eval_count")
+    esito.token_generati = statistiche.get("eval_count", parser.frammenti)
+    esito.durata = time.monotonic() - inizio
+    return esito
+
+def interroga_ollama_json(testo, sessione=requests, url=None):
+    """Interroga Ollama con output vincolato dallo schema JSON SCHEMA_RISPOSTA.
+
+    Il modello può produrre solo il record {caso, categoria, titolo, luogo, data}: niente
+    ragionamento né testo libero da interpretare, con al più NUM_PREDICT_JSON token generati.
+    `sessione` e `url` come in interroga_ollama_testo. Restituisce un EsitoAnalisi.
+    """
+    data = {
+        "model": MODELLO_OLLAMA,
+        "prompt": f"""Sono un bot e ti sto usando per analizzare delle informazioni automaticamente.
+Determina se il seguente testo descrive un caso di cronaca di una di queste categorie:
+{", ".join(CATEGORIE)}.
+Rispondi con un oggetto JSON: "caso" è true se il testo descrive uno di questi casi, altrimenti false;
+se è true indica "categoria", "titolo" del caso, "luogo" e "data" (formato YYYY-MM-DD-hh-mm, se disponibile),
+altrimenti lascia questi campi vuoti.
+
+Testo da analizzare:
+{testo}
+""",
+        "format": SCHEMA_RISPOSTA,
+        "stream": False,
+        "keep_alive": KEEP_ALIVE,  # Il modello resta caricato tra un documento e il successivo
+        "options": {"num_predict": NUM_PREDICT_JSON, "temperature": 0},
+    }
+    logger.info(f"Inviando richiesta a Ollama per analizzare il testo (output JSON)...")
+    inizio = time.monotonic()
+    response = sessione.post(url or URL_OLLAMA, json=data)
+    response.raise_for_status()
+    risposta_ollama = response.json()
+    logger.debug(f"Risposta del modello (JSON): {risposta_ollama.get('response')}")
+
+    esito = esito_da_json(risposta_ollama.get("response", ""))
+    if esito.errore_formato:
+        logger.warning(f"Risposta JSON di Ollama non valida: {risposta_ollama.get('response')!r}")
+    esito.token_prompt = risposta_ollama.get("prompt_eval_count")
+    esito.token_generati = risposta_ollama.get("eval_count")
+    esito.durata = time.monotonic() - inizio
+    return esito
+
+def classifica_testo(testo, cache=None, modalita=MODALITA_OLLAMA, scheduler=None):
+    """Interroga Ollama per categorizzare il testo e estrarre informazioni.
+
+    `modalita` è "testo" (risposta a righe in streaming, vedi interroga_ollama_testo) oppure
+    "json" (output vincolato da uno schema, vedi interroga_ollama_json). Restituisce un
+    EsitoAnalisi; gli errori di comunicazione con Ollama vengono propagati come
+    requests.exceptions.RequestException, così che non siano scambiati per un "No".
+    Se viene passata una CacheRisultatiLLM, un testo già analizzato con lo stesso modello e
+    la stessa versione del prompt non viene inviato di nuovo a Ollama. Con uno SchedulerOllama
+    la richiesta va all'istanza meno carica ed è ripetuta su un'altra in caso di errore.
+    """
+    if modalita not in MODALITA:
+        raise ValueError(f"Modalità di analisi non supportata: {modalita}")
+    versione_prompt = VERSIONE_PROMPT if modalita == "testo" else f"json-{VERSIONE_PROMPT_JSON}"
+    if cache is not None:
+        risultato_in_cache = cache.leggi(testo, MODELLO_OLLAMA, versione_prompt)
+        METRICS.incr("cache_lookups_total", cache="llm", result="miss" if risultato_in_cache is None else "hit")
+        if risultato_in_cache is not None:
+            logger.info("Risultato trovato nella cache LLM, analisi saltata.")
+            caso_confermato, luogo, data_caso = risultato_in_cache
+            return EsitoAnalisi(caso_confermato, luogo=luogo, data=data_caso, da_cache=True)
+
+    interroga = interroga_ollama_testo if modalita == "testo" else interroga_ollama_json
+    if scheduler is None:
+        esito = interroga(testo)
+    else:
+        esito = scheduler.esegui(lambda sessione, url_base: interroga(testo, sessione, f"{url_base}/api/generate"))
+    METRICS.observe("llm_request_seconds", esito.durata, mode=modalita)
+    METRICS.incr("llm_tokens_total", esito.token_prompt or 0, kind="prompt")
+    METRICS.incr("llm_tokens_total", esito.token_generati or 0, kind="generated")
+    if esito.errore_formato:
+        METRICS.incr("llm_format_errors_total", mode=modalita)
+    if cache is not None and not esito.errore_formato:
+        # Solo le risposte valide effettivamente ricevute: errori di rete e di formato non vengono memorizzati
+        cache.salva(testo, MODELLO_OLLAMA, versione_prompt, *esito.tupla())
+    if esito.caso_confermato:
+        logger.info(f"Caso confermato. Titolo:{esito.titolo}, Luogo: {esito.luogo}, Data: {esito.data}")
+    else:
+        logger.info("Caso rigettato.")
+    return esito
+
+def classifica_documento(testo, cache=None, budget_token=BUDGET_TOKEN, max_blocchi=MAX_BLOCCHI,
+                         modalita=MODALITA_OLLAMA, scheduler=None):
+    """Classifica un documento rispettando il budget di token del prompt.
+
+    Il testo viene diviso in blocchi da `budget_token` token: se ne analizzano al più
+    `max_blocchi`, fermandosi al primo che conferma il caso (il cui esito vale per il
+    documento). Con `max_blocchi`=1 il testo viene semplicemente troncato.
+    """
+    blocchi = dividi_in_blocchi(testo, budget_token)[:max_blocchi]
+    if stima_token(testo) > budget_token:
+        logger.info(f"Testo di circa {stima_token(testo)} token: analizzati {len(blocchi)} blocchi da {budget_token}.")
+    esito = EsitoAnalisi(False)
+    for blocco in blocchi:
+        esito = classifica_testo(blocco, cache=cache, modalita=modalita, scheduler=scheduler)
+        if esito.caso_confermato:
+            break
+    return esito
+
+def analizza_con_ollama(testo, cache=None, modalita=MODALITA_OLLAMA):
+    """Come classifica_testo, ma restituisce (caso_confermato, luogo, data) e in caso di errore (False, None, None)."""
+    try:
+        return classifica_testo(testo, cache=cache, modalita=modalita).tupla()
     except requests.exceptions.RequestException as e:
         logger.error(f"Errore nella comunicazione con Ollama: {e}")
         return False, None, None
@@ -236,23 +375,163 @@ def analizza_con_ollama(testo):
         logger.error(f"Errore nella decodifica JSON di Ollama (NON dovrebbe accadere con lo streaming gestito): {e}") # Questo errore NON dovrebbe succedere più
         return False, None, None
 
-def elabora_risultati(risultati):
-    """Elabora i risultati della ricerca, interrogando Ollama per ciascun risultato."""
-    risultati_filtrati = []
+def elabora_risultati(risultati, parallelismo_download=PARALLELISMO_DOWNLOAD, parallelismo_llm=None,
+                      intervallo_host=INTERVALLO_HOST, cache=None, prefiltro=None, indice_duplicati=None,
+                      budget_token=BUDGET_TOKEN, max_blocchi=MAX_BLOCCHI, modalita=MODALITA_OLLAMA,
+                      scheduler=None, registro=None, indice_testi=None):
+    """Elabora i risultati della ricerca, interrogando Ollama per ciascun risultato.
+
+    Download, estrazione del testo e analisi con Ollama sono stadi di una pipeline che lavorano
+    in parallelo: mentre il modello analizza un testo, le pagine successive vengono già scaricate.
+    I risultati confermati sono restituiti nello stesso ordine dell'elaborazione sequenziale.
+    Con un `prefiltro`, i documenti chiaramente estranei vengono scartati senza interrogare Ollama.
+
+    I risultati con lo stesso URL canonico vengono elaborati una sola volta. Con un
+    `indice_duplicati`, anche gli articoli quasi identici (ripubblicati da altri siti) o già
+    analizzati in esecuzioni precedenti condividono l'esito del loro rappresentante.
+    Ogni testo è inviato al modello entro `budget_token` token (vedi classifica_documento).
+    Con uno `scheduler` le analisi sono distribuite sulle sue istanze di Ollama e, se
+    `parallelismo_llm` non è indicato, lo stadio LLM usa tutta la loro capacità.
+
+    Con un RegistroRisultati ogni esito (confermato o scartato) viene scritto su disco appena
+    disponibile e gli URL già presenti nel registro vengono saltati. I documenti non scaricati
+    non vengono registrati, così una ripresa li riprova.
+
+    Con un `indice_testi` (SearchIndex) il testo estratto di ogni documento analizzato viene
+    indicizzato con il suo esito, invece di essere scartato dopo la classificazione.
+    """
+    if parallelismo_llm is None:
+        parallelismo_llm = scheduler.capacita if scheduler is not None else PARALLELISMO_LLM
+    limitatore = LimitatoreHost(intervallo_host)  # Per evitare rate limit dei singoli siti
+
+    # Un lavoro per URL canonico: {'url', 'risultato', 'contenuto', 'testo', 'esito', 'rappresentante'}
+    lavori = {}
     for risultato in risultati:
+        url = canonicalizza_url(risultato['link'])
+        lavori.setdefault(url, {'url': url, 'risultato': risultato})
+    if len(lavori) < len(risultati):
+        logger.info(f"{len(risultati) - len(lavori)} risultati puntano a URL già presenti: analizzati una sola volta.")
+    if registro is not None:
+        gia_elaborati = [url for url in lavori if registro.elaborato(url)]
+        for url in gia_elaborati:
+            del lavori[url]
+        if gia_elaborati:
+            logger.info(f"{len(gia_elaborati)} URL già presenti nel registro: saltati.")
+
+    def registra(lavoro, esito):
+        caso_confermato, luogo, data_caso = esito
+        stato = CONFERMATO if caso_confermato else SCARTATO
+        METRICS.incr("documents_total", result=stato)
+        # I quasi duplicati hanno lo stesso testo del loro rappresentante: non vengono indicizzati
+        if indice_testi is not None and lavoro.get('testo') and 'rappresentante' not in lavoro:
+            risultato = lavoro['risultato']
+            with METRICS.timer("stage_seconds", stage="indice_testi"):
+                indice_testi.add_document(lavoro['url'], lavoro['testo'], risultato['titolo'], location=risultato['link'],
+                                          metadata={"categoria": risultato['categoria'], "stato": stato,
+                                                    "luogo": luogo, "data": data_caso})
+        if registro is None:
+            return
+        if caso_confermato:
+            registro.registra(lavoro['url'], lavoro['risultato'], CONFERMATO, luogo=luogo, data=data_caso)
+        else:
+            registro.registra(lavoro['url'], lavoro['risultato'], SCARTATO)
+
+    def risolto(lavoro):
+        return 'esito' in lavoro or 'rappresentante' in lavoro
+
+    def scarica(lavoro):
+        risultato = lavoro['risultato']
+        if indice_duplicati is not None:
+            esito = indice_duplicati.esito(lavoro['url'])
+            if esito is not None:
+                logger.info(f"Già analizzato in precedenza: {risultato['titolo']} ({lavoro['url']})")
+                lavoro['esito'] = esito
+                return lavoro
         logger.info(f"Analisi: {risultato['titolo']} ({risultato['categoria']})...")
-        testo_da_analizzare = estrai_testo_da_url(risultato['link'])  # Estrai testo dalla pagina web
-        if testo_da_analizzare:
-            caso_confermato, luogo, data_caso = analizza_con_ollama(testo_da_analizzare)
-            if caso_confermato:
-                risultato['luogo'] = luogo
-                risultato['data'] = data_caso
-                risultati_filtrati.append(risultato)
-        time.sleep(1)  # Per evitare rate limit
+        with METRICS.timer("rate_limit_wait_seconds", limiter="host"):
+            limitatore.attendi(risultato['link'])
+        lavoro['contenuto'] = scarica_pagina(risultato['link'])
+        return None if lavoro['contenuto'] is None else lavoro
+
+    def estrai(lavoro):
+        if risolto(lavoro):
+            return lavoro
+        lavoro['testo'] = estrai_testo_da_html(lavoro.pop('contenuto'))
+        return lavoro if lavoro['testo'] else None
+
+    def deduplica(lavoro):
+        if not risolto(lavoro):
+            rappresentante = indice_duplicati.rappresentante(lavoro['url'], lavoro['testo'])
+            if rappresentante is not None:
+                logger.info(f"Quasi duplicato di {rappresentante}: {lavoro['risultato']['titolo']}")
+                lavoro['rappresentante'] = rappresentante
+        return lavoro
+
+    def prefiltra(lavori_lotto):
+        da_valutare = [lavoro for lavoro in lavori_lotto if not risolto(lavoro)]
+        esiti = dict(zip(map(id, da_valutare), prefiltro.valuta([lavoro['testo'] for lavoro in da_valutare])))
+        ammessi = []
+        for lavoro in lavori_lotto:
+            if id(lavoro) in esiti:
+                categoria, punteggio, ammesso = esiti[id(lavoro)]
+                if not ammesso:
+                    logger.info(f"Scartato dal prefiltro: {lavoro['risultato']['titolo']} "
+                                f"(punteggio {punteggio:.3f}, {categoria})")
+                    # Come per i verdetti del modello: i quasi duplicati del documento ne ereditano l'esito
+                    if indice_duplicati is not None:
+                        indice_duplicati.registra_esito(lavoro['url'], False, None, None)
+                    registra(lavoro, (False, None, None))
+                    lavoro = None
+            ammessi.append(lavoro)
+        return ammessi
+
+    def analizza(lavoro):
+        if 'rappresentante' in lavoro:
+            return lavoro
+        if 'esito' not in lavoro:
+            lavoro['esito'] = classifica_documento(lavoro['testo'], cache=cache, budget_token=budget_token,
+                                                   max_blocchi=max_blocchi, modalita=modalita,
+                                                   scheduler=scheduler).tupla()
+            if indice_duplicati is not None:
+                indice_duplicati.registra_esito(lavoro['url'], *lavoro['esito'])
+        registra(lavoro, lavoro['esito'])
+        return lavoro
+
+    stadi = [
+        Stadio("download", scarica, parallelismo_download, metriche=METRICS),
+        Stadio("estrazione", estrai, metriche=METRICS),  # Il parsing è per lo più legato al GIL: un thread è sufficiente
+    ]
+    if indice_duplicati is not None:
+        stadi.append(Stadio("duplicati", deduplica, metriche=METRICS))
+    if prefiltro is not None:
+        stadi.append(Stadio("prefiltro", prefiltra, lotto=LOTTO_PREFILTRO, metriche=METRICS))
+    stadi.append(Stadio("llm", analizza, parallelismo_llm, metriche=METRICS))
+    completati = [lavoro for lavoro in esegui_pipeline(lavori.values(), stadi) if lavoro is not None]
+
+    esiti = {lavoro['url']: lavoro['esito'] for lavoro in completati if 'esito' in lavoro}
+    for lavoro in completati:
+        if 'rappresentante' in lavoro:
+            rappresentante = lavoro['rappresentante']
+            esito = esiti.get(rappresentante) or indice_duplicati.esito(rappresentante)
+            if esito is not None:
+                esiti[lavoro['url']] = esito
+                registra(lavoro, esito)
 
+    risultati_filtrati = []
+    for risultato in risultati:
+        caso_confermato, luogo, data_caso = esiti.get(canonicalizza_url(risultato['link']), (False, None, None))
+        if caso_confermato:
+            risultato['luogo'] = luogo
+            risultato['data'] = data_caso
+            risultati_filtrati.append(risultato)
     return risultati_filtrati
 
-def main():
+def main(riprendi=False):
+    """Cerca i casi, li analizza e salva quelli confermati in 'risultati_filtrati.json'.
+
+    Gli esiti vengono scritti man mano in PERCORSO_REGISTRO; con `riprendi` gli URL già
+    registrati da un'esecuzione interrotta non vengono analizzati di nuovo.
+    """
     carica_configurazione()  # Ensure configuration is loaded
 
     # Definisci categorie e parole chiave
@@ -267,21 +546,39 @@ def main():
         "Misc": ["Misc"]
     }
 
-    # Eseguiamo le ricerche per ogni categoria
-    tutti_i_risultati = []
-    for categoria, parole_chiave in categorie.items():
-        for parola in parole_chiave:
-            logger.info(f"Ricerca: {parola} ({categoria})...")
-            risultati = cerca_casi(categoria, parola)
-            tutti_i_risultati.extend(risultati)
-            time.sleep(1)  # Per evitare rate limit dell'API
-
-    # Analizza i risultati con Ollama
-    risultati_filtrati = elabora_risultati(tutti_i_risultati)
-
-    # Salva i risultati filtrati in un file JSON
-    with open("risultati_filtrati.json", "w", encoding="utf-8") as f:
-        json.dump(risultati_filtrati, f, indent=4, ensure_ascii=False)
+    # Eseguiamo in parallelo le ricerche per ogni categoria, entro il limite di frequenza e la quota dell'API
+    ricerca = RicercaGoogle(API_KEY, CX, url=URL_SEARCH)
+    try:
+        with METRICS.timer("stage_seconds", stage="ricerca"):
+            tutti_i_risultati = ricerca.cerca_tutte(categorie)
+    finally:
+        METRICS.incr("cache_lookups_total", ricerca.dalla_cache, cache="ricerche", result="hit")
+        METRICS.incr("cache_lookups_total", ricerca.inviate, cache="ricerche", result="miss")
+        ricerca.chiudi()
+
+    # Analizza i risultati con Ollama, riutilizzando quelli già classificati nelle esecuzioni precedenti
+    cache = CacheRisultatiLLM()
+    indice_duplicati = IndiceDuplicati()
+    scheduler = SchedulerOllama(ENDPOINT_OLLAMA)
+    scheduler.verifica_tutti()
+    registro = RegistroRisultati(PERCORSO_REGISTRO, riprendi=riprendi)
+    indice_testi = SearchIndex(PERCORSO_INDICE_TESTI)
+    try:
+        prefiltro = Prefiltro.da_semi(VAULT_DIR, "risultati_filtrati.json")
+        elabora_risultati(tutti_i_risultati, cache=cache, prefiltro=prefiltro, indice_duplicati=indice_duplicati,
+                          scheduler=scheduler, registro=registro, indice_testi=indice_testi)
+    finally:
+        registro.chiudi()
+        indice_testi.close()
+        for endpoint in scheduler.statistiche():
+            METRICS.incr("llm_endpoint_requests_total", endpoint["completati"], endpoint=endpoint["url"], result="ok")
+            METRICS.incr("llm_endpoint_requests_total", endpoint["errori"], endpoint=endpoint["url"], result="error")
+        scheduler.chiudi()
+        indice_duplicati.chiudi()
+        cache.chiudi()
+
+    # Salva i risultati filtrati in un file JSON, a partire dal registro
+    compatta(PERCORSO_REGISTRO, "risultati_filtrati.json")
 
     logger.info("\n✅ Analisi completata! I risultati filtrati sono stati salvati in 'risultati_filtrati.json'.")
 
@@ -291,11 +588,33 @@ def main():
 
 # Esegui la funzione principale
 if __name__ == "__main__":
-    try:
-        logger.info("Avvio del servizio Ollama...")
-        #ollama_process = subprocess.Popen(["ollama", "serve"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        #time.sleep(5)  # Attendere che Ollama sia pronto
-        #main()
-        analizza_con_ollama("Omicidio di Berluscoli ucciso da ignoti nella notte, 12 Dicembre 2024, Roma")
-    except Exception as e:
-        logger.error(f"Errore durante l'esecuzione del programma: {e}")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Cerca casi irrisolti e li classifica con Ollama.")
+    parser.add_argument("--riprendi", "--resume", action="store_true",
+                        help=f"Riprende un'esecuzione interrotta saltando gli URL già presenti in {PERCORSO_REGISTRO}.")
+    parser.add_argument("--compatta", action="store_true",
+                        help=f"Genera solo risultati_filtrati.json da {PERCORSO_REGISTRO}, senza nuove analisi.")
+    parser.add_argument("--prova", action="store_true", help="Analizza solo un testo di esempio.")
+    parser.add_argument("--metriche", "--metrics", default=None,
+                        help="Salva contatori e latenze per stadio in questo file (JSON, o Prometheus con estensione .prom).")
+    parser.add_argument("--profilo", "--profile", default=None,
+                        help="Profila l'esecuzione con cProfile e salva le statistiche in questo file (.prof).")
+    args = parser.parse_args()
+    contesto = ExitStack()
+    contesto.callback(METRICS.log_summary)
+    if args.metriche:
+        contesto.callback(METRICS.dump, args.metriche)
+    if args.profilo:
+        contesto.enter_context(profiling(args.profilo))
+    with contesto:
+        try:
+            logger.info("Avvio del servizio Ollama...")
+            #ollama_process = subprocess.Popen(["ollama", "serve"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            #time.sleep(5)  # Attendere che Ollama sia pronto
+            if args.compatta:
+                compatta(PERCORSO_REGISTRO, "risultati_filtrati.json")
+            elif args.prova:
+                analizza_con_ollama("Omicidio di Berluscoli ucciso da ignoti nella notte, 12 Dicembre 2024, Roma")
+            else:
+                main(riprendi=args.riprendi)
+        except Exception as e:
+            logger.error(f"Errore durante l'esecuzione del programma: {e}")
\ No newline at end of file
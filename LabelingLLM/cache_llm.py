@@ -0,0 +1,126 @@
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+PERCORSO_CACHE_LLM = "cache/risultati_llm.sqlite3"
+MAX_VOCI_CACHE = 50000
+
+
+def normalizza_testo(testo):
+    """Normalizza il testo per la chiave di cache: Unicode NFC e spazi compattati."""
+    return " ".join(unicodedata.normalize("NFC", testo).split())
+
+
+def chiave_cache(testo, modello, versione_prompt):
+    """Chiave content-addressed: hash di (testo normalizzato, modello, versione del prompt)."""
+    contenuto = "\0".join((normalizza_testo(testo), modello, str(versione_prompt)))
+    return hashlib.sha256(contenuto.encode("utf-8")).hexdigest()
+
+
+class CacheRisultatiLLM:
+    """Cache SQLite persistente dei risultati di analizza_con_ollama.
+
+    Un testo già classificato con lo stesso modello e la stessa versione del prompt non viene
+    inviato di nuovo a Ollama, anche se proviene da un URL diverso. La cache contiene al più
+    `max_voci` risultati: oltre questo limite vengono eliminati quelli usati meno di recente.
+    """
+
+    def __init__(self, percorso=PERCORSO_CACHE_LLM, max_voci=MAX_VOCI_CACHE):
+        directory = os.path.dirname(percorso)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.percorso = percorso
+        self.max_voci = max_voci
+        self.hit = 0
+        self.miss = 0
+        self.lock = threading.Lock()  # La connessione è condivisa dai thread della pipeline
+        self.conn = sqlite3.connect(percorso, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS risultati (
+                chiave TEXT PRIMARY KEY,
+                modello TEXT NOT NULL,
+                versione_prompt TEXT NOT NULL,
+                confermato INTEGER NOT NULL,
+                luogo TEXT,
+                data TEXT,
+                creato REAL NOT NULL,
+                ultimo_accesso REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS risultati_accesso ON risultati (ultimo_accesso);
+        """)
+
+    def leggi(self, testo, modello, versione_prompt):
+        """Restituisce (caso_confermato, luogo, data) se il testo è già stato analizzato, altrimenti None."""
+        chiave = chiave_cache(testo, modello, versione_prompt)
+        with self.lock:
+            riga = self.conn.execute("SELECT confermato, luogo, data FROM risultati WHERE chiave = ?",
+                                     (chiave,)).fetchone()
+            if riga is None:
+                self.miss += 1
+                return None
+            self.hit += 1
+            self.conn.execute("UPDATE risultati SET ultimo_accesso = ? WHERE chiave = ?", (time.time(), chiave))
+            self.conn.commit()
+        return bool(riga[0]), riga[1], riga[2]
+
+    def salva(self, testo, modello, versione_prompt, caso_confermato, luogo, data_caso):
+        """Memorizza il risultato di un'analisi ed elimina le voci meno recenti oltre il limite."""
+        chiave = chiave_cache(testo, modello, versione_prompt)
+        adesso = time.time()
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO risultati VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (chiave, modello, str(versione_prompt), int(caso_confermato), luogo, data_caso,
+                               adesso, adesso))
+            self.conn.execute("""
+                DELETE FROM risultati WHERE chiave IN (
+                    SELECT chiave FROM risultati ORDER BY ultimo_accesso DESC LIMIT -1 OFFSET ?
+                )""", (self.max_voci,))
+            self.conn.commit()
+
+    def invalida(self, modello=None, versione_prompt=None):
+        """Elimina i risultati (tutti, o solo quelli di un modello e/o di una versione del prompt)."""
+        condizioni = []
+        parametri = []
+        if modello is not None:
+            condizioni.append("modello = ?")
+            parametri.append(modello)
+        if versione_prompt is not None:
+            condizioni.append("versione_prompt = ?")
+            parametri.append(str(versione_prompt))
+        where = f" WHERE {' AND '.join(condizioni)}" if condizioni else ""
+        with self.lock:
+            eliminati = self.conn.execute(f"DELETE FROM risultati{where}", parametri).rowcount
+            self.conn.commit()
+        logger.info(f"Cache LLM: eliminati {eliminati} risultati da '{self.percorso}'.")
+        return eliminati
+
+    def conteggio(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM risultati").fetchone()[0]
+
+    def chiudi(self):
+        logger.info(f"Cache LLM: {self.hit} hit, {self.miss} miss ({self.conteggio()} risultati in '{self.percorso}').")
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Gestisce la cache dei risultati di Ollama di LocalColab.")
+    parser.add_argument("--percorso", default=PERCORSO_CACHE_LLM, help="File SQLite della cache.")
+    parser.add_argument("--invalida", action="store_true", help="Elimina i risultati in cache.")
+    parser.add_argument("--modello", default=None, help="Con --invalida, elimina solo i risultati di questo modello.")
+    parser.add_argument("--versione-prompt", default=None, help="Con --invalida, elimina solo i risultati di questa versione del prompt.")
+    args = parser.parse_args()
+
+    cache = CacheRisultatiLLM(args.percorso)
+    if args.invalida:
+        cache.invalida(modello=args.modello, versione_prompt=args.versione_prompt)
+    print(f"{cache.conteggio()} risultati in cache.")
+    cache.conn.close()
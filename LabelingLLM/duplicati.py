@@ -0,0 +1,177 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+from prefiltro import tokenizza
+
+logger = logging.getLogger(__name__)
+
+PERCORSO_INDICE_DUPLICATI = "cache/duplicati.sqlite3"
+SOGLIA_SOMIGLIANZA = 0.6  # Jaccard stimata tra gli shingle oltre la quale due testi sono duplicati
+PERMUTAZIONI = 64
+BANDE = 16  # 16 bande da 4 valori: i candidati emergono da una Jaccard di circa 0,5
+LUNGHEZZA_SHINGLE = 3
+MIN_SHINGLE = 10  # Sotto questa soglia il testo è troppo corto per un confronto affidabile
+_PRIMO = (1 << 61) - 1
+_GENERATORE = np.random.default_rng(20240517)  # Permutazioni fisse: le firme restano confrontabili tra esecuzioni
+_A = _GENERATORE.integers(1, 1 << 31, PERMUTAZIONI, dtype=np.uint64)
+_B = _GENERATORE.integers(0, 1 << 31, PERMUTAZIONI, dtype=np.uint64)
+
+PREFISSI_TRACCIAMENTO = ("utm_",)
+# Confrontati per intero: "ref" non deve togliere "referenza", né "amp" togliere "amp_id"
+PARAMETRI_TRACCIAMENTO = frozenset(("fbclid", "gclid", "mc_cid", "mc_eid", "ref", "amp", "outputtype"))
+
+
+def _tracciamento(chiave):
+    chiave = chiave.lower()
+    return chiave in PARAMETRI_TRACCIAMENTO or chiave.startswith(PREFISSI_TRACCIAMENTO)
+
+
+def canonicalizza_url(url):
+    """Forma canonica di un URL: schema e host in minuscolo, senza "www."/"m."/"amp.", porta
+    predefinita, frammento, parametri di tracciamento, suffisso "/amp" e "/" finale."""
+    parti = urlsplit(url.strip())
+    schema = parti.scheme.lower() or "http"
+    host = (parti.hostname or "").lower()
+    for prefisso in ("www.", "m.", "amp."):
+        if host.startswith(prefisso):
+            host = host[len(prefisso):]
+    if parti.port and not (schema, parti.port) in (("http", 80), ("https", 443)):
+        host = f"{host}:{parti.port}"
+    percorso = parti.path or "/"
+    if percorso.endswith("/amp") or percorso.endswith("/amp/"):
+        percorso = percorso[:percorso.rindex("/amp")] or "/"
+    if len(percorso) > 1:
+        percorso = percorso.rstrip("/")
+    parametri = sorted((chiave, valore) for chiave, valore in parse_qsl(parti.query, keep_blank_values=True)
+                       if not _tracciamento(chiave))
+    # http e https della stessa pagina sono lo stesso documento
+    return urlunsplit(("https" if schema == "http" else schema, host, percorso, urlencode(parametri), ""))
+
+
+def minhash(testo):
+    """Firma MinHash (PERMUTAZIONI interi) degli shingle di parole del testo, o None se il testo è troppo corto."""
+    parole = tokenizza(testo)
+    shingle = {" ".join(parole[i:i + LUNGHEZZA_SHINGLE]) for i in range(len(parole) - LUNGHEZZA_SHINGLE + 1)}
+    if len(shingle) < MIN_SHINGLE:
+        return None
+    valori = np.fromiter((zlib.crc32(s.encode("ascii")) for s in shingle), dtype=np.uint64, count=len(shingle))
+    # h(x) = (a * x + b) mod p per tutte le permutazioni insieme: a, x < 2^32, quindi niente overflow
+    return ((valori[:, None] * _A + _B) % _PRIMO).min(axis=0)
+
+
+def somiglianza(firma_a, firma_b):
+    """Stima della similarità di Jaccard tra due testi dalle loro firme."""
+    return float(np.mean(firma_a == firma_b))
+
+
+def _bande(firma):
+    righe = PERMUTAZIONI // BANDE
+    return [zlib.crc32(firma[banda * righe:(banda + 1) * righe].tobytes()) for banda in range(BANDE)]
+
+
+class IndiceDuplicati:
+    """Indice persistente dei documenti analizzati, per URL canonico e firma MinHash.
+
+    Un documento quasi identico a uno già indicizzato (stesso articolo ripubblicato da più
+    testate) viene associato a quel rappresentante, che è analizzato una sola volta: il suo
+    esito vale per tutti i duplicati, anche nelle esecuzioni successive. La ricerca dei
+    candidati usa le bande della firma (LSH) invece di un confronto con tutto l'indice.
+    """
+
+    def __init__(self, percorso=PERCORSO_INDICE_DUPLICATI, soglia=SOGLIA_SOMIGLIANZA):
+        directory = os.path.dirname(percorso)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.percorso = percorso
+        self.soglia = soglia
+        self.nuovi_rappresentanti = set()  # Documenti di questa esecuzione in attesa di esito
+        self.duplicati = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(percorso, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documenti (
+                url TEXT PRIMARY KEY,
+                firma BLOB,
+                rappresentante TEXT NOT NULL,
+                confermato INTEGER,
+                luogo TEXT,
+                data TEXT,
+                aggiornato REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS bande (
+                banda INTEGER NOT NULL,
+                valore INTEGER NOT NULL,
+                url TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS bande_valore ON bande (banda, valore);
+        """)
+
+    def esito(self, url):
+        """Restituisce (caso_confermato, luogo, data) già noto per l'URL canonico (o per il suo
+        rappresentante), oppure None."""
+        with self.lock:
+            riga = self.conn.execute("SELECT rappresentante FROM documenti WHERE url = ?", (url,)).fetchone()
+            if riga is None:
+                return None
+            riga = self.conn.execute("SELECT confermato, luogo, data FROM documenti WHERE url = ?", (riga[0],)).fetchone()
+        if riga is None or riga[0] is None:
+            return None
+        return bool(riga[0]), riga[1], riga[2]
+
+    def rappresentante(self, url, testo):
+        """Indicizza il documento e restituisce l'URL del rappresentante di cui è un quasi duplicato,
+        oppure None se il documento è nuovo e diventa rappresentante di sé stesso."""
+        firma = minhash(testo)
+        with self.lock:
+            scelto = None
+            self.conn.execute("DELETE FROM bande WHERE url = ?", (url,))
+            if firma is not None:
+                bande = _bande(firma)
+                condizione = " OR ".join(["(banda = ? AND valore = ?)"] * BANDE)
+                candidati = self.conn.execute(f"""
+                    SELECT DISTINCT d.url, d.firma, d.confermato FROM bande b JOIN documenti d ON d.url = b.url
+                    WHERE d.url = d.rappresentante AND d.url != ? AND ({condizione})""",
+                    [url] + [v for banda, valore in enumerate(bande) for v in (banda, valore)]).fetchall()
+                migliore = self.soglia
+                for candidato, firma_candidato, confermato in candidati:
+                    # Un rappresentante mai analizzato (es. esecuzione interrotta) non può condividere un esito
+                    if confermato is None and candidato not in self.nuovi_rappresentanti:
+                        continue
+                    valore = somiglianza(firma, np.frombuffer(firma_candidato, dtype=np.uint64))
+                    if valore >= migliore:
+                        scelto, migliore = candidato, valore
+                if scelto is None:
+                    self.conn.executemany("INSERT INTO bande (banda, valore, url) VALUES (?, ?, ?)",
+                                          [(banda, valore, url) for banda, valore in enumerate(bande)])
+            self.conn.execute(
+                """INSERT INTO documenti (url, firma, rappresentante, aggiornato) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (url) DO UPDATE SET firma = excluded.firma, rappresentante = excluded.rappresentante,
+                   aggiornato = excluded.aggiornato""",
+                (url, None if firma is None else firma.tobytes(), scelto or url, time.time()))
+            self.conn.commit()
+            if scelto is None:
+                self.nuovi_rappresentanti.add(url)
+            else:
+                self.duplicati += 1
+        return scelto
+
+    def registra_esito(self, url, caso_confermato, luogo, data_caso):
+        """Memorizza l'esito dell'analisi di un rappresentante."""
+        with self.lock:
+            self.conn.execute("UPDATE documenti SET confermato = ?, luogo = ?, data = ?, aggiornato = ? WHERE url = ?",
+                              (int(caso_confermato), luogo, data_caso, time.time(), url))
+            self.conn.commit()
+
+    def chiudi(self):
+        with self.lock:
+            totale = self.conn.execute("SELECT COUNT(*) FROM documenti").fetchone()[0]
+            self.conn.close()
+        logger.info(f"Indice duplicati: {self.duplicati} quasi duplicati in questa esecuzione, "
+                    f"{totale} documenti in '{self.percorso}'.")
@@ -0,0 +1,138 @@
+import re
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # Senza lxml si usa Beautiful Soup, più lento e senza selezione del contenuto principale
+    lxml_html = None
+
+CARATTERI_PER_TOKEN = 4  # Stima grossolana per testo italiano con i tokenizer BPE
+MIN_CARATTERI_CONTENUTO = 200  # Sotto questa lunghezza il contenuto principale non è affidabile
+
+TAG_RUMORE = ("script", "style", "noscript", "template", "svg", "canvas", "iframe", "form", "button", "select",
+              "nav", "header", "footer", "aside", "menu", "dialog")
+TAG_TESTO = ("h1", "h2", "h3", "h4", "p", "li", "blockquote", "pre", "td")
+BOILERPLATE_RE = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|footer|header|sidebar|cookie|banner|share|social|comment[si]?|commenti|related|"
+    r"correlati|advert|adv|ads|promo|newsletter|breadcrumbs?|popup|modal|widget|tags)([\s_-]|$)", re.IGNORECASE)
+SPAZI_RE = re.compile(r"\s+")
+
+
+def _normalizza(testo):
+    return SPAZI_RE.sub(" ", testo).strip()
+
+
+def _annidato(elemento, principale):
+    """True se `elemento` è dentro un altro elemento di testo del contenitore (un <p> dentro un <li>),
+    il cui testo lo comprende già. Gli antenati del contenitore non contano: nei siti impaginati
+    a tabelle il contenuto principale sta spesso dentro un <td>."""
+    for antenato in elemento.iterancestors():
+        if antenato is principale:
+            return False
+        if antenato.tag in TAG_TESTO:
+            return True
+    return False
+
+
+def _estrai_con_lxml(contenuto):
+    try:
+        documento = lxml_html.fromstring(contenuto)
+    except (etree.ParserError, ValueError):
+        return ""
+    titolo = _normalizza(documento.findtext(".//title") or "")
+    etree.strip_elements(documento, etree.Comment, *TAG_RUMORE, with_tail=False)
+
+    corpo = documento.find(".//body")
+    corpo = corpo if corpo is not None else documento
+    lunghezza_totale = len(corpo.text_content())
+    for elemento in corpo.xpath(".//*[@class or @id]"):
+        attributi = f"{elemento.get('class', '')} {elemento.get('id', '')}"
+        if elemento.tag in ("article", "main") or not BOILERPLATE_RE.search(attributi):
+            continue
+        # Un contenitore con gran parte del testo non è un menu, anche se la sua classe lo fa pensare
+        if elemento.getparent() is not None and len(elemento.text_content()) < 0.3 * lunghezza_totale:
+            elemento.drop_tree()
+
+    # Contenuto principale: il contenitore con più testo nei paragrafi, preferendo <article> e <main>
+    punteggi = {}
+    for paragrafo in corpo.iter("p"):
+        lunghezza = len(paragrafo.text_content().strip())
+        if lunghezza < 25:
+            continue
+        genitore = paragrafo.getparent()
+        if genitore is not None:
+            punteggi[genitore] = punteggi.get(genitore, 0) + lunghezza
+            nonno = genitore.getparent()
+            if nonno is not None:
+                punteggi[nonno] = punteggi.get(nonno, 0) + lunghezza / 2
+    for contenitore in punteggi:
+        if contenitore.tag in ("article", "main"):
+            punteggi[contenitore] *= 1.5
+    principale = max(punteggi, key=punteggi.get) if punteggi else corpo
+
+    righe = []
+    for elemento in principale.iterdescendants(*TAG_TESTO):
+        if _annidato(elemento, principale):
+            continue
+        riga = _normalizza(elemento.text_content())
+        if riga:
+            righe.append(riga)
+    testo = "\n".join(righe)
+    if len(testo) < MIN_CARATTERI_CONTENUTO:
+        testo = "\n".join(riga for riga in map(_normalizza, corpo.text_content().splitlines()) if riga)
+    if titolo and not testo.startswith(titolo):
+        testo = f"{titolo}\n{testo}"
+    return testo
+
+
+def _estrai_con_beautifulsoup(contenuto):
+    soup = BeautifulSoup(contenuto, "html.parser")
+    for elemento in soup(list(TAG_RUMORE)):
+        elemento.extract()
+    return "\n".join(riga for riga in map(_normalizza, soup.get_text("\n").splitlines()) if riga)
+
+
+def estrai_contenuto_principale(contenuto):
+    """Estrae il testo del contenuto principale di una pagina HTML, senza menu, piè di pagina,
+    barre laterali, banner e altri elementi ripetuti del sito. Usa lxml se disponibile."""
+    if lxml_html is not None:
+        return _estrai_con_lxml(contenuto)
+    return _estrai_con_beautifulsoup(contenuto)
+
+
+def stima_token(testo):
+    """Stima il numero di token del testo per il prompt del modello."""
+    return len(testo) // CARATTERI_PER_TOKEN + 1
+
+
+def dividi_in_blocchi(testo, budget_token):
+    """Divide il testo in blocchi di al più `budget_token` token stimati, rispettando
+    i confini di riga (paragrafi) e, per le righe troppo lunghe, quelli di parola."""
+    massimo = budget_token * CARATTERI_PER_TOKEN
+    blocchi = []
+    corrente = []
+    lunghezza = 0
+    for riga in testo.split("\n"):
+        pezzi = [riga]
+        if len(riga) > massimo:
+            pezzi = []
+            pezzo = ""
+            for parola in riga.split(" "):
+                if pezzo and len(pezzo) + len(parola) + 1 > massimo:
+                    pezzi.append(pezzo)
+                    pezzo = parola[:massimo]
+                else:
+                    pezzo = f"{pezzo} {parola}" if pezzo else parola[:massimo]
+            pezzi.append(pezzo)
+        for pezzo in pezzi:
+            if corrente and lunghezza + len(pezzo) + 1 > massimo:
+                blocchi.append("\n".join(corrente))
+                corrente = []
+                lunghezza = 0
+            corrente.append(pezzo)
+            lunghezza += len(pezzo) + 1
+    if corrente:
+        blocchi.append("\n".join(corrente))
+    return blocchi
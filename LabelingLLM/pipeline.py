@@ -0,0 +1,174 @@
+import logging
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+_FINE = object()  # Segnale di fine flusso tra uno stadio e il successivo
+
+
+class LimitatoreHost:
+    """Impone un intervallo minimo tra due richieste verso lo stesso host.
+
+    Sostituisce la pausa globale: host diversi vengono scaricati in parallelo, mentre lo
+    stesso sito riceve al più una richiesta ogni `intervallo` secondi.
+    """
+
+    def __init__(self, intervallo):
+        self.intervallo = intervallo
+        self.prossimo_accesso = {}
+        self.lock = threading.Lock()
+
+    def attendi(self, url):
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            adesso = time.monotonic()
+            turno = max(adesso, self.prossimo_accesso.get(host, 0.0))
+            self.prossimo_accesso[host] = turno + self.intervallo
+        if turno > adesso:
+            time.sleep(turno - adesso)
+
+
+class Stadio:
+    """Uno stadio della pipeline: una funzione eseguita da `parallelismo` thread.
+
+    La funzione riceve l'elemento prodotto dallo stadio precedente e restituisce quello da
+    passare al successivo, oppure None per scartarlo. Con `lotto` > 1 la funzione riceve
+    invece una lista di al più `lotto` elementi (quelli già in coda, senza attenderne altri)
+    e restituisce la lista dei risultati corrispondenti. Lo stadio raccoglie le statistiche
+    di throughput e, se riceve un registro `metriche` (vedi metrics.Metrics), la durata di
+    ogni elemento e il suo esito.
+    """
+
+    def __init__(self, nome, funzione, parallelismo=1, lotto=1, metriche=None):
+        self.nome = nome
+        self.metriche = metriche
+        self.funzione = funzione
+        self.parallelismo = max(1, parallelismo)
+        self.lotto = max(1, lotto)
+        self.elaborati = 0
+        self.scartati = 0
+        self.errori = 0
+        self.tempo_occupato = 0.0
+        self.inizio = None
+        self.fine = None
+        self.lock = threading.Lock()
+
+    def _registra(self, esito, durata):
+        with self.lock:
+            self.elaborati += 1
+            self.tempo_occupato += durata
+            if esito == "scartato":
+                self.scartati += 1
+            elif esito == "errore":
+                self.errori += 1
+        if self.metriche is not None:
+            self.metriche.observe("stage_seconds", durata, stage=self.nome)
+            self.metriche.incr("stage_items_total", stage=self.nome, result=esito)
+
+    def statistiche(self):
+        """Restituisce un dizionario con elementi elaborati, durata e throughput dello stadio."""
+        durata = (self.fine or time.monotonic()) - (self.inizio or time.monotonic())
+        return {
+            "stadio": self.nome,
+            "parallelismo": self.parallelismo,
+            "elaborati": self.elaborati,
+            "scartati": self.scartati,
+            "errori": self.errori,
+            "durata": durata,
+            "throughput": self.elaborati / durata if durata > 0 else 0.0,
+            "occupazione": self.tempo_occupato / (durata * self.parallelismo) if durata > 0 else 0.0,
+        }
+
+
+def _worker(stadio, ingresso, uscita, stato):
+    finito = False
+    while not finito:
+        elemento = ingresso.get()
+        if elemento is _FINE:
+            break
+        lotto = [elemento]
+        while len(lotto) < stadio.lotto:
+            try:
+                elemento = ingresso.get_nowait()
+            except queue.Empty:
+                break
+            if elemento is _FINE:
+                finito = True
+                break
+            lotto.append(elemento)
+
+        inizio = time.monotonic()
+        try:
+            if stadio.lotto > 1:
+                risultati = stadio.funzione([valore for _, valore in lotto])
+            else:
+                risultati = [stadio.funzione(lotto[0][1])]
+        except Exception as e:
+            logger.error(f"Errore nello stadio '{stadio.nome}': {e}")
+            durata = (time.monotonic() - inizio) / len(lotto)
+            for _ in lotto:
+                stadio._registra("errore", durata)
+            continue
+        durata = (time.monotonic() - inizio) / len(lotto)
+        for (indice, _), risultato in zip(lotto, risultati):
+            stadio._registra("scartato" if risultato is None else "ok", durata)
+            if risultato is not None:
+                uscita.put((indice, risultato))  # Blocca se lo stadio successivo è indietro
+
+    with stato["lock"]:
+        stato["attivi"] -= 1
+        ultimo = stato["attivi"] == 0
+    if ultimo:
+        stadio.fine = time.monotonic()
+        for _ in range(stato["destinatari"]):
+            uscita.put(_FINE)
+
+
+def esegui_pipeline(elementi, stadi, dimensione_coda=16):
+    """Fa scorrere gli elementi attraverso gli stadi, ognuno nei propri thread.
+
+    Gli stadi sono collegati da code di capacità `dimensione_coda`: uno stadio lento rallenta
+    quelli a monte invece di accumulare elementi in memoria. Restituisce una lista allineata a
+    `elementi`, con il risultato dell'ultimo stadio o None per gli elementi scartati, così
+    l'ordine dei risultati coincide con quello dell'elaborazione sequenziale.
+    """
+    elementi = list(elementi)
+    code = [queue.Queue(maxsize=dimensione_coda) for _ in stadi] + [queue.Queue()]
+    thread = []
+    for posizione, stadio in enumerate(stadi):
+        destinatari = stadi[posizione + 1].parallelismo if posizione + 1 < len(stadi) else 1
+        stato = {"lock": threading.Lock(), "attivi": stadio.parallelismo, "destinatari": destinatari}
+        stadio.inizio = time.monotonic()
+        for numero in range(stadio.parallelismo):
+            worker = threading.Thread(target=_worker, args=(stadio, code[posizione], code[posizione + 1], stato),
+                                      name=f"{stadio.nome}-{numero}", daemon=True)
+            worker.start()
+            thread.append(worker)
+
+    def alimenta():
+        for indice, elemento in enumerate(elementi):
+            code[0].put((indice, elemento))
+        for _ in range(stadi[0].parallelismo):
+            code[0].put(_FINE)
+
+    threading.Thread(target=alimenta, name="alimentatore", daemon=True).start()
+
+    risultati = [None] * len(elementi)
+    while True:
+        elemento = code[-1].get()
+        if elemento is _FINE:
+            break
+        indice, valore = elemento
+        risultati[indice] = valore
+    for worker in thread:
+        worker.join()
+
+    for stadio in stadi:
+        s = stadio.statistiche()
+        logger.info(f"Stadio '{s['stadio']}' (x{s['parallelismo']}): {s['elaborati']} elementi in {s['durata']:.1f}s, "
+                    f"{s['throughput']:.2f}/s, scartati {s['scartati']}, errori {s['errori']}, "
+                    f"occupazione {s['occupazione']:.0%}")
+    return risultati
@@ -0,0 +1,186 @@
+import argparse
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONE_HASH = 1 << 18
+SOGLIA_PREFILTRO = 0.02
+PAROLA_RE = re.compile(r"[a-z]{2,}")
+NOTA_COLLEGAMENTO_RE = re.compile(r"^- \[\[(.+?)\]\]")
+
+PAROLE_VUOTE = frozenset("""
+a ad al alla alle agli ai all anche che chi ci con cui da dal dalla dalle dai dagli degli dei del della delle
+di e ed era erano essere fra gli ha hanno il in io la le lo loro ma mi ne nei nel nella nelle negli non o per
+piu quale quali quando quella quelle quelli quello questa queste questi questo se si sia sono su sua sue sui
+sul sulla suo suoi tra tu un una uno come dove anni anno stato stata stati state viene the of and to is was
+""".split())
+
+# Termini caratteristici delle categorie di LocalColab.main, usati come semi oltre agli esempi
+PAROLE_CHIAVE_CATEGORIE = {
+    "Vatican Murder": "vaticano santa sede guardie svizzere guardia svizzera cardinale prelato vescovo papa ior "
+                      "emanuela orlandi chiesa sacerdote parroco omicidio delitto vatican murder",
+    "Disappearance": "scomparsa scomparso scomparsi sparita sparito sparizione ritrovato ritrovamento ricerche "
+                     "rapimento rapita rapito sequestro chi l'ha visto denuncia di scomparsa disappearance missing",
+    "Politics": "politico politica parlamento ministro governo deputato senatore brigate rosse terrorismo "
+                "anni di piombo servizi segreti sismi sisde strategia della tensione politics",
+    "Serial Killers": "serial killer assassino seriale omicidi seriali mostro di firenze vittime delitti killer "
+                      "omicida assassinio serial killers",
+    "Massacre": "strage stragi massacro eccidio bomba esplosione attentato vittime feriti ordigno "
+                "strage di bologna piazza fontana massacre",
+    "Mafia": "mafia mafioso cosa nostra camorra ndrangheta sacra corona unita boss clan cosca pizzo "
+             "pentito collaboratore di giustizia antimafia lupara omicidio di mafia",
+    "Conspiracy": "complotto cospirazione depistaggio depistaggi loggia p2 massoneria gladio insabbiamento "
+                  "misteri mistero segreto di stato conspiracy",
+    "Misc": "caso irrisolto delitto omicidio assassinio indagini inchiesta processo procura polizia "
+            "carabinieri vittima cadavere corpo movente cold case mistero giallo",
+}
+
+
+def tokenizza(testo):
+    """Parole del testo in minuscolo, senza accenti, cifre e parole vuote."""
+    testo = unicodedata.normalize("NFKD", testo.lower()).encode("ascii", "ignore").decode("ascii")
+    return [parola for parola in PAROLA_RE.findall(testo) if parola not in PAROLE_VUOTE]
+
+
+def _termini(testo):
+    """Unigrammi e bigrammi del testo."""
+    parole = tokenizza(testo)
+    return parole + [f"{a} {b}" for a, b in zip(parole, parole[1:])]
+
+
+def vettorizza(testi, dimensione=DIMENSIONE_HASH):
+    """Vettori TF sublineari (1 + log tf) normalizzati L2 di n-grammi con hashing.
+
+    Restituisce la matrice sparsa in formato COO come tre array (righe, colonne, valori);
+    conteggio e normalizzazione sono eseguiti su tutto il lotto con operazioni NumPy.
+    """
+    righe = []
+    colonne = []
+    for riga, testo in enumerate(testi):
+        hash_termini = [zlib.crc32(termine.encode("ascii")) for termine in _termini(testo)]
+        righe.append(np.full(len(hash_termini), riga, dtype=np.int64))
+        colonne.append(np.asarray(hash_termini, dtype=np.int64) % dimensione)
+    if not righe or not sum(len(r) for r in righe):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    chiavi, conteggi = np.unique(np.concatenate(righe) * dimensione + np.concatenate(colonne), return_counts=True)
+    righe = chiavi // dimensione
+    colonne = chiavi % dimensione
+    valori = 1.0 + np.log(conteggi)
+    norme = np.sqrt(np.bincount(righe, weights=valori ** 2, minlength=len(testi)))
+    return righe, colonne, valori / norme[righe]
+
+
+class Prefiltro:
+    """Prefiltro economico che scarta i documenti estranei prima della classificazione con Ollama.
+
+    Ogni categoria è rappresentata dal centroide dei vettori dei suoi testi seme; il punteggio
+    di un documento è la massima similarità del coseno con i centroidi, calcolata per lotti di
+    documenti con prodotti tra array. I documenti sotto `soglia` non vengono inviati al modello.
+    """
+
+    def __init__(self, semi, soglia=SOGLIA_PREFILTRO, dimensione=DIMENSIONE_HASH):
+        self.categorie = list(semi)
+        self.soglia = soglia
+        self.dimensione = dimensione
+        self.centroidi = np.zeros((len(self.categorie), dimensione), dtype=np.float32)
+        for indice, categoria in enumerate(self.categorie):
+            righe, colonne, valori = vettorizza(semi[categoria], dimensione)
+            np.add.at(self.centroidi[indice], colonne, valori)
+            norma = np.linalg.norm(self.centroidi[indice])
+            if norma:
+                self.centroidi[indice] /= norma
+
+    @classmethod
+    def da_semi(cls, vault_dir=None, percorso_risultati=None, soglia=SOGLIA_PREFILTRO):
+        """Costruisce il prefiltro dalle parole chiave delle categorie, dalle note del vault
+        (titolo e collegamenti, come esempi di "Misc") e dai casi già confermati in
+        `risultati_filtrati.json`."""
+        semi = {categoria: [parole] for categoria, parole in PAROLE_CHIAVE_CATEGORIE.items()}
+        note = 0
+        if vault_dir and os.path.isdir(vault_dir):
+            for root, _, files in os.walk(vault_dir):
+                for file_name in files:
+                    if file_name.endswith(".md") and root != vault_dir:
+                        with open(os.path.join(root, file_name), "r", encoding="utf-8") as nota:
+                            titoli = [file_name[:-3]]
+                            for riga in nota:
+                                corrispondenza = NOTA_COLLEGAMENTO_RE.match(riga)
+                                if corrispondenza:
+                                    titoli.append(corrispondenza.group(1))
+                        semi["Misc"].append("\n".join(titoli))
+                        note += 1
+        confermati = 0
+        if percorso_risultati and os.path.exists(percorso_risultati):
+            with open(percorso_risultati, "r", encoding="utf-8") as f:
+                for risultato in json.load(f):
+                    categoria = risultato.get("categoria") if risultato.get("categoria") in semi else "Misc"
+                    semi[categoria].append(f"{risultato.get('titolo', '')}\n{risultato.get('descrizione', '')}")
+                    confermati += 1
+        logger.info(f"Prefiltro: {len(semi)} categorie, {note} note del vault e {confermati} casi confermati come semi.")
+        return cls(semi, soglia=soglia)
+
+    def punteggi(self, testi):
+        """Matrice (documenti x categorie) delle similarità del coseno con i centroidi."""
+        righe, colonne, valori = vettorizza(testi, self.dimensione)
+        contributi = self.centroidi[:, colonne] * valori
+        punteggi = np.zeros((len(testi), len(self.categorie)))
+        for indice in range(len(self.categorie)):
+            punteggi[:, indice] = np.bincount(righe, weights=contributi[indice], minlength=len(testi))
+        return punteggi
+
+    def valuta(self, testi):
+        """Restituisce, per ogni testo, (categoria più vicina, punteggio, ammesso)."""
+        punteggi = self.punteggi(testi)
+        if not len(testi):
+            return []
+        migliori = punteggi.argmax(axis=1)
+        massimi = punteggi[np.arange(len(testi)), migliori]
+        return [(self.categorie[c], float(p), bool(p >= self.soglia)) for c, p in zip(migliori, massimi)]
+
+
+def bench(prefiltro, percorso_campione, soglie):
+    """Misura su un campione etichettato (JSONL con 'testo' e 'rilevante') le chiamate al modello
+    risparmiate e il richiamo perso al variare della soglia."""
+    testi = []
+    etichette = []
+    with open(percorso_campione, "r", encoding="utf-8") as f:
+        for riga in f:
+            if riga.strip():
+                documento = json.loads(riga)
+                testi.append(documento["testo"])
+                etichette.append(bool(documento["rilevante"]))
+    etichette = np.asarray(etichette)
+    inizio = time.perf_counter()
+    massimi = prefiltro.punteggi(testi).max(axis=1) if testi else np.empty(0)
+    durata = time.perf_counter() - inizio
+    megabyte = sum(len(testo.encode("utf-8")) for testo in testi) / 1e6
+    print(f"{len(testi)} documenti ({int(etichette.sum())} rilevanti) valutati in {durata:.3f}s "
+          f"({len(testi) / durata if durata else 0:.0f} doc/s, {megabyte / durata if durata else 0:.1f} MB/s)")
+    print("soglia\tchiamate risparmiate\trichiamo perso")
+    for soglia in soglie:
+        scartati = massimi < soglia
+        risparmiate = scartati.mean() if len(testi) else 0.0
+        perso = (scartati & etichette).sum() / etichette.sum() if etichette.sum() else 0.0
+        print(f"{soglia:.3f}\t{risparmiate:.1%}\t{perso:.1%}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Valuta il prefiltro di LocalColab su un campione etichettato.")
+    parser.add_argument("--bench", required=True, help="Campione JSONL con un documento {'testo', 'rilevante'} per riga.")
+    parser.add_argument("--vault", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ObsidianNotes"),
+                        help="Vault Obsidian da cui prendere le note seme.")
+    parser.add_argument("--risultati", default="risultati_filtrati.json", help="Casi confermati da usare come semi.")
+    parser.add_argument("--soglie", type=float, nargs="+", default=[0.005, 0.01, 0.02, 0.03, 0.05, 0.08],
+                        help="Soglie da confrontare.")
+    args = parser.parse_args()
+
+    bench(Prefiltro.da_semi(args.vault, args.risultati), args.bench, args.soglie)
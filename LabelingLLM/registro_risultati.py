@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PERCORSO_REGISTRO = "risultati_filtrati.jsonl"
+CONFERMATO = "confermato"
+SCARTATO = "scartato"
+
+
+def _leggi_righe(percorso, con_offset=False):
+    """Restituisce i record del registro uno alla volta, saltando le righe incomplete (es. dopo un crash).
+
+    Con `con_offset=True` restituisce coppie (offset in byte della riga, record).
+    """
+    with open(percorso, "rb") as f:
+        offset = 0
+        for numero, riga in enumerate(f, 1):
+            inizio = offset
+            offset += len(riga)
+            if not riga.strip():
+                continue
+            try:
+                record = json.loads(riga)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                logger.warning(f"Riga {numero} di '{percorso}' non valida: ignorata.")
+                continue
+            yield (inizio, record) if con_offset else record
+
+
+class RegistroRisultati:
+    """Registro append-only (JSONL) degli esiti, scritto man mano che i documenti vengono analizzati.
+
+    Ogni riga è il risultato della ricerca con l'URL canonico e lo stato ("confermato" o
+    "scartato"), seguito per i casi confermati da luogo e data. Un'interruzione non fa perdere
+    le analisi già fatte: con `riprendi=True` il registro esistente viene esteso e gli URL già
+    presenti possono essere saltati; altrimenti viene ricominciato da capo.
+    """
+
+    def __init__(self, percorso=PERCORSO_REGISTRO, riprendi=False):
+        self.percorso = percorso
+        self.elaborati = set()
+        if riprendi and os.path.exists(percorso):
+            for record in _leggi_righe(percorso):
+                self.elaborati.add(record["url"])
+            logger.info(f"Ripresa da '{percorso}': {len(self.elaborati)} URL già elaborati.")
+        self.lock = threading.Lock()  # Il registro è scritto dai thread della pipeline
+        self.file = open(percorso, "a" if riprendi else "w", encoding="utf-8")
+        if self.file.tell() > 0:
+            with open(percorso, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self.file.write("\n")  # Chiude la riga troncata da un'interruzione
+
+    def elaborato(self, url):
+        """True se l'URL canonico ha già un esito nel registro."""
+        return url in self.elaborati
+
+    def registra(self, url, risultato, stato, **campi):
+        """Aggiunge l'esito di un documento e lo scrive subito su disco."""
+        record = {"url": url, "stato": stato, **risultato, **campi, "registrato": time.time()}
+        riga = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.file.write(riga)
+            self.file.flush()
+            self.elaborati.add(url)
+
+    def chiudi(self):
+        with self.lock:
+            self.file.close()
+
+
+def compatta(percorso_registro=PERCORSO_REGISTRO, percorso_json="risultati_filtrati.json"):
+    """Produce il JSON finale con i soli casi confermati a partire dal registro.
+
+    Per ogni URL vale l'ultimo esito registrato. La prima lettura tiene in memoria solo l'URL
+    dei casi confermati e l'offset della loro ultima riga; poi quelle righe vengono rilette e
+    scritte un risultato alla volta, senza conservare i record. Restituisce il numero di casi
+    scritti.
+    """
+    confermati = {}
+    for offset, record in _leggi_righe(percorso_registro, con_offset=True):
+        if record["stato"] == CONFERMATO:
+            confermati[record["url"]] = offset
+        else:
+            confermati.pop(record["url"], None)  # Un esito successivo annulla la conferma
+
+    scritti = 0
+    temporaneo = percorso_json + ".tmp"
+    with open(temporaneo, "w", encoding="utf-8") as f, open(percorso_registro, "rb") as registro:
+        f.write("[")
+        for offset in sorted(confermati.values()):  # Nell'ordine del registro
+            registro.seek(offset)
+            record = json.loads(registro.readline())
+            for campo in ("url", "stato", "registrato"):
+                record.pop(campo, None)
+            voce = json.dumps(record, indent=4, ensure_ascii=False).replace("\n", "\n    ")
+            f.write(f"{',' if scritti else ''}\n    {voce}")
+            scritti += 1
+        f.write("\n]" if scritti else "]")
+    os.replace(temporaneo, percorso_json)  # Il JSON precedente resta intatto fino alla fine
+    logger.info(f"Compattazione di '{percorso_registro}': {scritti} casi confermati salvati in '{percorso_json}'.")
+    return scritti
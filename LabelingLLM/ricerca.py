@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from duplicati import canonicalizza_url
+from pipeline import LimitatoreHost, Stadio, esegui_pipeline
+
+try:
+    from zoneinfo import ZoneInfo
+    FUSO_QUOTA = ZoneInfo("America/Los_Angeles")  # La quota giornaliera di Google si azzera a mezzanotte del Pacifico
+except Exception:  # Python < 3.9 o database dei fusi orari mancante
+    FUSO_QUOTA = timezone.utc
+
+logger = logging.getLogger(__name__)
+
+URL_SEARCH = "https://www.googleapis.com/customsearch/v1"
+PERCORSO_CACHE_RICERCHE = "cache/ricerche.sqlite3"
+RISULTATI_PER_PAGINA = 10  # Massimo consentito da Custom Search
+PROFONDITA_RICERCA = 3  # Pagine da RISULTATI_PER_PAGINA risultati lette per ogni query
+MAX_INIZIO = 91  # Custom Search non restituisce risultati oltre il centesimo
+TTL_RICERCHE = 7 * 24 * 3600  # Secondi di validità di una pagina di risultati in cache
+QUOTA_GIORNALIERA = 100  # Richieste gratuite al giorno
+INTERVALLO_RICERCHE = 0.6  # Secondi minimi tra due richieste (100 al minuto)
+PARALLELISMO_RICERCHE = 4
+MAX_TENTATIVI_LIMITE = 4  # Nuovi tentativi di una pagina rifiutata per il limite al minuto
+PAUSA_LIMITE = 2.0  # Secondi prima del primo nuovo tentativo, raddoppiati ai successivi
+MOTIVI_LIMITE_GIORNALIERO = frozenset(("dailyLimitExceeded", "dailyLimitExceededUnreg"))
+
+
+class QuotaEsaurita(Exception):
+    """La quota giornaliera di Custom Search è esaurita."""
+
+
+def _limite_giornaliero(response):
+    """Dice se un rifiuto per limite di frequenza riguarda la quota giornaliera.
+
+    Custom Search risponde 429 sia per il limite al minuto sia per quello giornaliero: li
+    distingue il corpo dell'errore (reason `dailyLimitExceeded`, messaggio "Queries per day"
+    o quota_limit `...PerDay...` nei dettagli).
+    """
+    try:
+        errore = response.json().get("error", {})
+    except (ValueError, AttributeError):
+        return False
+    if not isinstance(errore, dict):
+        return False
+    motivi = {e.get("reason") for e in errore.get("errors", []) if isinstance(e, dict)}
+    limiti = [d.get("metadata", {}).get("quota_limit", "") for d in errore.get("details", []) if isinstance(d, dict)]
+    return (bool(motivi & MOTIVI_LIMITE_GIORNALIERO) or "per day" in str(errore.get("message", "")).lower()
+            or any("PerDay" in limite for limite in limiti))
+
+
+class RicercaGoogle:
+    """Ricerca su Google Custom Search con paginazione, cache su disco e conteggio della quota.
+
+    Ogni pagina di risultati (query, start) viene conservata in SQLite per `ttl` secondi: le
+    esecuzioni successive non consumano quota per le stesse ricerche. Le richieste effettivamente
+    inviate vengono contate per giorno; raggiunta `quota_giornaliera` (o ricevuto un errore di
+    quota giornaliera da Google) le pagine non in cache vengono saltate fino al giorno dopo. I
+    rifiuti per il limite al minuto vengono invece ritentati con backoff esponenziale.
+    """
+
+    def __init__(self, api_key, cx, url=URL_SEARCH, percorso_cache=PERCORSO_CACHE_RICERCHE, ttl=TTL_RICERCHE,
+                 profondita=PROFONDITA_RICERCA, quota_giornaliera=QUOTA_GIORNALIERA,
+                 intervallo=INTERVALLO_RICERCHE, parallelismo=PARALLELISMO_RICERCHE):
+        directory = os.path.dirname(percorso_cache)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.api_key = api_key
+        self.cx = cx
+        self.url = url
+        self.ttl = ttl
+        self.profondita = profondita
+        self.quota_giornaliera = quota_giornaliera
+        self.parallelismo = parallelismo
+        self.limitatore = LimitatoreHost(intervallo)
+        self.sessione = requests.Session()
+        self.dalla_cache = 0
+        self.inviate = 0
+        self.prenotate = 0  # Richieste in corso, riservate nella quota ma non ancora contate
+        self.lock = threading.Lock()  # La connessione è condivisa dai thread delle ricerche
+        self.conn = sqlite3.connect(percorso_cache, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pagine (
+                query TEXT NOT NULL,
+                inizio INTEGER NOT NULL,
+                risposta TEXT NOT NULL,
+                creato REAL NOT NULL,
+                PRIMARY KEY (query, inizio)
+            );
+            CREATE TABLE IF NOT EXISTS quota (
+                giorno TEXT PRIMARY KEY,
+                richieste INTEGER NOT NULL
+            );
+        """)
+        self.conn.execute("DELETE FROM pagine WHERE creato < ?", (time.time() - ttl,))
+        self.conn.commit()
+
+    @staticmethod
+    def _giorno():
+        return datetime.now(FUSO_QUOTA).date().isoformat()
+
+    def quota_usata(self):
+        """Richieste inviate a Custom Search oggi (giorno della quota di Google)."""
+        with self.lock:
+            riga = self.conn.execute("SELECT richieste FROM quota WHERE giorno = ?", (self._giorno(),)).fetchone()
+        return riga[0] if riga else 0
+
+    def _prenota_richiesta(self):
+        """Riserva una richiesta nella quota di oggi; solleva QuotaEsaurita se non ne restano.
+
+        La prenotazione resta in memoria, così i thread paralleli non superano la quota; su
+        disco la richiesta viene contata da _conta_richiesta solo se è stata davvero inviata.
+        """
+        with self.lock:
+            riga = self.conn.execute("SELECT richieste FROM quota WHERE giorno = ?", (self._giorno(),)).fetchone()
+            usate = riga[0] if riga else 0
+            if usate + self.prenotate >= self.quota_giornaliera:
+                raise QuotaEsaurita(f"quota giornaliera esaurita ({usate}/{self.quota_giornaliera})")
+            self.prenotate += 1
+
+    def _conta_richiesta(self, inviata):
+        """Chiude una prenotazione, contando la richiesta nella quota di oggi se è stata inviata."""
+        giorno = self._giorno()
+        with self.lock:
+            self.prenotate -= 1
+            if not inviata:
+                return
+            riga = self.conn.execute("SELECT richieste FROM quota WHERE giorno = ?", (giorno,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO quota VALUES (?, ?)", (giorno, (riga[0] if riga else 0) + 1))
+            self.conn.commit()
+            self.inviate += 1
+
+    def _segna_quota_esaurita(self):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO quota VALUES (?, ?)", (self._giorno(), self.quota_giornaliera))
+            self.conn.commit()
+
+    def pagina(self, query, inizio=1):
+        """Restituisce la risposta JSON di Custom Search per (query, inizio), dalla cache se valida."""
+        with self.lock:
+            riga = self.conn.execute("SELECT risposta FROM pagine WHERE query = ? AND inizio = ? AND creato >= ?",
+                                     (query, inizio, time.time() - self.ttl)).fetchone()
+            if riga is not None:
+                self.dalla_cache += 1
+                return json.loads(riga[0])
+
+        params = {"key": self.api_key, "cx": self.cx, "q": query, "num": RISULTATI_PER_PAGINA, "start": inizio}
+        for tentativo in range(MAX_TENTATIVI_LIMITE + 1):
+            self._prenota_richiesta()
+            limite = False
+            response = None
+            try:
+                self.limitatore.attendi(self.url)
+                response = self.sessione.get(self.url, params=params, timeout=10)
+                limite = response.status_code == 429 or (response.status_code == 403 and "LimitExceeded" in response.text)
+            finally:
+                # Gli errori di rete e i rifiuti per limite non consumano la quota di Google
+                self._conta_richiesta(response is not None and not limite)
+            if not limite:
+                break
+            if _limite_giornaliero(response):
+                self._segna_quota_esaurita()
+                raise QuotaEsaurita(f"Custom Search ha rifiutato la richiesta per la quota giornaliera: {response.status_code}")
+            if tentativo == MAX_TENTATIVI_LIMITE:
+                break
+            retry_after = response.headers.get("Retry-After", "")
+            pausa = float(retry_after) if retry_after.isdigit() else PAUSA_LIMITE * 2 ** tentativo
+            logger.warning(f"Custom Search: limite di frequenza superato ({response.status_code}), "
+                           f"nuovo tentativo tra {pausa:.1f}s")
+            time.sleep(pausa)
+        response.raise_for_status()
+        data = response.json()
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO pagine VALUES (?, ?, ?, ?)",
+                              (query, inizio, json.dumps(data), time.time()))
+            self.conn.commit()
+        return data
+
+    def cerca(self, categoria, query, profondita=None):
+        """Legge fino a `profondita` pagine di risultati per la query (di default quelle dell'istanza)
+        e li restituisce come dizionari."""
+        risultati = []
+        for numero in range(self.profondita if profondita is None else profondita):
+            inizio = 1 + numero * RISULTATI_PER_PAGINA
+            if inizio > MAX_INIZIO:
+                break
+            try:
+                data = self.pagina(query, inizio)
+            except QuotaEsaurita as e:
+                logger.warning(f"Ricerca '{query}' interrotta a pagina {numero + 1}: {e}")
+                break
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.error(f"Errore durante la ricerca per '{query}' (start={inizio}): {e}")
+                break
+            for item in data.get("items", []):
+                risultati.append({
+                    "categoria": categoria,
+                    "titolo": item["title"],
+                    "link": item["link"],
+                    "descrizione": item.get("snippet", "N/A")
+                })
+            if len(data.get("items", [])) < RISULTATI_PER_PAGINA or "nextPage" not in data.get("queries", {}):
+                break
+        logger.info(f"Trovati {len(risultati)} risultati per '{query}' ({categoria}).")
+        return risultati
+
+    def cerca_tutte(self, categorie):
+        """Esegue in parallelo tutte le query di {categoria: [parole chiave]} entro il limite di frequenza.
+
+        I link ripetuti (stesso URL canonico) vengono tenuti una sola volta, con la prima
+        categoria in cui compaiono nell'ordine di `categorie`.
+        """
+        ricerche = [(categoria, parola) for categoria, parole_chiave in categorie.items() for parola in parole_chiave]
+        stadio = Stadio("ricerca", lambda ricerca: self.cerca(*ricerca), parallelismo=self.parallelismo)
+        risultati = []
+        visti = set()
+        totale = 0
+        for trovati in esegui_pipeline(ricerche, [stadio]):
+            for risultato in trovati or []:
+                totale += 1
+                chiave = canonicalizza_url(risultato["link"])
+                if chiave not in visti:
+                    visti.add(chiave)
+                    risultati.append(risultato)
+        logger.info(f"Ricerche: {len(risultati)} link unici su {totale}, {self.inviate} richieste inviate, "
+                    f"{self.dalla_cache} pagine dalla cache, quota usata oggi {self.quota_usata()}/{self.quota_giornaliera}.")
+        return risultati
+
+    def chiudi(self):
+        self.sessione.close()
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,191 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+APERTURA_THINK = "<think>"
+CHIUSURA_THINK = "</think>"
+CAMPI = ("Risposta", "Titolo", "Luogo", "Data")
+CAMPO_RE = re.compile(r"^\W*(Risposta|Titolo|Luogo|Data)\W*:\s*(.*)$", re.IGNORECASE)
+
+CATEGORIE = ("Vatican Murder", "Disappearance", "Politics", "Serial Killers", "Massacre", "Mafia", "Conspiracy", "Misc")
+
+# Schema JSON dell'output vincolato di Ollama (parametro `format`): il modello può produrre solo questo record
+SCHEMA_RISPOSTA = {
+    "type": "object",
+    "properties": {
+        "caso": {"type": "boolean"},
+        "categoria": {"type": "string", "enum": list(CATEGORIE) + [""]},
+        "titolo": {"type": "string"},
+        "luogo": {"type": "string"},
+        "data": {"type": "string"},
+    },
+    "required": ["caso", "categoria", "titolo", "luogo", "data"],
+}
+
+
+@dataclass
+class EsitoAnalisi:
+    """Esito della classificazione di un testo da parte di Ollama."""
+
+    caso_confermato: bool
+    titolo: Optional[str] = None
+    luogo: Optional[str] = None
+    data: Optional[str] = None
+    categoria: Optional[str] = None
+    token_prompt: Optional[int] = None  # Token del prompt valutati da Ollama, se riportati
+    token_generati: Optional[int] = None  # Token generati (o frammenti ricevuti prima dell'interruzione)
+    durata: float = 0.0  # Secondi dall'invio della richiesta
+    errore_formato: bool = False  # La risposta non rispettava il formato richiesto
+    da_cache: bool = False
+
+    def tupla(self):
+        """(caso_confermato, luogo, data), la forma restituita da analizza_con_ollama."""
+        if not self.caso_confermato:
+            return False, None, None
+        return True, self.luogo, self.data
+
+
+def esito_da_json(risposta):
+    """Converte il record JSON prodotto con SCHEMA_RISPOSTA in un EsitoAnalisi.
+
+    Una risposta non valida (JSON troncato da `num_predict` o campi di tipo errato) produce un
+    esito negativo con `errore_formato`.
+    """
+    try:
+        record = json.loads(risposta)
+    except json.JSONDecodeError:
+        return EsitoAnalisi(False, errore_formato=True)
+    if not isinstance(record, dict) or not isinstance(record.get("caso"), bool):
+        return EsitoAnalisi(False, errore_formato=True)
+
+    def campo(nome):
+        valore = record.get(nome)
+        return valore.strip() or None if isinstance(valore, str) else None
+
+    if not record["caso"]:
+        return EsitoAnalisi(False)
+    return EsitoAnalisi(True, titolo=campo("titolo"), luogo=campo("luogo"), data=campo("data"),
+                        categoria=campo("categoria"))
+
+
+def _inizio_parziale(testo, marcatore):
+    """Posizione da cui `testo` termina con un prefisso incompleto di `marcatore`, o len(testo)."""
+    for lunghezza in range(min(len(marcatore) - 1, len(testo)), 0, -1):
+        if marcatore.startswith(testo[-lunghezza:]):
+            return len(testo) - lunghezza
+    return len(testo)
+
+
+def _valore_risposta(valore):
+    valore = valore.strip(" *_\"'.").lower()
+    if valore.startswith(("si", "sì")):
+        return True
+    if valore.startswith("no"):
+        return False
+    return None
+
+
+class ParserRispostaOllama:
+    """Analizza la risposta di Ollama un frammento alla volta, mentre viene generata.
+
+    Il ragionamento tra <think> e </think> viene scartato man mano invece di essere
+    accumulato, e i campi "Risposta:", "Titolo:", "Luogo:" e "Data:" sono riconosciuti
+    appena la loro riga è completa. `completo` diventa True quando la risposta è definitiva
+    (un "No", oppure un "Si" con tutti i campi): a quel punto si può chiudere lo streaming
+    senza attendere il resto della generazione.
+    """
+
+    def __init__(self):
+        self.in_think = False
+        self.in_sospeso = ""  # Testo non ancora classificabile (tag o riga incompleti)
+        self.riga = ""
+        self.righe = []
+        self.think_aperto = ""  # Contenuto di un <think> non ancora chiuso
+        self.campi = {}
+        self.frammenti = 0
+
+    def aggiungi(self, frammento):
+        """Consuma un frammento di testo generato; restituisce True se la risposta è definitiva."""
+        self.frammenti += 1
+        testo = self.in_sospeso + frammento
+        self.in_sospeso = ""
+        while testo:
+            if self.in_think:
+                fine = testo.find(CHIUSURA_THINK)
+                if fine == -1:
+                    taglio = _inizio_parziale(testo, CHIUSURA_THINK)
+                    self.think_aperto += testo[:taglio]
+                    self.in_sospeso = testo[taglio:]
+                    break
+                self.in_think = False
+                self.think_aperto = ""
+                testo = testo[fine + len(CHIUSURA_THINK):]
+            else:
+                inizio = testo.find(APERTURA_THINK)
+                if inizio == -1:
+                    taglio = _inizio_parziale(testo, APERTURA_THINK)
+                    self._aggiungi_visibile(testo[:taglio])
+                    self.in_sospeso = testo[taglio:]
+                    break
+                self._aggiungi_visibile(testo[:inizio])
+                self.in_think = True
+                testo = testo[inizio + len(APERTURA_THINK):]
+        return self.completo
+
+    def _aggiungi_visibile(self, testo):
+        righe = (self.riga + testo).split("\n")
+        self.riga = righe.pop()
+        for riga in righe:
+            self._chiudi_riga(riga)
+
+    def _chiudi_riga(self, riga):
+        self.righe.append(riga)
+        corrispondenza = CAMPO_RE.match(riga.strip())
+        if corrispondenza:
+            campo = corrispondenza.group(1).capitalize()
+            self.campi.setdefault(campo, corrispondenza.group(2).strip(" *_"))
+
+    @property
+    def completo(self):
+        if "Risposta" not in self.campi:
+            return False
+        confermato = _valore_risposta(self.campi["Risposta"])
+        if confermato is False:
+            return True
+        return confermato is True and all(campo in self.campi for campo in CAMPI)
+
+    def termina(self):
+        """Chiude l'ultima riga ancora aperta (fine dello streaming)."""
+        if self.in_think:
+            # Come la rimozione con regex: un <think> mai chiuso resta nel testo
+            self._aggiungi_visibile(APERTURA_THINK + self.think_aperto + self.in_sospeso)
+            self.in_think = False
+            self.think_aperto = ""
+        else:
+            self._aggiungi_visibile(self.in_sospeso)
+        self.in_sospeso = ""
+        if self.riga:
+            self._chiudi_riga(self.riga)
+            self.riga = ""
+
+    @property
+    def testo(self):
+        """Testo generato finora, senza il blocco <think>."""
+        return "\n".join(self.righe + ([self.riga] if self.riga else [])).strip()
+
+    def esito(self):
+        """Restituisce l'EsitoAnalisi costruito dai campi riconosciuti.
+
+        Se il modello non ha rispettato il formato "Risposta: <Si/No>", si ricade sul
+        criterio originale (il caso è confermato se il testo contiene "Si") e l'esito
+        viene marcato con `errore_formato`.
+        """
+        confermato = _valore_risposta(self.campi.get("Risposta", ""))
+        errore_formato = confermato is None
+        if errore_formato:
+            confermato = "Si" in self.testo
+        if not confermato:
+            return EsitoAnalisi(False, errore_formato=errore_formato)
+        return EsitoAnalisi(True, titolo=self.campi.get("Titolo"), luogo=self.campi.get("Luogo"),
+                            data=self.campi.get("Data"), errore_formato=errore_formato)
@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+CAPACITA_ENDPOINT = 1  # Richieste contemporanee per istanza (come OLLAMA_NUM_PARALLEL)
+MAX_TENTATIVI = 3
+SOGLIA_ERRORI = 2  # Errori consecutivi dopo i quali un'istanza esce dalla rotazione
+PAUSA_ESCLUSIONE = 30.0  # Secondi prima di verificare di nuovo un'istanza esclusa
+TIMEOUT_VERIFICA = 3.0
+
+
+class NessunaIstanzaDisponibile(requests.exceptions.ConnectionError):
+    """Tutte le istanze di Ollama sono escluse dalla rotazione perché non rispondono."""
+
+
+class EndpointOllama:
+    """Un'istanza di Ollama con la sua sessione HTTP keep-alive e lo stato di carico e salute."""
+
+    def __init__(self, url, capacita=CAPACITA_ENDPOINT):
+        self.url = url.rstrip("/")
+        self.capacita = capacita
+        self.sessione = requests.Session()
+        adattatore = HTTPAdapter(pool_connections=1, pool_maxsize=max(capacita, 1) * 2)
+        self.sessione.mount("http://", adattatore)
+        self.sessione.mount("https://", adattatore)
+        self.in_corso = 0
+        self.completati = 0
+        self.errori = 0
+        self.errori_consecutivi = 0
+        self.escluso_fino = 0.0
+        self.in_verifica = False
+        self.durata_media = None  # Media mobile esponenziale delle durate, per gli spareggi
+
+    @property
+    def disponibile(self):
+        return self.escluso_fino == 0.0 and self.in_corso < self.capacita
+
+    def verifica(self):
+        """Controlla che l'istanza risponda (GET /api/tags)."""
+        try:
+            response = self.sessione.get(f"{self.url}/api/tags", timeout=TIMEOUT_VERIFICA)
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Istanza Ollama {self.url} non raggiungibile: {e}")
+            return False
+
+
+class SchedulerOllama:
+    """Distribuisce le richieste a Ollama su più istanze.
+
+    Ogni documento va all'istanza disponibile meno carica (a parità, la più veloce); quando
+    tutte sono occupate il thread attende che se ne liberi una, così le istanze veloci prendono
+    più lavoro di quelle lente. Un lavoro fallito viene ripetuto su un'altra istanza; un'istanza
+    con SOGLIA_ERRORI errori consecutivi esce dalla rotazione e rientra dopo PAUSA_ESCLUSIONE
+    secondi, solo se risponde al controllo di salute. Se nessuna istanza è in rotazione le
+    richieste falliscono subito invece di attendere: i documenti successivi riprovano a
+    riammetterle quando la pausa è scaduta.
+    """
+
+    def __init__(self, url_endpoint, capacita=CAPACITA_ENDPOINT, max_tentativi=MAX_TENTATIVI,
+                 soglia_errori=SOGLIA_ERRORI, pausa_esclusione=PAUSA_ESCLUSIONE):
+        if not url_endpoint:
+            raise ValueError("Serve almeno un endpoint Ollama.")
+        self.endpoint = [EndpointOllama(url, capacita) for url in url_endpoint]
+        self.max_tentativi = max_tentativi
+        self.soglia_errori = soglia_errori
+        self.pausa_esclusione = pausa_esclusione
+        self.condizione = threading.Condition()
+
+    @property
+    def capacita(self):
+        """Richieste contemporanee gestibili da tutte le istanze insieme."""
+        return sum(endpoint.capacita for endpoint in self.endpoint)
+
+    def verifica_tutti(self):
+        """Controlla tutte le istanze ed esclude quelle che non rispondono; restituisce quelle sane."""
+        sani = []
+        for endpoint in self.endpoint:
+            if endpoint.verifica():
+                sani.append(endpoint.url)
+            else:
+                with self.condizione:
+                    endpoint.escluso_fino = time.monotonic() + self.pausa_esclusione
+        logger.info(f"Istanze Ollama disponibili: {len(sani)}/{len(self.endpoint)}")
+        return sani
+
+    def _riammetti_scadute(self):
+        """Verifica le istanze la cui esclusione è scaduta (fuori dal lock) e le riammette se sane."""
+        adesso = time.monotonic()
+        with self.condizione:
+            da_verificare = [e for e in self.endpoint
+                             if 0.0 < e.escluso_fino <= adesso and not e.in_verifica]
+            for endpoint in da_verificare:
+                endpoint.in_verifica = True
+        for endpoint in da_verificare:
+            sano = endpoint.verifica()
+            with self.condizione:
+                endpoint.in_verifica = False
+                if sano:
+                    logger.info(f"Istanza Ollama {endpoint.url} di nuovo in rotazione.")
+                    endpoint.escluso_fino = 0.0
+                    endpoint.errori_consecutivi = 0
+                    self.condizione.notify_all()
+                else:
+                    endpoint.escluso_fino = time.monotonic() + self.pausa_esclusione
+
+    def _acquisisci(self, da_evitare):
+        while True:
+            self._riammetti_scadute()
+            with self.condizione:
+                candidati = [e for e in self.endpoint if e.disponibile and e.url not in da_evitare]
+                if not candidati and da_evitare:
+                    # Meglio ritentare su un'istanza già provata che restare fermi
+                    candidati = [e for e in self.endpoint if e.disponibile]
+                if candidati:
+                    scelto = min(candidati, key=lambda e: (e.in_corso / e.capacita,
+                                                           e.durata_media if e.durata_media is not None else 0.0))
+                    scelto.in_corso += 1
+                    return scelto
+                if all(e.escluso_fino for e in self.endpoint):
+                    raise NessunaIstanzaDisponibile(
+                        f"nessuna istanza Ollama in rotazione ({len(self.endpoint)} escluse)")
+                self.condizione.wait(timeout=1.0)
+
+    def _rilascia(self, endpoint, durata=None):
+        with self.condizione:
+            endpoint.in_corso -= 1
+            if durata is None:
+                endpoint.errori += 1
+                endpoint.errori_consecutivi += 1
+                if endpoint.errori_consecutivi >= self.soglia_errori and not endpoint.escluso_fino:
+                    logger.warning(f"Istanza Ollama {endpoint.url} esclusa dalla rotazione dopo "
+                                   f"{endpoint.errori_consecutivi} errori consecutivi.")
+                    endpoint.escluso_fino = time.monotonic() + self.pausa_esclusione
+            else:
+                endpoint.completati += 1
+                endpoint.errori_consecutivi = 0
+                endpoint.durata_media = durata if endpoint.durata_media is None else 0.8 * endpoint.durata_media + 0.2 * durata
+            self.condizione.notify_all()
+
+    def esegui(self, lavoro):
+        """Esegue `lavoro(sessione, url_base)` su un'istanza e ne restituisce il risultato.
+
+        Se il lavoro solleva requests.exceptions.RequestException viene ripetuto su un'altra
+        istanza, fino a `max_tentativi` volte; poi l'ultimo errore viene propagato, come quando
+        nessuna istanza è in rotazione (NessunaIstanzaDisponibile). Gli altri errori del lavoro
+        (ad esempio una risposta malformata) vengono propagati subito, senza escludere l'istanza.
+        """
+        provati = set()
+        ultimo_errore = None
+        for _ in range(self.max_tentativi):
+            try:
+                endpoint = self._acquisisci(provati)
+            except NessunaIstanzaDisponibile:
+                if ultimo_errore is not None:
+                    raise ultimo_errore
+                raise
+            inizio = time.monotonic()
+            durata = None  # Resta None solo per gli errori di comunicazione, contati per l'esclusione
+            try:
+                risultato = lavoro(endpoint.sessione, endpoint.url)
+                durata = time.monotonic() - inizio
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Richiesta a {endpoint.url} fallita: {e}")
+                provati.add(endpoint.url)
+                ultimo_errore = e
+                continue
+            except Exception:
+                durata = time.monotonic() - inizio
+                raise
+            finally:
+                self._rilascia(endpoint, durata)  # Su ogni uscita, o la capacità dell'istanza resterebbe occupata
+            return risultato
+        raise ultimo_errore
+
+    def statistiche(self):
+        """Restituisce per ogni istanza richieste completate, errori e durata media."""
+        with self.condizione:
+            return [{"url": e.url, "completati": e.completati, "errori": e.errori,
+                     "durata_media": e.durata_media, "in_rotazione": not e.escluso_fino} for e in self.endpoint]
+
+    def chiudi(self):
+        for riga in self.statistiche():
+            durata = f"{riga['durata_media']:.2f}s" if riga['durata_media'] is not None else "n/d"
+            logger.info(f"Ollama {riga['url']}: {riga['completati']} completati, {riga['errori']} errori, "
+                        f"durata media {durata}")
+        for endpoint in self.endpoint:
+            endpoint.sessione.close()
@@ -0,0 +1,109 @@
+"""Benchmark dell'estrazione del testo di LocalColab: velocità (MB/s) e token inviati al modello.
+
+Confronta l'estrazione originale (Beautiful Soup con html.parser e get_text() dell'intera
+pagina) con quella del contenuto principale, su pagine sintetiche in stile testata giornalistica
+o su una cartella di file HTML salvati. Le pagine sintetiche alternano l'impaginazione a blocchi
+(<header>, <article>, <aside>) e quella a tabelle dei siti più vecchi, con il contenuto dentro un
+<td>; la colonna "con menu" conta le pagine il cui testo estratto contiene ancora la testata.
+
+Uso: python bench/bench_estrazione.py [--pagine 200] [--layout misto] [--html-dir pagine/] [--budget-token 1500]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "LabelingLLM"))
+
+from estrazione import dividi_in_blocchi, estrai_contenuto_principale, lxml_html, stima_token
+
+PAROLE = ("il caso omicidio indagini procura vittima testimone notte polizia carabinieri sospettato movente "
+          "arma processo sentenza giudice avvocato famiglia quartiere città auto corpo ritrovato anni dopo "
+          "inchiesta pista mafia scomparsa strage magistrato perizia").split()
+
+
+def estrazione_originale(contenuto):
+    """L'estrazione precedente: tutto il testo della pagina, meno script e stili."""
+    soup = BeautifulSoup(contenuto, "html.parser")
+    for script in soup(["script", "style"]):
+        script.extract()
+    return soup.get_text().strip()
+
+
+def _frase(rng, parole):
+    return " ".join(rng.choice(PAROLE) for _ in range(parole)).capitalize() + "."
+
+
+def pagina_sintetica(rng):
+    """Una pagina di notizie con menu, barre laterali, script, banner e piè di pagina."""
+    menu = "".join(f'<li><a href="/sezione/{i}">{_frase(rng, 2)}</a></li>' for i in range(rng.randint(40, 120)))
+    correlati = "".join(f'<li><a href="/articolo/{i}">{_frase(rng, 8)}</a></li>' for i in range(rng.randint(10, 30)))
+    paragrafi = "".join(f"<p>{' '.join(_frase(rng, rng.randint(8, 20)) for _ in range(rng.randint(2, 6)))}</p>"
+                        for _ in range(rng.randint(4, 15)))
+    script = "".join(f"<script>window.dati{i} = {list(range(rng.randint(50, 300)))};</script>" for i in range(8))
+    commenti = "".join(f'<div class="comment"><p>{_frase(rng, 15)}</p></div>' for _ in range(rng.randint(0, 20)))
+    return (f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{_frase(rng, 6)}</title>{script}"
+            f"<style>{'.c{color:red}' * 200}</style></head><body>"
+            f'<header><div class="logo">Testata</div><nav class="main-menu"><ul>{menu}</ul></nav></header>'
+            f'<div class="cookie-banner">Questo sito usa cookie. <button>Accetta</button></div>'
+            f'<div class="container"><article><h1>{_frase(rng, 8)}</h1><div class="share">Condividi</div>{paragrafi}'
+            f'</article><aside class="sidebar"><h3>Leggi anche</h3><ul>{correlati}</ul></aside></div>'
+            f'<section class="comments">{commenti}</section>'
+            f"<footer><p>{_frase(rng, 30)}</p><ul>{menu}</ul></footer></body></html>").encode("utf-8")
+
+
+def pagina_tabellare(rng):
+    """Una pagina impaginata a tabelle: menu, articolo e piè di pagina in celle <td>, senza tag semantici."""
+    menu = "".join(f'<a href="/sezione/{i}">{_frase(rng, 2)}</a> | ' for i in range(rng.randint(40, 120)))
+    correlati = "".join(f'<div><a href="/articolo/{i}">{_frase(rng, 8)}</a></div>' for i in range(rng.randint(10, 30)))
+    paragrafi = "".join(f"<p>{' '.join(_frase(rng, rng.randint(8, 20)) for _ in range(rng.randint(2, 6)))}</p>"
+                        for _ in range(rng.randint(4, 15)))
+    return (f"<html><head><meta charset='utf-8'><title>{_frase(rng, 6)}</title></head><body>"
+            f'<table width="100%"><tr><td colspan="2"><div><b>Testata</b> {menu}</div></td></tr>'
+            f'<tr><td width="70%"><div id="articolo"><h2>{_frase(rng, 8)}</h2>{paragrafi}</div></td>'
+            f'<td width="30%"><div>{correlati}</div></td></tr>'
+            f'<tr><td colspan="2"><div>{_frase(rng, 30)} {menu}</div></td></tr></table>'
+            f"</body></html>").encode("utf-8")
+
+
+def misura(nome, estrai, pagine, megabyte, budget_token):
+    inizio = time.perf_counter()
+    testi = [estrai(pagina) for pagina in pagine]
+    durata = time.perf_counter() - inizio
+    token = sum(stima_token(testo) for testo in testi)
+    token_budget = sum(stima_token(dividi_in_blocchi(testo, budget_token)[0]) if testo else 0 for testo in testi)
+    con_menu = sum("Testata" in testo for testo in testi)
+    print(f"{nome:<22}{durata:>8.2f} s{megabyte / durata:>9.1f} MB/s{token / len(pagine):>14.0f}"
+          f"{token_budget / len(pagine):>16.0f}{con_menu:>10}")
+    return token
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dell'estrazione del testo delle pagine.")
+    parser.add_argument("--pagine", type=int, default=200, help="Numero di pagine sintetiche.")
+    parser.add_argument("--layout", choices=["blocchi", "tabella", "misto"], default="misto",
+                        help="Impaginazione delle pagine sintetiche (misto: alternate).")
+    parser.add_argument("--html-dir", default=None, help="Cartella di pagine HTML reali da usare al posto di quelle sintetiche.")
+    parser.add_argument("--budget-token", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.html_dir:
+        pagine = []
+        for nome_file in sorted(os.listdir(args.html_dir)):
+            with open(os.path.join(args.html_dir, nome_file), "rb") as f:
+                pagine.append(f.read())
+    else:
+        rng = random.Random(args.seed)
+        generatori = {"blocchi": [pagina_sintetica], "tabella": [pagina_tabellare],
+                      "misto": [pagina_sintetica, pagina_tabellare]}[args.layout]
+        pagine = [generatori[numero % len(generatori)](rng) for numero in range(args.pagine)]
+    megabyte = sum(len(pagina) for pagina in pagine) / 1e6
+    print(f"{len(pagine)} pagine, {megabyte:.1f} MB, parser: {'lxml' if lxml_html is not None else 'html.parser'}")
+    print(f"{'estrazione':<22}{'tempo':>10}{'velocità':>14}{'token/pagina':>14}{'con budget':>16}{'con menu':>10}")
+    originali = misura("originale", estrazione_originale, pagine, megabyte, args.budget_token)
+    nuovi = misura("contenuto principale", estrai_contenuto_principale, pagine, megabyte, args.budget_token)
+    print(f"Riduzione dei token: {1 - nuovi / originali:.1%}")
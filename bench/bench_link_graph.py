@@ -0,0 +1,96 @@
+"""Benchmark del motore LinkGraph su un grafo sintetico con distribuzione dei gradi a coda lunga.
+
+La costruzione è misurata anche end-to-end, come la usano link_graph.py e le query: da un vault
+di note scritte con render_note e dalle esportazioni jsonl e sqlite di program.py --export,
+rileggendo le sorgenti e poi caricando lo snapshot .npz. Il benchmark termina con codice 1 se
+un caricamento dallo snapshot supera --max-load secondi o non dà lo stesso grafo.
+
+Uso: python bench/bench_link_graph.py [--nodes 120000] [--edges-per-node 12] [--max-load 1.0] [--skip-files]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crawl_export import CrawlExporter
+from link_graph import CSR_ARRAYS, LinkGraph
+from markdown_writer import render_note
+
+
+def timed(label, function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    timed.elapsed = time.perf_counter() - start
+    print(f"{label:<40}{timed.elapsed * 1000:>10.1f} ms")
+    return result
+
+
+def same_graph(a, b):
+    return a.titles == b.titles and all(np.array_equal(getattr(a, name), getattr(b, name)) for name in CSR_ARRAYS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark di LinkGraph su un grafo sintetico.")
+    parser.add_argument("--nodes", type=int, default=120_000)
+    parser.add_argument("--edges-per-node", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-load", type=float, default=1.0, help="Secondi massimi per caricare il grafo da uno snapshot.")
+    parser.add_argument("--skip-files", action="store_true", help="Non misura la costruzione da vault ed esportazioni.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    edge_count = args.nodes * args.edges_per_node
+    sources = rng.integers(0, args.nodes, edge_count)
+    # Destinazioni con legge di Zipf: poche voci molto citate (Italia, Roma...) e una lunga coda
+    targets = (rng.zipf(1.3, edge_count) - 1) % args.nodes
+    titles = [f"Voce {node}" for node in range(args.nodes)]
+    edges = [(titles[source], titles[target]) for source, target in zip(sources.tolist(), targets.tolist())]
+    print(f"Graph: {args.nodes} nodes, {edge_count} edges")
+
+    graph = timed("build from title pairs", LinkGraph.from_edges, edges)
+    timed("build from id arrays", LinkGraph, titles, sources, targets)
+
+    failures = []
+    if not args.skip_files:
+        pages = {}
+        for source, target in edges:
+            pages.setdefault(source, {}).setdefault(target, f"https://it.wikipedia.org/wiki/{target.replace(' ', '_')}")
+        with tempfile.TemporaryDirectory(prefix="bench_link_graph_") as directory:
+            vault_dir = os.path.join(directory, "vault")
+            os.makedirs(os.path.join(vault_dir, "Voci"))
+            exports = [os.path.join(directory, "crawl.jsonl"), os.path.join(directory, "crawl.sqlite")]
+            exporters = [CrawlExporter(path) for path in exports]
+            for page_title, links in pages.items():
+                data = {'url': f"https://it.wikipedia.org/wiki/{page_title.replace(' ', '_')}", 'topic': "Voci", 'links': links}
+                with open(os.path.join(vault_dir, "Voci", f"{page_title}.md"), "w", encoding="utf-8") as note:
+                    note.write(render_note(page_title, data))
+                for exporter in exporters:
+                    exporter.add_page(page_title, data)
+            for exporter in exporters:
+                exporter.close()
+            sources = [("vault", LinkGraph.from_vault, vault_dir)]
+            sources += [(f"export {os.path.splitext(path)[1][1:]}", LinkGraph.from_export, path) for path in exports]
+            for label, load, source in sources:
+                rebuilt = timed(f"build from {label}", load, source, snapshot=False)
+                timed(f"build + save snapshot ({label})", load, source)
+                loaded = timed(f"load snapshot ({label})", load, source)
+                if timed.elapsed > args.max_load:
+                    failures.append(f"{label}: snapshot loaded in {timed.elapsed:.2f}s (limit {args.max_load:.2f}s)")
+                if not same_graph(loaded, rebuilt):
+                    failures.append(f"{label}: snapshot graph differs from the rebuilt one")
+
+    timed("degree ranking", graph.top_degree, 10)
+    timed("pagerank", graph.pagerank)
+    timed("shared neighbors", graph.shared_neighbors, "Voce 1", "Voce 2")
+    timed("co-citation ranking", graph.cocitation, "Voce 3")
+    timed("similar pages", graph.similar, "Voce 1")
+    path = timed("shortest path", graph.shortest_path, "Voce 11", f"Voce {args.nodes - 7}")
+    print(f"Path length: {len(path) - 1 if path else None}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
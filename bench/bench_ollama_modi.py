@@ -0,0 +1,101 @@
+"""Confronto delle modalità di analisi di LocalColab: righe in streaming ("testo") e output JSON
+vincolato da schema ("json").
+
+Per ogni modalità invia gli stessi testi a Ollama e riporta latenza, token del prompt e generati,
+tasso di risposte fuori formato ed errori; con un campione etichettato anche l'accuratezza.
+
+Uso: python bench/bench_ollama_modi.py [--campione campione.jsonl] [--url http://127.0.0.1:11434/api/generate]
+Il campione è un file JSONL con un documento {"testo": ..., "rilevante": true/false} per riga
+("rilevante" è facoltativo).
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "LabelingLLM"))
+
+import LocalColab
+
+CAMPIONE_PREDEFINITO = [
+    {"testo": "Il boss di Cosa Nostra è stato ucciso a Palermo in un agguato il 12 marzo 1992. "
+              "Le indagini della procura antimafia non hanno mai individuato i mandanti.", "rilevante": True},
+    {"testo": "Emanuela Orlandi, cittadina vaticana, scomparve a Roma il 22 giugno 1983 all'uscita "
+              "dalla scuola di musica. Il caso non è mai stato risolto.", "rilevante": True},
+    {"testo": "La strage di piazza della Loggia: il 28 maggio 1974 a Brescia una bomba esplose durante "
+              "una manifestazione causando otto vittime.", "rilevante": True},
+    {"testo": "Scopri le offerte del weekend: scarpe da ginnastica e giacche con sconti fino al 50%. "
+              "Spedizione gratuita per ordini superiori a 49 euro.", "rilevante": False},
+    {"testo": "Ricetta della pasta alla carbonara: guanciale, uova, pecorino romano e pepe nero.", "rilevante": False},
+    {"testo": "Meteo: domani cielo sereno al nord, piogge sparse al sud e temperature in aumento.", "rilevante": False},
+]
+
+FUNZIONI = {"testo": LocalColab.interroga_ollama_testo, "json": LocalColab.interroga_ollama_json}
+
+
+def esegui_modalita(modalita, documenti):
+    """Analizza tutti i documenti con una modalità; restituisce la lista di EsitoAnalisi (None se errore)."""
+    esiti = []
+    for documento in documenti:
+        try:
+            esiti.append(FUNZIONI[modalita](documento["testo"]))
+        except Exception as e:
+            logging.error(f"Errore in modalità {modalita}: {e}")
+            esiti.append(None)
+    return esiti
+
+
+def _media(valori):
+    valori = [v for v in valori if v is not None]
+    return f"{np.mean(valori):.1f}" if valori else "n/d"
+
+
+def riepilogo(modalita, documenti, esiti):
+    validi = [esito for esito in esiti if esito is not None]
+    durate = [esito.durata for esito in validi]
+    riga = {
+        "modalita": modalita,
+        "latenza_media": f"{np.mean(durate):.2f}s" if durate else "n/d",
+        "latenza_p95": f"{np.percentile(durate, 95):.2f}s" if durate else "n/d",
+        "token_prompt": _media([esito.token_prompt for esito in validi]),
+        "token_generati": _media([esito.token_generati for esito in validi]),
+        "fuori_formato": f"{np.mean([esito.errore_formato for esito in validi]):.0%}" if validi else "n/d",
+        "errori": len(esiti) - len(validi),
+    }
+    etichettati = [(documento["rilevante"], esito.caso_confermato) for documento, esito in zip(documenti, esiti)
+                   if esito is not None and "rilevante" in documento]
+    riga["accuratezza"] = f"{np.mean([a == b for a, b in etichettati]):.0%}" if etichettati else "n/d"
+    return riga
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confronta le modalità di analisi di Ollama di LocalColab.")
+    parser.add_argument("--campione", default=None, help="File JSONL con i testi da analizzare.")
+    parser.add_argument("--url", default=LocalColab.URL_OLLAMA, help="Endpoint /api/generate di Ollama.")
+    parser.add_argument("--modalita", nargs="+", choices=LocalColab.MODALITA, default=list(LocalColab.MODALITA))
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    LocalColab.URL_OLLAMA = args.url
+    if args.campione:
+        with open(args.campione, "r", encoding="utf-8") as f:
+            documenti = [json.loads(riga) for riga in f if riga.strip()]
+    else:
+        documenti = CAMPIONE_PREDEFINITO
+
+    risultati = {modalita: esegui_modalita(modalita, documenti) for modalita in args.modalita}
+    colonne = ("modalita", "latenza_media", "latenza_p95", "token_prompt", "token_generati", "fuori_formato",
+               "errori", "accuratezza")
+    print(f"{len(documenti)} documenti, modello {LocalColab.MODELLO_OLLAMA}")
+    print("\t".join(colonne))
+    for modalita, esiti in risultati.items():
+        riga = riepilogo(modalita, documenti, esiti)
+        print("\t".join(str(riga[colonna]) for colonna in colonne))
+    if len(risultati) == 2:
+        primi, secondi = risultati.values()
+        concordi = [a.caso_confermato == b.caso_confermato for a, b in zip(primi, secondi) if a is not None and b is not None]
+        if concordi:
+            print(f"Concordanza tra le modalità: {np.mean(concordi):.0%}")
@@ -0,0 +1,74 @@
+"""Benchmark dello scheduler multi-istanza di Ollama su istanze finte di velocità diverse.
+
+Avvia alcune istanze FakeOllama (una veloce, una lenta, una con errori occasionali e una guasta),
+analizza N documenti con lo stadio LLM di LocalColab e riporta per ogni istanza le richieste
+completate e gli errori, insieme al throughput complessivo. Per confronto misura anche una sola
+istanza veloce senza scheduler.
+
+Uso: python bench/bench_scheduler_ollama.py [--documenti 60] [--modalita testo|json]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "LabelingLLM"))
+
+import LocalColab
+from fake_servers import FakeOllama
+from pipeline import Stadio, esegui_pipeline
+from scheduler_ollama import SchedulerOllama
+
+TESTI = ("Il corpo della vittima fu ritrovato a Roma: l'omicidio non è mai stato risolto.",
+         "Offerte del weekend su scarpe e giacche, spedizione gratuita.",
+         "La strage di Bologna del 2 agosto 1980 resta al centro di indagini e processi.",
+         "Meteo: domani cielo sereno al nord e piogge al sud.")
+
+
+def analizza(documenti, modalita, scheduler=None, parallelismo=1):
+    """Analizza i documenti con lo stadio LLM; restituisce (durata, esiti)."""
+    stadio = Stadio("llm", lambda testo: LocalColab.classifica_testo(testo, modalita=modalita, scheduler=scheduler),
+                    parallelismo=parallelismo)
+    inizio = time.perf_counter()
+    esiti = esegui_pipeline(documenti, [stadio])
+    return time.perf_counter() - inizio, esiti
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dello scheduler di Ollama con istanze finte.")
+    parser.add_argument("--documenti", type=int, default=60)
+    parser.add_argument("--modalita", choices=LocalColab.MODALITA, default="testo")
+    parser.add_argument("--latenza-token", type=float, default=0.002, help="Latenza per token dell'istanza veloce.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    documenti = [f"{TESTI[i % len(TESTI)]} (documento {i})" for i in range(args.documenti)]
+    istanze = {
+        "veloce": FakeOllama(latenza_token=args.latenza_token).avvia(),
+        "lenta": FakeOllama(latenza_token=args.latenza_token * 3).avvia(),
+        "instabile": FakeOllama(latenza_token=args.latenza_token, errori=0.3, seme=1).avvia(),
+        "guasta": FakeOllama(guasto=True).avvia(),
+    }
+    nomi = {fake.url: nome for nome, fake in istanze.items()}
+    try:
+        LocalColab.URL_OLLAMA = f"{istanze['veloce'].url}/api/generate"
+        durata_singola, _ = analizza(documenti, args.modalita)
+
+        scheduler = SchedulerOllama([fake.url for fake in istanze.values()], pausa_esclusione=1.0)
+        sane = scheduler.verifica_tutti()
+        durata, esiti = analizza(documenti, args.modalita, scheduler, parallelismo=scheduler.capacita)
+        statistiche = scheduler.statistiche()
+        scheduler.chiudi()
+    finally:
+        for fake in istanze.values():
+            fake.ferma()
+
+    print(f"{args.documenti} documenti, modalità {args.modalita}, istanze sane all'avvio: {len(sane)}/{len(istanze)}")
+    print(f"{'istanza':<12}{'completati':>12}{'errori':>8}{'durata media':>14}{'in rotazione':>14}")
+    for riga in statistiche:
+        media = f"{riga['durata_media']:.3f}s" if riga["durata_media"] is not None else "n/d"
+        print(f"{nomi[riga['url']]:<12}{riga['completati']:>12}{riga['errori']:>8}{media:>14}{str(riga['in_rotazione']):>14}")
+    falliti = sum(esito is None for esito in esiti)
+    print(f"Una istanza, senza scheduler: {durata_singola:.2f}s ({args.documenti / durata_singola:.1f} doc/s)")
+    print(f"Scheduler: {durata:.2f}s ({args.documenti / durata:.1f} doc/s), documenti non analizzati: {falliti}")
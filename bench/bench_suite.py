@@ -0,0 +1,164 @@
+"""Suite di benchmark end-to-end del crawler (program.py) e dell'etichettatura (LabelingLLM/LocalColab.py).
+
+Tutti i servizi esterni sono sostituiti da server finti locali (bench/fake_servers.py): l'API
+di MediaWiki serve le pagine e la categoria "Categoria:Casi di omicidio irrisolti in Italia"
+ricostruite dalle note del vault, Custom Search restituisce articoli sintetici e Ollama risponde
+con una latenza per token configurabile. Ogni scenario gira in un processo separato, in una
+cartella temporanea, e ne vengono misurati tempo totale, richieste al secondo e picco di memoria.
+
+I risultati possono essere salvati come baseline e confrontati nelle esecuzioni successive: uno
+scenario più lento o più pesante della baseline oltre la tolleranza viene segnalato come
+regressione (codice di uscita 1).
+
+Uso: python bench/bench_suite.py [--scenari crawl bfs etichettatura] [--salva-baseline] [--tolleranza 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_servers import FakeCustomSearch, FakeMediaWiki, FakeOllama, corpus_da_vault
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCORSO_BASELINE = os.path.join(RADICE, "bench", "baseline_suite.json")
+CATEGORIA = "Categoria:Casi_di_omicidio_irrisolti_in_Italia"
+SCENARI = ("crawl", "bfs", "etichettatura")
+
+ETICHETTATURA = """
+import logging, sys
+sys.path.insert(0, sys.argv[1])
+import LocalColab
+logging.getLogger().setLevel(logging.WARNING)
+LocalColab.URL_SEARCH = sys.argv[2]
+LocalColab.main()
+"""
+
+
+def esegui_processo(comando, cartella):
+    """Esegue il comando in `cartella`; restituisce (secondi, picco di memoria in MB o None)."""
+    with open(os.path.join(cartella, "log.txt"), "wb") as log:
+        inizio = time.perf_counter()
+        processo = subprocess.Popen(comando, cwd=cartella, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            _, stato, uso = os.wait4(processo.pid, 0)
+            durata = time.perf_counter() - inizio
+            processo.returncode = os.waitstatus_to_exitcode(stato)
+            # ru_maxrss è in KB su Linux e in byte su macOS
+            memoria = uso.ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+        else:
+            processo.wait()
+            durata = time.perf_counter() - inizio
+            memoria = None
+    if processo.returncode != 0:
+        with open(os.path.join(cartella, "log.txt"), "r", encoding="utf-8", errors="replace") as log:
+            coda = log.read()[-2000:]
+        raise RuntimeError(f"{' '.join(comando[:3])}... terminato con codice {processo.returncode}:\n{coda}")
+    return durata, memoria
+
+
+def scenario_crawl(args, cartella, profondita=0, max_pagine=None):
+    wiki = FakeMediaWiki(corpus_da_vault(), latenza=args.latenza_wiki).avvia()
+    comando = [sys.executable, os.path.join(RADICE, "program.py"), "--category", CATEGORIA, "Omicidi",
+               "--api_url", f"{wiki.url}/w/api.php", "--output_dir", "vault", "--max-rps", "0",
+               "--concurrency", str(args.concorrenza), "--depth", str(profondita)]
+    if max_pagine is not None:
+        comando += ["--max-pages", str(max_pagine)]
+    try:
+        durata, memoria = esegui_processo(comando, cartella)
+    finally:
+        wiki.ferma()
+    note = sum(len(files) for _, _, files in os.walk(os.path.join(cartella, "vault")))
+    return {"durata": durata, "richieste": wiki.richieste, "memoria_mb": memoria, "dettaglio": f"{note} file scritti"}
+
+
+def scenario_etichettatura(args, cartella):
+    ricerca = FakeCustomSearch(siti=args.siti, risultati_per_query=args.risultati_per_query).avvia()
+    ollama = FakeOllama(latenza_token=args.latenza_token).avvia()
+    os.makedirs(os.path.join(cartella, "config"))
+    with open(os.path.join(cartella, "config", "myconfig.json"), "w", encoding="utf-8") as f:
+        json.dump({"API_KEY_GOOGLE": "finta", "CX_GOOGLE": "finto", "OLLAMA_ENDPOINTS": [ollama.url]}, f)
+    comando = [sys.executable, "-c", ETICHETTATURA, os.path.join(RADICE, "LabelingLLM"), ricerca.url_ricerca]
+    try:
+        durata, memoria = esegui_processo(comando, cartella)
+    finally:
+        ricerca.ferma()
+        ollama.ferma()
+    with open(os.path.join(cartella, "risultati_filtrati.json"), "r", encoding="utf-8") as f:
+        confermati = len(json.load(f))
+    return {"durata": durata, "richieste": ricerca.richieste + ollama.richieste, "memoria_mb": memoria,
+            "dettaglio": f"{confermati} casi confermati, {ollama.richieste} richieste a Ollama"}
+
+
+def esegui_scenario(nome, args):
+    with tempfile.TemporaryDirectory(prefix=f"bench_{nome}_") as cartella:
+        if nome == "crawl":
+            misura = scenario_crawl(args, cartella)
+        elif nome == "bfs":
+            misura = scenario_crawl(args, cartella, profondita=1, max_pagine=args.max_pagine)
+        else:
+            misura = scenario_etichettatura(args, cartella)
+    misura["richieste_al_secondo"] = misura["richieste"] / misura["durata"]
+    return misura
+
+
+def confronta(nome, misura, baseline, tolleranza):
+    """Restituisce le metriche peggiorate rispetto alla baseline oltre la tolleranza."""
+    riferimento = baseline.get(nome)
+    if not riferimento:
+        return []
+    peggiorate = []
+    for metrica in ("durata", "memoria_mb"):
+        if misura.get(metrica) is not None and riferimento.get(metrica):
+            if misura[metrica] > riferimento[metrica] * (1 + tolleranza):
+                peggiorate.append(f"{metrica} {riferimento[metrica]:.2f} -> {misura[metrica]:.2f}")
+    return peggiorate
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end con servizi finti locali.")
+    parser.add_argument("--scenari", nargs="+", choices=SCENARI, default=list(SCENARI))
+    parser.add_argument("--baseline", default=PERCORSO_BASELINE, help="File JSON delle misure di riferimento.")
+    parser.add_argument("--salva-baseline", action="store_true", help="Salva le misure come nuova baseline.")
+    parser.add_argument("--tolleranza", type=float, default=0.2, help="Peggioramento relativo ammesso (predefinito: 20%%).")
+    parser.add_argument("--concorrenza", type=int, default=4, help="--concurrency di program.py.")
+    parser.add_argument("--max-pagine", type=int, default=400, help="--max-pages dello scenario bfs.")
+    parser.add_argument("--latenza-wiki", type=float, default=0.005, help="Secondi di latenza per risposta di MediaWiki.")
+    parser.add_argument("--latenza-token", type=float, default=0.002, help="Secondi per token generato da Ollama.")
+    parser.add_argument("--siti", type=int, default=8, help="Siti distinti degli articoli trovati.")
+    parser.add_argument("--risultati-per-query", type=int, default=10)
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    misure = {}
+    regressioni = 0
+    print(f"{'scenario':<15}{'tempo':>9}{'richieste':>11}{'req/s':>9}{'memoria':>10}  dettaglio")
+    for nome in args.scenari:
+        misura = esegui_scenario(nome, args)
+        misure[nome] = misura
+        memoria = f"{misura['memoria_mb']:.0f} MB" if misura["memoria_mb"] is not None else "n/d"
+        print(f"{nome:<15}{misura['durata']:>8.2f}s{misura['richieste']:>11}{misura['richieste_al_secondo']:>9.1f}"
+              f"{memoria:>10}  {misura['dettaglio']}")
+        peggiorate = confronta(nome, misura, baseline, args.tolleranza)
+        if peggiorate:
+            regressioni += 1
+            print(f"  REGRESSIONE rispetto alla baseline: {', '.join(peggiorate)}")
+
+    if args.salva_baseline:
+        baseline.update({nome: {chiave: valore for chiave, valore in misura.items() if chiave != "dettaglio"}
+                         for nome, misura in misure.items()})
+        baseline["_macchina"] = {"python": platform.python_version(), "sistema": platform.platform(),
+                                 "salvata": time.strftime("%Y-%m-%d %H:%M:%S")}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=4)
+        print(f"Baseline salvata in {args.baseline}")
+    elif not baseline:
+        print("Nessuna baseline: eseguire con --salva-baseline per registrarne una.")
+    sys.exit(1 if regressioni else 0)
@@ -0,0 +1,444 @@
+"""Server finti per i benchmark, senza rete né GPU.
+
+- FakeOllama imita /api/generate (streaming a righe "Risposta:" e output JSON con `format`) e
+  /api/tags, con latenza per token, lunghezza del ragionamento <think>, richieste contemporanee
+  ed errori configurabili.
+- FakeMediaWiki risponde alle query dell'Action API usate da WikiClient (info, links,
+  categorymembers, con continuazione) a partire da pagine e categorie registrate, ad esempio
+  ricostruite dalle note del vault con corpus_da_vault.
+- FakeCustomSearch imita Google Custom Search (paginazione con start/num) e serve anche gli
+  articoli dei risultati, distribuiti su più porte per simulare siti diversi.
+
+Uso:
+  python bench/fake_servers.py ollama --porta 11500 [--latenza-token 0.002] [--errori 0.1]
+  python bench/fake_servers.py mediawiki --porta 11600 [--vault ObsidianNotes]
+  python bench/fake_servers.py ricerca --porta 11700 [--siti 8]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+PAROLE_RILEVANTI_RE = re.compile(r"omicid|uccis|scompar|strage|mafia|cosa nostra|delitto|assassin", re.IGNORECASE)
+NOTA_COLLEGAMENTO_RE = re.compile(r"^- \[\[(.+)\]\]\((.+)\)$")
+CATEGORIA_VAULT = {"Categoria:Casi di omicidio irrisolti in Italia": "Omicidi"}
+VAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ObsidianNotes")
+
+
+class _ServerFinto:
+    """Base dei server finti: ascolto su 127.0.0.1, avvio in un thread e conteggio delle richieste."""
+
+    def __init__(self, porta, gestore):
+        self.richieste = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", porta), gestore)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def avvia(self):
+        """Avvia il server in un thread in background e restituisce se stesso."""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def ferma(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _conta(self):
+        with self.lock:
+            self.richieste += 1
+
+
+class _GestoreJSON(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Intestazioni e corpo sono scritti separatamente sulla connessione keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def _invia(self, stato, corpo, tipo="application/json"):
+        dati = corpo if isinstance(corpo, bytes) else json.dumps(corpo).encode("utf-8")
+        self.send_response(stato)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(dati)))
+        self.end_headers()
+        self.wfile.write(dati)
+
+
+class FakeOllama(_ServerFinto):
+    """Un'istanza finta di Ollama in ascolto su 127.0.0.1:`porta`.
+
+    Un testo è considerato un caso se contiene parole come "omicidio", "strage" o "mafia".
+    `capacita` limita le generazioni contemporanee come OLLAMA_NUM_PARALLEL (le altre
+    richieste restano in coda); con probabilità `errori` una richiesta riceve un 500, e con
+    `guasto` tutte le richieste falliscono, compreso il controllo di salute.
+    """
+
+    def __init__(self, porta=0, latenza_token=0.002, token_think=40, capacita=1, errori=0.0, guasto=False, seme=0):
+        self.latenza_token = latenza_token
+        self.token_think = token_think
+        self.errori = errori
+        self.guasto = guasto
+        self.semaforo = threading.Semaphore(capacita)
+        self.rng = random.Random(seme)
+        super().__init__(porta, self._gestore())
+
+    def _fallisce(self):
+        self._conta()
+        with self.lock:
+            return self.guasto or self.rng.random() < self.errori
+
+    def _gestore(self):
+        fake = self
+
+        class Gestore(_GestoreJSON):
+            def do_GET(self):
+                if self.path != "/api/tags":
+                    self._invia(404, {"error": "not found"})
+                elif fake.guasto:
+                    self._invia(503, {"error": "instance down"})
+                else:
+                    self._invia(200, {"models": [{"name": "deepseek-r1:8b"}]})
+
+            def do_POST(self):
+                corpo = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path != "/api/generate":
+                    self._invia(404, {"error": "not found"})
+                    return
+                if fake._fallisce():
+                    self._invia(500, {"error": "simulated failure"})
+                    return
+                testo = corpo["prompt"].split("Testo da analizzare:")[-1]
+                rilevante = bool(PAROLE_RILEVANTI_RE.search(testo))
+                token_prompt = len(corpo["prompt"]) // 4
+                with fake.semaforo:
+                    if corpo.get("format"):
+                        self._rispondi_json(rilevante, token_prompt)
+                    else:
+                        self._rispondi_streaming(rilevante, token_prompt)
+
+            def _rispondi_json(self, rilevante, token_prompt):
+                record = {"caso": rilevante, "categoria": "Misc" if rilevante else "",
+                          "titolo": "Caso di prova" if rilevante else "", "luogo": "Roma" if rilevante else "",
+                          "data": "1983" if rilevante else ""}
+                time.sleep(25 * fake.latenza_token)
+                self._invia(200, {"response": json.dumps(record), "done": True,
+                                  "prompt_eval_count": token_prompt, "eval_count": 25})
+
+            def _rispondi_streaming(self, rilevante, token_prompt):
+                esito = ("Risposta: Si\nTitolo: Caso di prova\nLuogo: Roma\nData: 1983\n" if rilevante
+                         else "Risposta: No\n")
+                risposta = f"<think>{'ragiono ' * fake.token_think}</think>\n{esito}{'fine ' * 50}"
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for i in range(0, len(risposta), 4):
+                        self._frammento({"response": risposta[i:i + 4], "done": False})
+                        time.sleep(fake.latenza_token)
+                    self._frammento({"response": "", "done": True, "prompt_eval_count": token_prompt,
+                                     "eval_count": len(risposta) // 4})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Il client ha chiuso lo streaming appena l'esito era definitivo
+
+            def _frammento(self, record):
+                riga = json.dumps(record).encode("utf-8") + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(riga), riga))
+                self.wfile.flush()
+
+        return Gestore
+
+
+def _url_wiki(titolo):
+    return f"https://it.wikipedia.org/wiki/{quote(titolo.replace(' ', '_'), safe=';@$!*(),/~:')}"  # Come wfUrlencode
+
+
+def corpus_da_vault(vault_dir=VAULT_DIR, categorie=CATEGORIA_VAULT):
+    """Ricostruisce dalle note del vault le pagine registrate da program.py.
+
+    `categorie` è {categoria di Wikipedia: cartella del vault}. Restituisce un dizionario con
+    'pagine' ({titolo: [titoli collegati]}), 'redirect' ({titolo: destinazione}, quando l'URL di
+    un collegamento punta a un'altra voce) e 'categorie' ({categoria: [membri]}). Le voci
+    collegate ma senza nota esistono, senza collegamenti propri.
+    """
+    pagine = {}
+    redirect = {}
+    membri = {}
+    for categoria, cartella in categorie.items():
+        membri[categoria] = []
+        directory = os.path.join(vault_dir, cartella)
+        for nome_file in sorted(os.listdir(directory)):
+            if not nome_file.endswith(".md"):
+                continue
+            titolo = nome_file[:-3]
+            collegamenti = []
+            with open(os.path.join(directory, nome_file), "r", encoding="utf-8") as nota:
+                for riga in nota:
+                    corrispondenza = NOTA_COLLEGAMENTO_RE.match(riga.strip())
+                    if not corrispondenza:
+                        continue
+                    titolo_collegamento, url = corrispondenza.groups()
+                    destinazione = unquote(url.rsplit("/wiki/", 1)[-1]).replace("_", " ")
+                    if destinazione != titolo_collegamento:
+                        redirect[titolo_collegamento] = destinazione
+                    collegamenti.append(titolo_collegamento)
+                    pagine.setdefault(destinazione, [])
+            pagine[titolo] = collegamenti
+            membri[categoria].append(titolo)
+    return {"pagine": pagine, "redirect": redirect, "categorie": membri}
+
+
+class FakeMediaWiki(_ServerFinto):
+    """Action API di MediaWiki (/w/api.php) servita da un corpus registrato (vedi corpus_da_vault).
+
+    Supporta le query di WikiClient: `titles` con prop=info (URL, revisione, normalizzazione
+    e redirect) e prop=links, e list=categorymembers; collegamenti e membri sono restituiti a
+    blocchi di al più `limite` con i parametri di continuazione plcontinue e cmcontinue.
+    Con `pagine_per_risposta` le pagine di una query prop=info sono divise tra più risposte
+    (continuazione incontinue), come fa l'API quando una risposta supera i suoi limiti.
+    `latenza` aggiunge un ritardo fisso a ogni risposta.
+    """
+
+    def __init__(self, corpus=None, porta=0, latenza=0.0, limite=500, pagine_per_risposta=None):
+        self.corpus = corpus if corpus is not None else corpus_da_vault()
+        self.latenza = latenza
+        self.limite = limite
+        self.pagine_per_risposta = pagine_per_risposta
+        super().__init__(porta, self._gestore())
+
+    def _pagina(self, titolo, indice_mancante):
+        if titolo not in self.corpus["pagine"] and titolo not in self.corpus["categorie"]:
+            return str(indice_mancante), {"ns": 0, "title": titolo, "missing": ""}
+        id_pagina = zlib.crc32(titolo.encode("utf-8")) + 1
+        return str(id_pagina), {"pageid": id_pagina, "ns": 14 if titolo.startswith("Categoria:") else 0,
+                                "title": titolo, "lastrevid": id_pagina * 7 % 1_000_000_007, "fullurl": _url_wiki(titolo)}
+
+    def _limite(self, valore):
+        return self.limite if valore in (None, "max") else min(int(valore), self.limite)
+
+    def rispondi(self, params):
+        """Costruisce la risposta JSON di una query dell'Action API."""
+        if params.get("action") != "query":
+            return {"error": {"code": "badvalue", "info": "Solo action=query è supportata."}}
+        in_continuazione = "continue" in params
+        query = {}
+        continua = {}
+        prop = params.get("prop", "").split("|")
+
+        if "titles" in params:
+            normalizzati, redirect, pagine = [], [], {}
+            for numero, titolo in enumerate(params["titles"].split("|"), 1):
+                normalizzato = titolo.replace("_", " ")
+                if normalizzato != titolo:
+                    normalizzati.append({"from": titolo, "to": normalizzato})
+                destinazione = normalizzato
+                if "redirects" in params and normalizzato in self.corpus["redirect"]:
+                    destinazione = self.corpus["redirect"][normalizzato]
+                    redirect.append({"from": normalizzato, "to": destinazione})
+                chiave, pagina = self._pagina(destinazione, -numero)
+                if "links" in prop and "pageid" in pagina and (not in_continuazione or "plcontinue" in params):
+                    inizio = int(params["plcontinue"].rsplit("|", 1)[-1]) if "plcontinue" in params else 0
+                    limite = self._limite(params.get("pllimit"))
+                    collegamenti = self.corpus["pagine"].get(destinazione, [])
+                    pagina["links"] = [{"ns": 0, "title": t} for t in collegamenti[inizio:inizio + limite]]
+                    if inizio + limite < len(collegamenti):
+                        continua["plcontinue"] = f"{pagina['pageid']}|{inizio + limite}"
+                pagine[chiave] = pagina
+            inizio = int(params.get("incontinue", 0))
+            if self.pagine_per_risposta and "links" not in prop:
+                # Solo la prima risposta riporta normalizzazioni e redirect, le pagine arrivano a blocchi
+                chiavi = list(pagine)
+                if inizio + self.pagine_per_risposta < len(chiavi):
+                    continua["incontinue"] = str(inizio + self.pagine_per_risposta)
+                pagine = {chiave: pagine[chiave] for chiave in chiavi[inizio:inizio + self.pagine_per_risposta]}
+            query["pages"] = pagine
+            if normalizzati and not inizio:
+                query["normalized"] = normalizzati
+            if redirect and not inizio:
+                query["redirects"] = redirect
+
+        if params.get("list") == "categorymembers" and (not in_continuazione or "cmcontinue" in params):
+            categoria = params["cmtitle"].replace("_", " ")
+            membri = self.corpus["categorie"].get(categoria, [])
+            inizio = int(params["cmcontinue"].rsplit("|", 1)[-1]) if "cmcontinue" in params else 0
+            limite = self._limite(params.get("cmlimit"))
+            query["categorymembers"] = [{"ns": 14 if t.startswith("Categoria:") else 0, "title": t}
+                                        for t in membri[inizio:inizio + limite]]
+            if inizio + limite < len(membri):
+                continua["cmcontinue"] = f"page|{inizio + limite}"
+
+        risposta = {"batchcomplete": "", "query": query}
+        if continua:
+            risposta["continue"] = {**continua, "continue": "||"}
+        return risposta
+
+    def _gestore(self):
+        fake = self
+
+        class Gestore(_GestoreJSON):
+            def do_GET(self):
+                indirizzo = urlparse(self.path)
+                if indirizzo.path != "/w/api.php":
+                    self._invia(404, {"error": "not found"})
+                    return
+                fake._conta()
+                if fake.latenza:
+                    time.sleep(fake.latenza)
+                params = {chiave: valori[0] for chiave, valori in parse_qs(indirizzo.query).items()}
+                self._invia(200, fake.rispondi(params))
+
+        return Gestore
+
+
+FRASI_CASO = ("{titolo}: il caso non è mai stato risolto e le indagini della procura di {citta} restano aperte.",
+              "La vittima, {nome}, fu ritrovata senza vita nel {anno} e l'omicidio scosse l'intera città di {citta}.",
+              "Gli investigatori seguirono la pista della mafia e quella del delitto passionale, senza arrivare a un colpevole.",
+              "A distanza di {anni} anni i familiari di {nome} chiedono ancora la verità sulla scomparsa.",
+              "Il processo celebrato a {citta} nel {anno} si concluse con l'assoluzione degli imputati.",
+              "Un testimone riferì di aver visto un'auto scura allontanarsi la notte del {anno}.",
+              "La perizia sull'arma del delitto fu ripetuta dai carabinieri di {citta} senza risultati.",
+              "Nel {anno} la commissione parlamentare riaprì il fascicolo su {titolo}.",
+              "Secondo il magistrato il movente di {nome} restò oscuro fino all'archiviazione.",
+              "Le ricostruzioni giornalistiche su {titolo} hanno alimentato teorie e depistaggi.")
+FRASI_ALTRO = ("Scopri le offerte della settimana su scarpe, giacche e accessori con sconti fino al {anni}%.",
+               "Spedizione gratuita per ordini superiori a {anni} euro e reso facile entro 30 giorni.",
+               "Le previsioni meteo per {citta} indicano cielo sereno al mattino e piogge sparse la sera.",
+               "La ricetta della settimana: pasta con pomodorini, basilico e mozzarella di bufala.",
+               "Il concerto di {nome} a {citta} è stato rinviato per maltempo.")
+CITTA = ("Roma", "Milano", "Napoli", "Palermo", "Torino", "Bologna", "Firenze", "Genova", "Bari", "Cagliari")
+NOMI = ("Anna Rossi", "Marco Bianchi", "Giulia Russo", "Luca Ferrari", "Sara Esposito", "Paolo Romano", "Elena Colombo")
+
+
+class FakeCustomSearch(_ServerFinto):
+    """Google Custom Search (/customsearch/v1) con i relativi articoli.
+
+    Ogni query restituisce `risultati_per_query` link deterministici tra `articoli` articoli,
+    a pagine di `num` risultati secondo `start`; query diverse condividono parte dei link. Gli
+    articoli (/articoli/<n>.html) sono serviti su `siti` porte diverse, così il limite per sito
+    di LocalColab si applica come con siti reali; quelli pari descrivono un caso (con i titoli
+    di `titoli`), quelli dispari no.
+    """
+
+    def __init__(self, porta=0, siti=8, risultati_per_query=15, articoli=200, titoli=None, latenza=0.0):
+        self.risultati_per_query = risultati_per_query
+        self.articoli = articoli
+        self.titoli = titoli or ["Delitto di via Poma", "Strage di Alcamo Marina", "Caso Montesi"]
+        self.latenza = latenza
+        super().__init__(porta, self._gestore())
+        self.siti = [self.server] + [ThreadingHTTPServer(("127.0.0.1", 0), self._gestore()) for _ in range(siti - 1)]
+        for server in self.siti:
+            server.daemon_threads = True
+
+    def avvia(self):
+        for server in self.siti[1:]:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return super().avvia()
+
+    def ferma(self):
+        for server in self.siti[1:]:
+            server.shutdown()
+            server.server_close()
+        super().ferma()
+
+    @property
+    def url_ricerca(self):
+        return f"{self.url}/customsearch/v1"
+
+    def _link(self, numero):
+        return f"http://127.0.0.1:{self.siti[numero % len(self.siti)].server_address[1]}/articoli/{numero}.html"
+
+    def cerca(self, query, inizio, num):
+        base = zlib.crc32(query.encode("utf-8"))
+        numeri = [(base + k * 7) % self.articoli for k in range(self.risultati_per_query)]
+        pagina = numeri[inizio - 1:inizio - 1 + num]
+        risposta = {"items": [{"title": f"Articolo {n}", "link": self._link(n),
+                               "snippet": f"Anteprima dell'articolo {n}"} for n in pagina], "queries": {}}
+        if inizio - 1 + num < len(numeri):
+            risposta["queries"]["nextPage"] = [{"startIndex": inizio + num}]
+        return risposta
+
+    def articolo(self, numero):
+        rng = random.Random(numero)
+        if numero % 2 == 0:
+            titolo = self.titoli[numero // 2 % len(self.titoli)]
+            modelli = rng.sample(FRASI_CASO, 8)
+        else:
+            titolo = f"Notizie del giorno {numero}"
+            modelli = [rng.choice(FRASI_ALTRO) for _ in range(8)]
+        # Dettagli casuali in ogni frase: articoli diversi non risultano quasi duplicati
+        frasi = [modello.format(titolo=titolo, citta=rng.choice(CITTA), nome=rng.choice(NOMI),
+                                anno=rng.randint(1950, 2020), anni=rng.randint(5, 60)) for modello in modelli]
+        paragrafi = "".join(f"<p>{frase}</p>" for frase in frasi)
+        menu = "".join(f'<li><a href="/sezione/{i}">Sezione {i}</a></li>' for i in range(40))
+        return (f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{titolo}</title></head><body>"
+                f'<nav class="menu"><ul>{menu}</ul></nav><article><h1>{titolo}</h1>{paragrafi}</article>'
+                f"<footer><p>Tutti i diritti riservati.</p></footer></body></html>").encode("utf-8")
+
+    def _gestore(self):
+        fake = self
+
+        class Gestore(_GestoreJSON):
+            def do_GET(self):
+                indirizzo = urlparse(self.path)
+                fake._conta()
+                if fake.latenza:
+                    time.sleep(fake.latenza)
+                corrispondenza = re.fullmatch(r"/articoli/(\d+)\.html", indirizzo.path)
+                if corrispondenza:
+                    self._invia(200, fake.articolo(int(corrispondenza.group(1))), "text/html; charset=utf-8")
+                elif indirizzo.path == "/customsearch/v1":
+                    params = {chiave: valori[0] for chiave, valori in parse_qs(indirizzo.query).items()}
+                    self._invia(200, fake.cerca(params.get("q", ""), int(params.get("start", 1)),
+                                                min(int(params.get("num", 10)), 10)))
+                else:
+                    self._invia(404, {"error": "not found"})
+
+        return Gestore
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Avvia un server finto per i benchmark.")
+    sotto = parser.add_subparsers(dest="server", required=True)
+    ollama = sotto.add_parser("ollama", help="Istanza finta di Ollama.")
+    ollama.add_argument("--porta", type=int, default=11500)
+    ollama.add_argument("--latenza-token", type=float, default=0.002, help="Secondi per token generato.")
+    ollama.add_argument("--token-think", type=int, default=40, help="Lunghezza del ragionamento <think>.")
+    ollama.add_argument("--capacita", type=int, default=1, help="Generazioni contemporanee.")
+    ollama.add_argument("--errori", type=float, default=0.0, help="Probabilità di rispondere con un errore 500.")
+    ollama.add_argument("--guasto", action="store_true", help="Fallisce tutte le richieste.")
+    mediawiki = sotto.add_parser("mediawiki", help="Action API di MediaWiki dalle note del vault.")
+    mediawiki.add_argument("--porta", type=int, default=11600)
+    mediawiki.add_argument("--vault", default=VAULT_DIR)
+    mediawiki.add_argument("--latenza", type=float, default=0.0, help="Secondi di ritardo per risposta.")
+    ricerca = sotto.add_parser("ricerca", help="Google Custom Search e articoli dei risultati.")
+    ricerca.add_argument("--porta", type=int, default=11700)
+    ricerca.add_argument("--siti", type=int, default=8)
+    ricerca.add_argument("--risultati-per-query", type=int, default=15)
+    args = parser.parse_args()
+
+    if args.server == "ollama":
+        fake = FakeOllama(args.porta, args.latenza_token, args.token_think, args.capacita, args.errori, args.guasto)
+    elif args.server == "mediawiki":
+        fake = FakeMediaWiki(corpus_da_vault(args.vault), args.porta, args.latenza)
+    else:
+        fake = FakeCustomSearch(args.porta, args.siti, args.risultati_per_query)
+    print(f"Server finto ({args.server}) in ascolto su {fake.url}")
+    fake.avvia()
+    try:
+        while fake.thread.is_alive():
+            fake.thread.join(1)
+    except KeyboardInterrupt:
+        fake.ferma()
@@ -0,0 +1,85 @@
+"""Verifica che il crawl concorrente di program.py scriva lo stesso vault di quello sequenziale.
+
+Su un FakeMediaWiki costruito dalle note del vault esegue program.py con --concurrency 1 e con
+--concurrency N, per una categoria, una visita in ampiezza e una lista di URL, e confronta byte
+per byte i file scritti (note e indici di categoria; il journal è escluso). Termina con codice
+1 se un vault è diverso.
+
+Uso: python bench/verifica_concorrenza.py [--concorrenza 8] [--max-pagine 80]
+"""
+import argparse
+import filecmp
+import os
+import subprocess
+import sys
+import tempfile
+
+from fake_servers import FakeMediaWiki, corpus_da_vault
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATEGORIA = "Categoria:Casi_di_omicidio_irrisolti_in_Italia"
+
+
+def file_del_vault(vault_dir):
+    """Percorsi relativi dei file del vault, senza i file nascosti (journal, temporanei)."""
+    percorsi = set()
+    for radice, _, files in os.walk(vault_dir):
+        for nome_file in files:
+            if not nome_file.startswith("."):
+                percorsi.add(os.path.relpath(os.path.join(radice, nome_file), vault_dir))
+    return percorsi
+
+
+def crawl(api_url, cartella, opzioni, concorrenza):
+    vault_dir = os.path.join(cartella, f"vault_{concorrenza}")
+    comando = [sys.executable, os.path.join(RADICE, "program.py"), *opzioni, "--api_url", api_url,
+               "--output_dir", vault_dir, "--max-rps", "0", "--concurrency", str(concorrenza)]
+    processo = subprocess.run(comando, cwd=cartella, capture_output=True, text=True)
+    if processo.returncode != 0:
+        raise RuntimeError(f"program.py terminato con codice {processo.returncode}:\n{processo.stderr[-2000:]}")
+    return vault_dir
+
+
+def confronta(sequenziale, concorrente):
+    """Restituisce i file mancanti, in più o diversi nel vault concorrente."""
+    attesi = file_del_vault(sequenziale)
+    scritti = file_del_vault(concorrente)
+    _, diversi, errori = filecmp.cmpfiles(sequenziale, concorrente, sorted(attesi & scritti), shallow=False)
+    return ([f"mancante: {p}" for p in sorted(attesi - scritti)] + [f"in più: {p}" for p in sorted(scritti - attesi)]
+            + [f"diverso: {p}" for p in diversi + errori]), len(attesi)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confronta il vault del crawl sequenziale e di quello concorrente.")
+    parser.add_argument("--concorrenza", type=int, default=8)
+    parser.add_argument("--max-pagine", type=int, default=80, help="--max-pages della visita in ampiezza.")
+    args = parser.parse_args()
+
+    corpus = corpus_da_vault()
+    fake = FakeMediaWiki(corpus).avvia()
+    differenze = 0
+    try:
+        with tempfile.TemporaryDirectory(prefix="verifica_concorrenza_") as cartella:
+            elenco = os.path.join(cartella, "elenco.txt")
+            with open(elenco, "w", encoding="utf-8") as f:
+                for titolo in sorted(corpus["pagine"])[:60]:
+                    f.write(f"https://it.wikipedia.org/wiki/{titolo.replace(' ', '_')} : Voci\n")
+            scenari = {
+                "categoria": ["--category", CATEGORIA, "Omicidi"],
+                "visita in ampiezza": ["--category", CATEGORIA, "Omicidi", "--depth", "1",
+                                       "--max-pages", str(args.max_pagine)],
+                "lista": ["--list", elenco],
+            }
+            for nome, opzioni in scenari.items():
+                scenario = os.path.join(cartella, nome.replace(" ", "_"))
+                os.makedirs(scenario)
+                api_url = f"{fake.url}/w/api.php"
+                problemi, totale = confronta(crawl(api_url, scenario, opzioni, 1),
+                                             crawl(api_url, scenario, opzioni, args.concorrenza))
+                print(f"{nome}: {totale} file, {'OK' if not problemi else 'DIVERSO'}")
+                for problema in problemi[:10]:
+                    print(f"  {problema}")
+                differenze += bool(problemi)
+    finally:
+        fake.ferma()
+    sys.exit(1 if differenze else 0)
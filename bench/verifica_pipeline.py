@@ -0,0 +1,96 @@
+"""Verifica che la pipeline di elabora_risultati dia gli stessi risultati del ciclo sequenziale originale.
+
+Con FakeCustomSearch (risultati e articoli, con link ripetuti tra query diverse e un articolo
+inesistente) e FakeOllama confronta il JSON dei casi confermati prodotto dal ciclo sequenziale
+(scarica, estrai, analizza un risultato alla volta) con quello di elabora_risultati con download
+e analisi in parallelo, anche distribuite su più istanze di Ollama, nelle due modalità di output.
+Termina con codice 1 se un JSON è diverso.
+
+Uso: python bench/verifica_pipeline.py [--query 12] [--parallelismo-llm 4]
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "LabelingLLM"))
+
+import LocalColab
+from fake_servers import FakeCustomSearch, FakeOllama
+from scheduler_ollama import SchedulerOllama
+
+CATEGORIE = ("Omicidi irrisolti", "Stragi", "Scomparse")
+
+
+def risultati_di_prova(ricerca, numero_query):
+    """Risultati come quelli di RicercaGoogle.cerca_tutte, ma senza deduplicare i link."""
+    risultati = []
+    for numero in range(numero_query):
+        categoria = CATEGORIE[numero % len(CATEGORIE)]
+        for inizio in (1, 11):
+            for item in ricerca.cerca(f"caso {numero}", inizio, 10)["items"]:
+                risultati.append({"categoria": categoria, "titolo": item["title"], "link": item["link"],
+                                  "descrizione": item["snippet"]})
+    risultati.append({"categoria": CATEGORIE[0], "titolo": "Articolo rimosso", "descrizione": "N/A",
+                      "link": f"{ricerca.url}/articoli/rimosso.html"})
+    return risultati
+
+
+def ciclo_sequenziale(risultati, modalita):
+    """Il ciclo originale di elabora_risultati, con la classificazione per documento attuale."""
+    confermati = []
+    for risultato in risultati:
+        testo = LocalColab.estrai_testo_da_url(risultato['link'])
+        if testo:
+            try:
+                caso_confermato, luogo, data_caso = LocalColab.classifica_documento(testo, modalita=modalita).tupla()
+            except Exception as e:  # Come nella pipeline: il documento non viene confermato
+                logging.warning(f"Analisi di {risultato['link']} fallita: {e}")
+                continue
+            if caso_confermato:
+                risultato['luogo'] = luogo
+                risultato['data'] = data_caso
+                confermati.append(risultato)
+    return confermati
+
+
+def in_json(risultati):
+    return json.dumps(risultati, indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confronta il ciclo sequenziale e la pipeline di elabora_risultati.")
+    parser.add_argument("--query", type=int, default=12)
+    parser.add_argument("--parallelismo-llm", type=int, default=4)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    ricerca = FakeCustomSearch().avvia()
+    istanze = [FakeOllama(latenza_token=0.0005, capacita=args.parallelismo_llm).avvia() for _ in range(2)]
+    differenze = 0
+    try:
+        LocalColab.URL_OLLAMA = f"{istanze[0].url}/api/generate"
+        risultati = risultati_di_prova(ricerca, args.query)
+        print(f"Risultati: {len(risultati)} ({len({r['link'] for r in risultati})} link distinti)")
+        for modalita in LocalColab.MODALITA:
+            atteso = in_json(ciclo_sequenziale(copy.deepcopy(risultati), modalita))
+            scheduler = SchedulerOllama([istanza.url for istanza in istanze], capacita=args.parallelismo_llm)
+            varianti = {
+                "pipeline": dict(parallelismo_llm=args.parallelismo_llm),
+                "pipeline con scheduler": dict(scheduler=scheduler),
+            }
+            for nome, opzioni in varianti.items():
+                ottenuto = in_json(LocalColab.elabora_risultati(copy.deepcopy(risultati), intervallo_host=0,
+                                                                modalita=modalita, **opzioni))
+                uguale = ottenuto == atteso
+                print(f"{modalita}, {nome}: {len(json.loads(ottenuto))} confermati "
+                      f"(sequenziale {len(json.loads(atteso))}), {'OK' if uguale else 'DIVERSO'}")
+                differenze += not uguale
+            scheduler.chiudi()
+    finally:
+        ricerca.ferma()
+        for istanza in istanze:
+            istanza.ferma()
+    sys.exit(1 if differenze else 0)
@@ -0,0 +1,90 @@
+"""Verifica che WikiClient.resolve_titles dia lo stesso risultato delle chiamate per titolo di wikipediaapi.
+
+Su un FakeMediaWiki costruito dalle note del vault confronta {titolo: fullurl} del risolutore
+a blocchi con `wiki_wiki.page(titolo).exists()` e `.fullurl` interrogati uno per volta, su
+titoli esistenti, redirect, titoli da normalizzare (con "_"), pagine mancanti e ripetizioni.
+Il confronto è ripetuto con blocchi di dimensioni diverse e con le risposte prop=info divise
+da `continue`. Termina con codice 1 alla prima differenza.
+
+Uso: python bench/verifica_titoli.py [--campione 300] [--vault ObsidianNotes]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+
+import wikipediaapi
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_servers import VAULT_DIR, FakeMediaWiki, corpus_da_vault
+from wiki_client import WikiClient
+
+USER_AGENT = "WikiLinksToMD equivalence check"
+
+
+def titoli_di_prova(corpus, campione, rng):
+    """Titoli esistenti, redirect, varianti con "_", pagine mancanti e ripetizioni, mescolati."""
+    esistenti = rng.sample(sorted(corpus["pagine"]), min(campione, len(corpus["pagine"])))
+    redirect = sorted(corpus["redirect"])[:campione // 4]
+    normalizzati = [titolo.replace(" ", "_") for titolo in esistenti[:campione // 4] + redirect[:campione // 8] if " " in titolo]
+    mancanti = [f"Voce inesistente {numero}" for numero in range(campione // 10)]
+    titoli = esistenti + redirect + normalizzati + mancanti
+    titoli += rng.sample(titoli, len(titoli) // 10)
+    rng.shuffle(titoli)
+    return titoli
+
+
+def risolvi_per_titolo(api_url, titoli):
+    """Il controllo originale di program.py: una richiesta wikipediaapi per titolo."""
+    class WikipediaLocale(wikipediaapi.Wikipedia):
+        @staticmethod
+        def _build_url(language):
+            return api_url
+
+    wiki_wiki = WikipediaLocale(user_agent=USER_AGENT, language="it")
+    risolti = {}
+    for titolo in titoli:
+        pagina = wiki_wiki.page(titolo)
+        if pagina.exists():
+            risolti[titolo] = pagina.fullurl
+    return risolti
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confronta resolve_titles con wikipediaapi su un server finto.")
+    parser.add_argument("--campione", type=int, default=300, help="Titoli esistenti da includere.")
+    parser.add_argument("--vault", default=VAULT_DIR)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    corpus = corpus_da_vault(args.vault)
+    titoli = titoli_di_prova(corpus, args.campione, random.Random(args.seed))
+    print(f"Titoli: {len(titoli)} ({len(corpus['redirect'])} redirect nel corpus)")
+
+    fake = FakeMediaWiki(corpus).avvia()
+    try:
+        atteso = risolvi_per_titolo(f"{fake.url}/w/api.php", titoli)
+    finally:
+        fake.ferma()
+    print(f"wikipediaapi: {len(atteso)} titoli esistenti su {len(dict.fromkeys(titoli))} distinti")
+
+    differenze = 0
+    for dimensione, pagine_per_risposta in ((50, None), (7, None), (50, 6)):
+        fake = FakeMediaWiki(corpus, pagine_per_risposta=pagine_per_risposta).avvia()
+        try:
+            client = WikiClient(USER_AGENT, api_url=f"{fake.url}/w/api.php", max_rps=0)
+            risolti = client.resolve_titles(titoli, batch_size=dimensione)
+            richieste = fake.richieste
+        finally:
+            fake.ferma()
+        diversi = sorted(titolo for titolo in set(atteso) | set(risolti) if atteso.get(titolo) != risolti.get(titolo))
+        esito = "OK" if not diversi and list(risolti) == list(dict.fromkeys(t for t in titoli if t in atteso)) else "DIVERSO"
+        print(f"blocchi da {dimensione}, pagine per risposta {pagine_per_risposta or 'tutte'}: "
+              f"{richieste} richieste, {esito}")
+        for titolo in diversi[:10]:
+            print(f"  {titolo!r}: wikipediaapi={atteso.get(titolo)!r} resolve_titles={risolti.get(titolo)!r}")
+        differenze += esito != "OK"
+    sys.exit(1 if differenze else 0)
@@ -0,0 +1,162 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+
+EXPORT_FORMATS = ("jsonl", "sqlite", "parquet")
+
+
+def guess_export_format(path):
+    """Deduce il formato di esportazione dall'estensione del percorso."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".sqlite", ".sqlite3", ".db"):
+        return "sqlite"
+    if extension == ".parquet":
+        return "parquet"
+    return "jsonl"
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Il formato parquet richiede pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+class CrawlExporter:
+    """Esporta il risultato del crawl (pagine, topic, URL e archi) man mano che le pagine sono pronte.
+
+    Formati:
+    - `jsonl`: un record {'type': 'page', 'title', 'url', 'topic', 'links': [[titolo, url], ...]} per
+      riga, seguito da un record {'type': 'topic', 'topic', 'category_url'} per ogni topic;
+    - `sqlite`: tabelle `pages(title, url, topic)`, `links(source, target, target_url)` e
+      `topics(topic, category_url)`;
+    - `parquet`: una cartella con `pages.parquet`, `links.parquet` e `topics.parquet` (richiede pyarrow).
+    """
+
+    def __init__(self, path, export_format=None):
+        self.path = path
+        self.format = export_format or guess_export_format(path)
+        self.topics = {}
+        self.page_count = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.format == "jsonl":
+            self.file = open(path, "w", encoding="utf-8")
+        elif self.format == "sqlite":
+            if os.path.exists(path):
+                os.remove(path)
+            self.conn = sqlite3.connect(path)
+            self.conn.executescript("""
+                CREATE TABLE pages (title TEXT PRIMARY KEY, url TEXT NOT NULL, topic TEXT NOT NULL);
+                CREATE TABLE links (source TEXT NOT NULL, target TEXT NOT NULL, target_url TEXT NOT NULL);
+                CREATE TABLE topics (topic TEXT PRIMARY KEY, category_url TEXT);
+            """)
+        elif self.format == "parquet":
+            _import_pyarrow()
+            self.columns = {'pages': ([], [], []), 'links': ([], [], [])}
+        else:
+            raise ValueError(f"Formato di esportazione non supportato: {self.format}")
+
+    def add_page(self, page_title, data):
+        """Aggiunge una pagina del crawl con i suoi collegamenti."""
+        self.topics.setdefault(data['topic'], None)
+        self.page_count += 1
+        if self.format == "jsonl":
+            record = {'type': 'page', 'title': page_title, 'url': data['url'], 'topic': data['topic'],
+                      'links': [[link_title, link_url] for link_title, link_url in data['links'].items()]}
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        elif self.format == "sqlite":
+            self.conn.execute("INSERT OR REPLACE INTO pages (title, url, topic) VALUES (?, ?, ?)",
+                              (page_title, data['url'], data['topic']))
+            self.conn.executemany("INSERT INTO links (source, target, target_url) VALUES (?, ?, ?)",
+                                  ((page_title, link_title, link_url) for link_title, link_url in data['links'].items()))
+        else:
+            titles, urls, topics = self.columns['pages']
+            titles.append(page_title)
+            urls.append(data['url'])
+            topics.append(data['topic'])
+            sources, targets, target_urls = self.columns['links']
+            for link_title, link_url in data['links'].items():
+                sources.append(page_title)
+                targets.append(link_title)
+                target_urls.append(link_url)
+
+    def close(self, category_urls=None):
+        """Registra i topic (con l'eventuale URL della categoria Wikipedia) e chiude l'esportazione."""
+        for topic, category_url in (category_urls or {}).items():
+            if topic in self.topics:
+                self.topics[topic] = category_url
+        if self.format == "jsonl":
+            for topic, category_url in self.topics.items():
+                self.file.write(json.dumps({'type': 'topic', 'topic': topic, 'category_url': category_url},
+                                           ensure_ascii=False) + "\n")
+            self.file.close()
+        elif self.format == "sqlite":
+            self.conn.executemany("INSERT INTO topics (topic, category_url) VALUES (?, ?)", self.topics.items())
+            self.conn.execute("CREATE INDEX links_source ON links (source)")
+            self.conn.commit()
+            self.conn.close()
+        else:
+            pyarrow = _import_pyarrow()
+            if os.path.isdir(self.path):
+                shutil.rmtree(self.path)
+            os.makedirs(self.path)
+            tables = {
+                'pages': dict(zip(('title', 'url', 'topic'), self.columns['pages'])),
+                'links': dict(zip(('source', 'target', 'target_url'), self.columns['links'])),
+                'topics': {'topic': list(self.topics), 'category_url': list(self.topics.values())},
+            }
+            for name, columns in tables.items():
+                table = pyarrow.table({column: pyarrow.array(values, type=pyarrow.string()) for column, values in columns.items()})
+                pyarrow.parquet.write_table(table, os.path.join(self.path, f"{name}.parquet"))
+        logging.info(f"Exported {self.page_count} pages to {self.path} ({self.format})")
+
+
+def read_export(path, export_format=None):
+    """Legge un'esportazione in una sola passata.
+
+    Restituisce (pagine, category_urls), dove `pagine` è la lista ordinata di coppie
+    (pagina, {'links', 'topic', 'url'}) nello stesso formato prodotto dal crawler.
+    """
+    export_format = export_format or guess_export_format(path)
+    pages = {}
+    category_urls = {}
+    if export_format == "jsonl":
+        with open(path, "r", encoding="utf-8") as export_file:
+            for line in export_file:
+                record = json.loads(line)
+                if record['type'] == 'page':
+                    pages[record['title']] = {'links': dict(record['links']), 'topic': record['topic'], 'url': record['url']}
+                elif record['category_url']:
+                    category_urls[record['topic']] = record['category_url']
+    elif export_format == "sqlite":
+        conn = sqlite3.connect(path)
+        for title, url, topic in conn.execute("SELECT title, url, topic FROM pages ORDER BY rowid"):
+            pages[title] = {'links': {}, 'topic': topic, 'url': url}
+        for source, target, target_url in conn.execute("SELECT source, target, target_url FROM links ORDER BY rowid"):
+            pages[source]['links'][target] = target_url
+        category_urls = dict(conn.execute("SELECT topic, category_url FROM topics WHERE category_url IS NOT NULL"))
+        conn.close()
+    elif export_format == "parquet":
+        pyarrow = _import_pyarrow()
+
+        def read(name):
+            return pyarrow.parquet.read_table(os.path.join(path, f"{name}.parquet")).to_pydict()
+
+        page_columns = read('pages')
+        for title, url, topic in zip(page_columns['title'], page_columns['url'], page_columns['topic']):
+            pages[title] = {'links': {}, 'topic': topic, 'url': url}
+        link_columns = read('links')
+        for source, target, target_url in zip(link_columns['source'], link_columns['target'], link_columns['target_url']):
+            pages[source]['links'][target] = target_url
+        topic_columns = read('topics')
+        category_urls = {topic: url for topic, url in zip(topic_columns['topic'], topic_columns['category_url']) if url}
+    else:
+        raise ValueError(f"Formato di esportazione non supportato: {export_format}")
+    logging.info(f"Loaded {len(pages)} pages from export {path}")
+    return list(pages.items()), category_urls
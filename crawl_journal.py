@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import threading
+import time
+
+JOURNAL_FILE_NAME = ".crawl_journal.jsonl"
+
+
+class CrawlJournal:
+    """Journal append-only (JSON Lines) delle pagine completate da un crawl.
+
+    Ogni riga registra titolo, URL, topic, collegamenti e revisione di una pagina non appena
+    la sua elaborazione termina, così un crawl interrotto può riprendere da dove si era fermato.
+    A parità di titolo vale l'ultima riga scritta. Senza `resume` un journal esistente non
+    vuoto viene sovrascritto solo con `fresh=True`: altrimenti il checkpoint di un crawl
+    interrotto andrebbe perso alla prima esecuzione successiva.
+    """
+
+    def __init__(self, path, resume=False, fresh=False):
+        self.path = path
+        self.entries = {}  # {titolo: (revid, offset della riga)}: i collegamenti restano su disco
+        self.lock = threading.Lock()
+        if resume and os.path.exists(path):
+            self._load()
+        elif not resume and not fresh and os.path.exists(path) and os.path.getsize(path) > 0:
+            raise FileExistsError(f"Il journal {path} contiene già un crawl")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "ab" if resume else "wb")
+        if self.file.tell() > 0:
+            with open(path, "rb") as journal_file:
+                journal_file.seek(-1, os.SEEK_END)
+                if journal_file.read(1) != b"\n":
+                    self.file.write(b"\n")  # Chiude la riga troncata da un'interruzione
+        self.reader = None
+
+    def _load(self):
+        with open(self.path, "rb") as journal_file:
+            offset = 0
+            for line_number, line in enumerate(journal_file, start=1):
+                line_offset = offset
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # Tipicamente l'ultima riga, troncata da un'interruzione durante la scrittura
+                    logging.warning(f"Ignored corrupted journal line {line_number} in {self.path}")
+                    continue
+                self.entries[record['title']] = (record['revid'], line_offset)
+        logging.info(f"Loaded {len(self.entries)} journaled pages from {self.path}")
+
+    def __contains__(self, page_title):
+        return page_title in self.entries
+
+    def revid(self, page_title):
+        """Restituisce la revisione registrata di una pagina, senza leggerne il record."""
+        return self.entries[page_title][0]
+
+    def get(self, page_title):
+        """Restituisce il record {'title', 'url', 'topic', 'links', 'revid'} di una pagina, o None.
+
+        Il record viene riletto dal file: in memoria restano solo revisione e posizione di ogni pagina.
+        """
+        entry = self.entries.get(page_title)
+        if entry is None:
+            return None
+        with self.lock:
+            if self.reader is None:
+                self.reader = open(self.path, "rb")
+            self.reader.seek(entry[1])
+            return json.loads(self.reader.readline())
+
+    def record(self, page_title, data, revid):
+        """Aggiunge al journal la pagina completata e forza la scrittura su disco."""
+        record = {'title': page_title, 'url': data['url'], 'topic': data['topic'], 'links': data['links'],
+                  'revid': revid, 'time': time.time()}
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self.lock:
+            offset = self.file.tell()
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.entries[page_title] = (revid, offset)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+            if self.reader is not None:
+                self.reader.close()
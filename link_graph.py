@@ -0,0 +1,403 @@
+import argparse
+import collections
+import hashlib
+import itertools
+import logging
+import os
+import sys
+import zipfile
+
+import numpy as np
+
+from crawl_export import read_export
+
+SNAPSHOT_SUFFIX = ".graph.npz"
+SNAPSHOT_VERSION = 1  # Da incrementare quando cambiano il formato dello snapshot o il parsing delle sorgenti
+CSR_ARRAYS = ("out_indptr", "out_indices", "in_indptr", "in_indices")
+
+
+def _gather(indptr, indices, nodes):
+    """Concatena le liste di adiacenza CSR dei nodi indicati, senza cicli Python."""
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=indices.dtype)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return indices[offsets + np.arange(total)]
+
+
+def _intern(titles):
+    """Converte i titoli in un array di id consecutivi, assegnati in ordine di prima apparizione.
+
+    Il dizionario crea l'id alla prima lettura di un titolo, così l'internamento è una sola
+    passata in C (np.unique, che ordina le stringhe, è più lento). Restituisce (id, titoli).
+    """
+    ids = collections.defaultdict(itertools.count().__next__)
+    nodes = np.fromiter(map(ids.__getitem__, titles), dtype=np.int32)
+    return nodes, list(ids)
+
+
+def snapshot_path(source_path):
+    """Percorso dello snapshot di un vault o di un'esportazione, accanto alla sorgente (es. ObsidianNotes.graph.npz)."""
+    return os.path.normpath(os.path.abspath(source_path)) + SNAPSHOT_SUFFIX
+
+
+def vault_key(vault_dir):
+    """Chiave dello snapshot di un vault: le mtime della cartella e delle sue sottocartelle.
+
+    MarkdownWriter scrive ogni nota con un rename nella cartella del suo topic, quindi ogni nota
+    aggiunta, modificata o rimossa cambia la mtime di una cartella: non serve leggere lo stato di
+    ogni file. Le note modificate sul posto da altri programmi richiedono --rebuild.
+    """
+    digest = hashlib.sha1()
+    pending = [vault_dir]
+    while pending:
+        directory = pending.pop()
+        digest.update(f"{os.path.relpath(directory, vault_dir)}\0{os.stat(directory).st_mtime_ns}\n".encode("utf-8"))
+        with os.scandir(directory) as entries:
+            pending.extend(sorted((entry.path for entry in entries if entry.is_dir()), reverse=True))
+    return f"vault-{SNAPSHOT_VERSION}-{digest.hexdigest()}"
+
+
+def export_key(path):
+    """Chiave dello snapshot di un'esportazione: l'hash del suo contenuto (di tutti i file, per Parquet)."""
+    digest = hashlib.sha1()
+    file_paths = [path] if os.path.isfile(path) else sorted(os.path.join(path, name) for name in os.listdir(path))
+    for file_path in file_paths:
+        with open(file_path, "rb") as export_file:
+            for block in iter(lambda: export_file.read(1 << 20), b""):
+                digest.update(block)
+    return f"export-{SNAPSHOT_VERSION}-{digest.hexdigest()}"
+
+
+def _csr(sources, targets, node_count):
+    """Costruisce (indptr, indices) ordinando gli archi per nodo sorgente."""
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=node_count), out=indptr[1:])
+    return indptr, targets[order].astype(np.int32)
+
+
+class LinkGraph:
+    """Grafo dei collegamenti del vault, compatto e basato su array.
+
+    I titoli sono internati in id interi consecutivi; gli archi uscenti e quelli entranti
+    sono memorizzati in formato CSR (indptr/indices) in array NumPy, così che le query
+    lavorino su slice di array invece che su dizionari di insiemi.
+    """
+
+    def __init__(self, titles, sources, targets):
+        self.titles = titles
+        self.ids = {title: node for node, title in enumerate(titles)}
+        sources = np.asarray(sources, dtype=np.int32)
+        targets = np.asarray(targets, dtype=np.int32)
+        if len(sources):
+            # Archi duplicati (stessa coppia sorgente/destinazione) contati una volta sola
+            pairs = np.sort(sources.astype(np.int64) * len(titles) + targets)
+            keep = np.empty(len(pairs), dtype=bool)
+            keep[0] = True
+            np.not_equal(pairs[1:], pairs[:-1], out=keep[1:])
+            pairs = pairs[keep]
+            sources = (pairs // len(titles)).astype(np.int32)
+            targets = (pairs % len(titles)).astype(np.int32)
+        self.edge_count = len(sources)
+        self.out_indptr, self.out_indices = _csr(sources, targets, len(titles))
+        self.in_indptr, self.in_indices = _csr(targets, sources, len(titles))
+
+    @classmethod
+    def from_edges(cls, edges):
+        """Crea il grafo da un iterabile di coppie (titolo sorgente, titolo destinazione)."""
+        nodes, titles = _intern(itertools.chain.from_iterable(edges))
+        return cls(titles, nodes[0::2], nodes[1::2])
+
+    @classmethod
+    def from_adjacency(cls, pages):
+        """Crea il grafo da coppie (titolo, iterabile dei titoli collegati), una per pagina.
+
+        È il formato del crawler e del vault: ogni pagina viene accodata con i suoi collegamenti
+        in blocco e i titoli sono internati tutti insieme, senza operazioni Python per ogni arco.
+        Come in from_edges, le pagine senza collegamenti non diventano nodi.
+        """
+        flat = []
+        counts = []
+        for page_title, links in pages:
+            start = len(flat)
+            flat.append(page_title)
+            flat.extend(links)
+            if len(flat) == start + 1:
+                flat.pop()
+            else:
+                counts.append(len(flat) - start - 1)
+        nodes, titles = _intern(flat)
+        counts = np.asarray(counts, dtype=np.int64)
+        starts = np.cumsum(counts + 1) - (counts + 1)
+        is_target = np.ones(len(nodes), dtype=bool)
+        is_target[starts] = False
+        return cls(titles, np.repeat(nodes[starts], counts), nodes[is_target])
+
+    @classmethod
+    def from_page_links(cls, page_links_map):
+        """Crea il grafo direttamente dall'output del crawler ({pagina: {'links': {...}}} o coppie)."""
+        items = page_links_map.items() if isinstance(page_links_map, dict) else page_links_map
+        return cls.from_adjacency((page_title, data['links']) for page_title, data in items)
+
+    @classmethod
+    def load_snapshot(cls, path, key):
+        """Carica un grafo salvato con save_snapshot; None se il file manca, è illeggibile o ha un'altra chiave."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as snapshot:
+                if str(snapshot["key"]) != key:
+                    return None
+                arrays = {name: snapshot[name] for name in CSR_ARRAYS}
+                titles = snapshot["titles"].tobytes().decode("utf-8")
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+            logging.warning(f"Ignored unreadable graph snapshot {path}: {e}")
+            return None
+        graph = cls.__new__(cls)
+        # I titoli sono salvati come un unico testo UTF-8 separato da "\n", molto più compatto di un array di stringhe
+        graph.titles = titles.split("\n") if len(arrays["out_indptr"]) > 1 else []
+        graph.ids = {title: node for node, title in enumerate(graph.titles)}
+        for name, array in arrays.items():
+            setattr(graph, name, array)
+        graph.edge_count = len(graph.out_indices)
+        return graph
+
+    def save_snapshot(self, path, key):
+        """Salva titoli e array CSR del grafo in un file .npz, in modo atomico (file temporaneo e rename)."""
+        titles = np.frombuffer("\n".join(self.titles).encode("utf-8"), dtype=np.uint8)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as snapshot_file:
+                np.savez(snapshot_file, key=np.array(key), titles=titles,
+                         **{name: getattr(self, name) for name in CSR_ARRAYS})
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def _from_snapshot(cls, source_path, key, build):
+        """Carica lo snapshot di `source_path` se la chiave coincide; altrimenti costruisce il grafo e lo salva."""
+        path = snapshot_path(source_path)
+        graph = cls.load_snapshot(path, key)
+        if graph is not None:
+            logging.info(f"Loaded graph snapshot {path}: {len(graph.titles)} nodes, {graph.edge_count} edges")
+            return graph
+        graph = build()
+        try:
+            graph.save_snapshot(path, key)
+        except OSError as e:
+            logging.warning(f"Could not save graph snapshot {path}: {e}")
+        return graph
+
+    @classmethod
+    def from_vault(cls, vault_dir, snapshot=True):
+        """Crea il grafo leggendo le note `[[Titolo]](url)` di un vault Obsidian.
+
+        Con `snapshot` il grafo viene caricato dallo snapshot .npz accanto al vault, se il vault
+        non è cambiato (vedi vault_key); altrimenti le note vengono rilette e lo snapshot rigenerato.
+        """
+        if snapshot:
+            return cls._from_snapshot(vault_dir, vault_key(vault_dir), lambda: cls.from_vault(vault_dir, snapshot=False))
+
+        def pages():
+            for root, _, files in os.walk(vault_dir):
+                for file_name in files:
+                    if not file_name.endswith(".md"):
+                        continue
+                    with open(os.path.join(root, file_name), "r", encoding="utf-8") as note:
+                        page_title = file_name[:-3]
+                        links = []
+                        for line in note:
+                            line = line.rstrip("\n")
+                            if line.startswith("# "):
+                                page_title = line[2:]
+                            elif line.startswith("- [[") and line.endswith(")"):
+                                # "- [[Titolo]](url)": operazioni su stringhe, più veloci di una regex
+                                end = line.find("]](", 5)
+                                if end > 0 and end + 4 < len(line):
+                                    links.append(line[4:end])
+                    yield page_title, links
+        graph = cls.from_adjacency(pages())
+        logging.info(f"Loaded graph from {vault_dir}: {len(graph.titles)} nodes, {graph.edge_count} edges")
+        return graph
+
+    @classmethod
+    def from_export(cls, path, export_format=None, snapshot=True):
+        """Crea il grafo da un'esportazione di program.py --export, con una sola lettura.
+
+        Con `snapshot` il grafo viene caricato dallo snapshot .npz accanto all'esportazione, se il
+        suo contenuto non è cambiato; altrimenti l'esportazione viene riletta e lo snapshot rigenerato.
+        """
+        if snapshot:
+            return cls._from_snapshot(path, export_key(path),
+                                      lambda: cls.from_export(path, export_format=export_format, snapshot=False))
+        pages, _ = read_export(path, export_format=export_format)
+        return cls.from_page_links(pages)
+
+    def node(self, title):
+        if title not in self.ids:
+            raise KeyError(f"Titolo non presente nel grafo: {title}")
+        return self.ids[title]
+
+    def out_neighbors(self, node):
+        return self.out_indices[self.out_indptr[node]:self.out_indptr[node + 1]]
+
+    def in_neighbors(self, node):
+        return self.in_indices[self.in_indptr[node]:self.in_indptr[node + 1]]
+
+    def out_degree(self):
+        return np.diff(self.out_indptr)
+
+    def in_degree(self):
+        return np.diff(self.in_indptr)
+
+    def _top(self, scores, top, exclude=()):
+        scores = np.asarray(scores, dtype=np.float64).copy()
+        for node in exclude:
+            scores[node] = -np.inf
+        top = min(top, len(scores))
+        best = np.argpartition(-scores, top - 1)[:top] if top else np.empty(0, dtype=np.int64)
+        best = best[np.lexsort((best, -scores[best]))]
+        return [(self.titles[node], scores[node].item()) for node in best if scores[node] > 0]
+
+    def shared_neighbors(self, title_a, title_b):
+        """Restituisce i titoli collegati sia da `title_a` sia da `title_b`."""
+        shared = np.intersect1d(self.out_neighbors(self.node(title_a)), self.out_neighbors(self.node(title_b)))
+        return sorted(self.titles[node] for node in shared)
+
+    def cocitation(self, title, top=10):
+        """Classifica i titoli più spesso collegati dalle stesse pagine che collegano `title`."""
+        node = self.node(title)
+        cociting = _gather(self.out_indptr, self.out_indices, self.in_neighbors(node))
+        return self._top(np.bincount(cociting, minlength=len(self.titles)), top, exclude=(node,))
+
+    def similar(self, title, top=10):
+        """Classifica le pagine per numero di collegamenti in comune con `title` (es. casi simili)."""
+        node = self.node(title)
+        coupled = _gather(self.in_indptr, self.in_indices, self.out_neighbors(node))
+        return self._top(np.bincount(coupled, minlength=len(self.titles)), top, exclude=(node,))
+
+    def top_degree(self, top=10, direction="in"):
+        """Classifica i titoli per grado entrante (`in`), uscente (`out`) o totale (`all`)."""
+        if direction == "in":
+            degree = self.in_degree()
+        elif direction == "out":
+            degree = self.out_degree()
+        else:
+            degree = self.in_degree() + self.out_degree()
+        return self._top(degree, top)
+
+    def pagerank(self, damping=0.85, tol=1e-8, max_iter=100):
+        """Calcola il PageRank di tutti i nodi con il metodo delle potenze; restituisce un array."""
+        node_count = len(self.titles)
+        if node_count == 0:
+            return np.empty(0)
+        out_degree = self.out_degree()
+        edge_sources = np.repeat(np.arange(node_count, dtype=np.int32), out_degree)
+        dangling = out_degree == 0
+        safe_degree = np.where(dangling, 1, out_degree)
+        ranks = np.full(node_count, 1.0 / node_count)
+        for _ in range(max_iter):
+            contributions = (ranks / safe_degree)[edge_sources]
+            new_ranks = np.bincount(self.out_indices, weights=contributions, minlength=node_count)
+            new_ranks = damping * (new_ranks + ranks[dangling].sum() / node_count) + (1 - damping) / node_count
+            delta = np.abs(new_ranks - ranks).sum()
+            ranks = new_ranks
+            if delta < tol:
+                break
+        return ranks
+
+    def top_pagerank(self, top=10, **kwargs):
+        return self._top(self.pagerank(**kwargs), top)
+
+    def shortest_path(self, title_a, title_b, directed=False):
+        """Restituisce il percorso più breve da `title_a` a `title_b`, o None se non esiste.
+
+        Di default gli archi sono percorsi in entrambi i versi: due persone citate dallo stesso
+        caso risultano così a distanza 2.
+        """
+        source = self.node(title_a)
+        target = self.node(title_b)
+        parents = np.full(len(self.titles), -1, dtype=np.int64)
+        parents[source] = source
+        frontier = np.array([source], dtype=np.int64)
+        while len(frontier) and parents[target] < 0:
+            # BFS a livelli: per ogni nodo raggiunto si memorizza un genitore del livello precedente
+            owners = [np.repeat(frontier, np.diff(self.out_indptr)[frontier])]
+            reached = [_gather(self.out_indptr, self.out_indices, frontier)]
+            if not directed:
+                owners.append(np.repeat(frontier, np.diff(self.in_indptr)[frontier]))
+                reached.append(_gather(self.in_indptr, self.in_indices, frontier))
+            owners = np.concatenate(owners)
+            reached = np.concatenate(reached).astype(np.int64)
+            new = parents[reached] < 0
+            reached, first = np.unique(reached[new], return_index=True)
+            parents[reached] = owners[new][first]
+            frontier = reached
+        if parents[target] < 0:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(int(parents[path[-1]]))
+        return [self.titles[node] for node in reversed(path)]
+
+
+def _print_ranking(ranking):
+    for title, score in ranking:
+        print(f"{score:.6g}\t{title}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interroga il grafo dei collegamenti del vault Obsidian.")
+    parser.add_argument("--vault", default="ObsidianNotes", help="Cartella del vault da cui costruire il grafo.")
+    parser.add_argument("--export", default=None, help="Costruisce il grafo da un'esportazione di program.py --export invece che dal vault.")
+    parser.add_argument("--top", type=int, default=10, help="Numero di risultati delle classifiche.")
+    parser.add_argument("--rebuild", action="store_true", help=f"Ricostruisce il grafo dalle note o dall'esportazione ignorando lo snapshot {SNAPSHOT_SUFFIX}, che viene rigenerato.")
+    parser.add_argument("--verbose", action="store_true", help="Abilita logging dettagliato.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    shared_parser = commands.add_parser("shared", help="Collegamenti in comune tra due pagine.")
+    shared_parser.add_argument("title_a")
+    shared_parser.add_argument("title_b")
+    commands.add_parser("cocitation", help="Titoli più spesso co-citati con un titolo.").add_argument("title")
+    commands.add_parser("similar", help="Pagine con più collegamenti in comune con una pagina.").add_argument("title")
+    degree_parser = commands.add_parser("degree", help="Titoli con grado più alto.")
+    degree_parser.add_argument("--direction", choices=["in", "out", "all"], default="in")
+    commands.add_parser("pagerank", help="Titoli con PageRank più alto.")
+    path_parser = commands.add_parser("path", help="Percorso più breve tra due titoli.")
+    path_parser.add_argument("title_a")
+    path_parser.add_argument("title_b")
+    path_parser.add_argument("--directed", action="store_true", help="Segue solo gli archi nel loro verso.")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    source = args.export or args.vault
+    if args.rebuild and os.path.exists(snapshot_path(source)):
+        os.remove(snapshot_path(source))
+    graph = LinkGraph.from_export(args.export) if args.export else LinkGraph.from_vault(args.vault)
+    try:
+        if args.command == "shared":
+            for title in graph.shared_neighbors(args.title_a, args.title_b):
+                print(title)
+        elif args.command == "cocitation":
+            _print_ranking(graph.cocitation(args.title, top=args.top))
+        elif args.command == "similar":
+            _print_ranking(graph.similar(args.title, top=args.top))
+        elif args.command == "degree":
+            _print_ranking(graph.top_degree(top=args.top, direction=args.direction))
+        elif args.command == "pagerank":
+            _print_ranking(graph.top_pagerank(top=args.top))
+        elif args.command == "path":
+            path = graph.shortest_path(args.title_a, args.title_b, directed=args.directed)
+            if path is None:
+                print("Nessun percorso trovato.")
+            else:
+                print(" -> ".join(path))
+    except KeyError as e:
+        logging.error(e.args[0])
+        sys.exit(1)
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+
+from metrics import METRICS
+
+INDEX_ENTRY_RE = re.compile(r"^- \[\[(.+)\]\]$")
+CATEGORY_LINE_PREFIX = "Pagina categoria Wikipedia: "
+
+
+def _create_temp_file(directory):
+    """Crea un file temporaneo nascosto in `directory` e ne restituisce (descrittore, percorso).
+
+    Come open(), chiede i permessi 0666 e lascia al kernel l'applicazione della umask del
+    processo (mkstemp creerebbe il file con 0600).
+    """
+    while True:
+        temp_path = os.path.join(directory, f".{secrets.token_hex(8)}.tmp")
+        try:
+            flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)  # O_BINARY: niente CRLF su Windows
+            return os.open(temp_path, flags, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+
+def render_note(page_title, data):
+    """Restituisce il contenuto Markdown della nota di una pagina."""
+    lines = [f"# {page_title}\n\n", f"Pagina Wikipedia: [{page_title}]({data['url']})\n\n"]
+    if data['links']:
+        lines.append("## Collegamenti:\n")
+        for link_title, link_url in data['links'].items():
+            lines.append(f"- [[{link_title}]]({link_url})\n")
+    return "".join(lines)
+
+
+def render_topic_index(topic, entries, category_line=None):
+    """Restituisce il contenuto Markdown del file indice di una categoria di output."""
+    lines = [f"# {topic}\n\n"]
+    if category_line:
+        lines.append(f"{category_line}\n\n")
+    lines.append("## Pagine associate:\n")
+    for entry in entries:
+        lines.append(f"- [[{entry}]]\n")
+    return "".join(lines)
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class MarkdownWriter:
+    """Scrive le note Obsidian una alla volta, appena ogni pagina è pronta.
+
+    Ogni file viene scritto in modo atomico (file temporaneo + rename) e solo se il suo
+    contenuto è cambiato, così Obsidian e gli strumenti di sincronizzazione reindicizzano
+    soltanto le note modificate. Gli indici di categoria vengono fusi con quelli esistenti.
+    """
+
+    def __init__(self, output_dir="ObsidianNotes", category_urls=None):
+        self.output_dir = output_dir
+        self.category_urls = category_urls if category_urls is not None else {}
+        self.topic_pages = {}
+        self.skipped_notes = set()  # (topic, titolo) delle note non scritte, escluse dagli indici
+        self.written = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _write_if_changed(self, file_path, content):
+        """Scrive `content` in `file_path` se diverso dal contenuto attuale; restituisce True se scritto."""
+        try:
+            with open(file_path, "r", encoding="utf-8", newline="") as current:
+                if content_hash(current.read()) == content_hash(content):
+                    return False
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(file_path)
+        fd, temp_path = _create_temp_file(directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as temp_file:
+                temp_file.write(content)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return True
+
+    def _count(self, outcome):
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+        METRICS.incr("files_total", result=outcome)
+
+    def _skip(self, topic, page_title):
+        with self.lock:
+            self.skipped_notes.add((topic, page_title))
+        self._count("skipped")
+        return False
+
+    def write_note(self, page_title, data):
+        """Scrive la nota di una pagina nella cartella del suo topic; restituisce True se la nota è su disco."""
+        category_dir = os.path.join(self.output_dir, data['topic'])
+        file_path = os.path.join(category_dir, f"{page_title}.md")
+        if os.path.dirname(file_path) != category_dir:
+            # Titoli come "AC/DC" non possono diventare nomi di file
+            logging.warning(f"Skipped note with invalid file name: {page_title}")
+            return self._skip(data['topic'], page_title)
+        os.makedirs(category_dir, exist_ok=True)
+        start = time.perf_counter()
+        try:
+            changed = self._write_if_changed(file_path, render_note(page_title, data))
+        except OSError as e:
+            logging.warning(f"Skipped note '{page_title}': {e}")
+            return self._skip(data['topic'], page_title)
+        METRICS.observe("stage_seconds", time.perf_counter() - start, stage="write_note")
+        self._count("written" if changed else "unchanged")
+        return True
+
+    def add_to_index(self, topic, page_title):
+        """Aggiunge una pagina all'indice del suo topic, nell'ordine di chiamata.
+
+        Va chiamato dopo write_note: le pagine la cui nota non è stata scritta restano fuori
+        dall'indice, che altrimenti conterrebbe un collegamento a una nota inesistente.
+        """
+        with self.lock:
+            if (topic, page_title) not in self.skipped_notes:
+                self.topic_pages.setdefault(topic, []).append(page_title)
+
+    def _merge_topic_index(self, topic, pages):
+        topic_file_path = os.path.join(self.output_dir, f"{topic}.md")
+        entries = []
+        category_line = None
+        if os.path.exists(topic_file_path):
+            with open(topic_file_path, "r", encoding="utf-8") as topic_md:
+                for line in topic_md:
+                    line = line.rstrip("\n")
+                    match = INDEX_ENTRY_RE.match(line)
+                    if match:
+                        entries.append(match.group(1))
+                    elif line.startswith(CATEGORY_LINE_PREFIX):
+                        category_line = line
+        if topic in self.category_urls:
+            category_line = f"{CATEGORY_LINE_PREFIX}[{topic}]({self.category_urls[topic]})"
+
+        known = set(entries)
+        for page in pages:
+            entry = os.path.join(topic, page)
+            if entry not in known:
+                known.add(entry)
+                entries.append(entry)
+        changed = self._write_if_changed(topic_file_path, render_topic_index(topic, entries, category_line))
+        self._count("written" if changed else "unchanged")
+
+    def finish(self):
+        """Aggiorna gli indici di categoria e restituisce il riepilogo {written, unchanged, skipped}."""
+        for topic, pages in self.topic_pages.items():
+            self._merge_topic_index(topic, pages)
+        summary = {'written': self.written, 'unchanged': self.unchanged, 'skipped': self.skipped}
+        logging.info(f"Markdown files in {self.output_dir}: {self.written} written, "
+                     f"{self.unchanged} unchanged, {self.skipped} skipped")
+        return summary
@@ -0,0 +1,203 @@
+import bisect
+import cProfile
+import json
+import logging
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Limiti superiori (secondi) dei bucket degli istogrammi di latenza, come nei client Prometheus
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # L'ultimo bucket è +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Stima del quantile: limite superiore del bucket che lo contiene."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """Registro thread-safe di contatori e istogrammi di latenza con etichette.
+
+    Condiviso da crawler ed etichettatura tramite l'istanza METRICS: ogni modulo registra le
+    proprie misure (richieste HTTP per host, hit della cache, byte, token, file scritti) e a fine
+    esecuzione il registro viene salvato in JSON o nel formato testuale di Prometheus.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def incr(self, name, value=1, **labels):
+        """Incrementa un contatore."""
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Registra un valore (di solito una durata in secondi) nell'istogramma `name`."""
+        key = (name, _label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Misura la durata del blocco `with` nell'istogramma `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """Restituisce tutte le misure come dizionario serializzabile in JSON."""
+        with self.lock:
+            counters = [{"name": name, "labels": dict(key), "value": value}
+                        for (name, key), value in sorted(self.counters.items())]
+            histograms = [{"name": name, "labels": dict(key), "count": h.count, "sum": h.sum,
+                           "mean": h.sum / h.count if h.count else None,
+                           "p50": h.quantile(0.5), "p95": h.quantile(0.95),
+                           "buckets": dict(zip([str(b) for b in h.buckets] + ["+Inf"], h.counts))}
+                          for (name, key), h in sorted(self.histograms.items())]
+        return {"started": self.started, "duration": time.time() - self.started,
+                "counters": counters, "histograms": histograms}
+
+    def to_prometheus(self):
+        """Restituisce le misure nel formato testuale di esposizione di Prometheus."""
+        lines = []
+        with self.lock:
+            declared = set()
+            for (name, key), value in sorted(self.counters.items()):
+                if name not in declared:
+                    declared.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_format_labels(key)} {value}")
+            for (name, key), h in sorted(self.histograms.items()):
+                if name not in declared:
+                    declared.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip([str(b) for b in h.buckets] + ["+Inf"], h.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {h.sum}")
+                lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Salva le misure in `path`: formato Prometheus per .prom/.txt, altrimenti JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith((".prom", ".txt")):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), f, indent=2, ensure_ascii=False)
+        logging.info(f"Metrics saved to {path}")
+
+    def log_summary(self):
+        """Scrive nel log la latenza totale e media di ogni istogramma, dalla più alta."""
+        for histogram in sorted(self.snapshot()["histograms"], key=lambda h: h["sum"], reverse=True):
+            labels = ",".join(f"{name}={value}" for name, value in histogram["labels"].items())
+            logging.info(f"{histogram['name']}{{{labels}}}: {histogram['count']} samples, "
+                         f"{histogram['sum']:.2f}s total, {histogram['mean'] * 1000:.1f}ms mean")
+
+
+METRICS = Metrics()
+
+
+class _ThreadProfiler:
+    """cProfile su tutti i thread: prima di Python 3.12 ogni thread ha il proprio profiler,
+    installato tramite threading.setprofile e unito agli altri alla fine."""
+
+    def __init__(self):
+        self.profiles = []
+        self.lock = threading.Lock()
+
+    def _start_thread(self, *args):
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._start_thread)
+        # Da Python 3.12 cProfile usa sys.monitoring e osserva già tutti i thread
+        profile = cProfile.Profile()
+        self.profiles.append(profile)
+        profile.enable()
+
+    def stop(self):
+        threading.setprofile(None)
+        self.profiles[0].disable()
+        stats = pstats.Stats(self.profiles[0], stream=sys.stderr)
+        for profile in self.profiles[1:]:
+            stats.add(profile)
+        return stats
+
+
+@contextmanager
+def profiling(path):
+    """Profila il blocco `with` (tutti i thread) e salva le statistiche di cProfile in `path`.
+
+    Il file .prof si apre con `python -m pstats`, snakeviz o, come flame graph, con flameprof
+    e gprof2dot; le 20 funzioni più costose vengono anche scritte nel log.
+    """
+    profiler = _ThreadProfiler()
+    profiler.start()
+    try:
+        yield
+    finally:
+        stats = profiler.stop()
+        stats.dump_stats(path)
+        logging.info(f"Profile saved to {path} ({len(profiler.profiles)} threads)")
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            stats.sort_stats("cumulative").print_stats(20)
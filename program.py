@@ -1,41 +1,163 @@
-import wikipediaapi
 import json
 import os
 import sys
 import argparse
+import asyncio
+import atexit
+import itertools
 import logging
-import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from crawl_export import CrawlExporter, read_export, EXPORT_FORMATS
+from crawl_journal import CrawlJournal, JOURNAL_FILE_NAME
+from markdown_writer import MarkdownWriter
+from metrics import METRICS, profiling
+from wiki_cache import WikiCache, DEFAULT_CACHE_TTL
+from wiki_client import WikiClient, OfflineCacheMiss, chunked, NAMESPACE_MAIN, DEFAULT_MAX_RPS, MAX_TITLES_PER_QUERY
+
+CRAWL_CHUNK_SIZE = 100  # Pagine i cui collegamenti restano in memoria contemporaneamente
 
 def extract_links_from_page(page_title, wiki_wiki):
     """Estrae tutti i link interni da una pagina di Wikipedia e i loro URL."""
     logging.info(f"Extracting links from page: {page_title}")
-    page = wiki_wiki.page(page_title)
-    time.sleep(0.1)  # Add delay
+    exists, page_links = wiki_wiki.page_links(page_title)
     links_with_urls = {}
-    if page.exists():
-        for link_title in page.links.keys():
-            link_page = wiki_wiki.page(link_title)
-            time.sleep(0.1)  # Add delay
-            if link_page.exists():
-                links_with_urls[link_title.strip()] = link_page.fullurl
+    if exists:
+        resolved = wiki_wiki.resolve_titles(link['title'] for link in page_links)
+        for link_title, link_url in resolved.items():
+            links_with_urls[link_title.strip()] = link_url
     logging.info(f"Found {len(links_with_urls)} links on page: {page_title}")
     return links_with_urls
 
-def get_category_pages_with_url(category_name, wiki_wiki):
-    """Recupera tutte le pagine all'interno di una categoria di Wikipedia e restituisce un dizionario con URL."""
+def crawl_page(page_title, seed, wiki_wiki, journal=None, writer=None):
+    """Estrae i link di una pagina, ne scrive subito la nota e, se è attivo un journal, la registra."""
+    with METRICS.timer("stage_seconds", stage="extract_links"):
+        links = extract_links_from_page(page_title, wiki_wiki)
+    data = {'links': links, 'topic': seed['topic'], 'url': seed['url']}
+    if writer:
+        writer.write_note(page_title, data)
+    if journal:
+        with METRICS.timer("stage_seconds", stage="journal"):
+            journal.record(page_title, data, wiki_wiki.page_revids.get(page_title))
+    METRICS.incr("pages_total", source="crawled")
+    return data
+
+async def _crawl_concurrently(pages, wiki_wiki, concurrency, journal, writer):
+    """Esegue crawl_page su più pagine in parallelo, al più `concurrency` alla volta."""
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        async def worker(page_title, seed):
+            async with semaphore:
+                return await loop.run_in_executor(executor, crawl_page, page_title, seed, wiki_wiki, journal, writer)
+        return await asyncio.gather(*(worker(page_title, seed) for page_title, seed in pages))
+
+def _journaled_pages(page_titles, wiki_wiki, journal, incremental):
+    """Restituisce i titoli già presenti nel journal che non è necessario rielaborare."""
+    journaled = [page_title for page_title in page_titles if page_title in journal]
+    if incremental and journaled:
+        infos = wiki_wiki.titles_info(journaled)
+        journaled = [page_title for page_title in journaled
+                     if page_title in infos and infos[page_title]['revid'] == journal.revid(page_title)]
+    return set(journaled)
+
+def crawl_pages(pages, wiki_wiki, concurrency=1, journal=None, incremental=False, writer=None, chunk_size=CRAWL_CHUNK_SIZE):
+    """Estrae i link di più pagine e restituisce le coppie (pagina, {'links', 'topic', 'url'}) nell'ordine di `pages`.
+
+    `pages` è una sequenza di coppie (pagina, {'url', 'topic'}), elaborata a blocchi di `chunk_size`
+    pagine così che in memoria restino solo i collegamenti del blocco corrente. Con `concurrency` > 1
+    le pagine di un blocco vengono elaborate in parallelo; la frequenza complessiva delle richieste
+    resta limitata dal token bucket condiviso di `wiki_wiki`. Le pagine già nel journal vengono
+    riutilizzate senza richieste, oppure, con `incremental`, solo se la loro revisione non è cambiata.
+    Con un `writer` ogni nota viene scritta appena la sua pagina è pronta.
+    """
+    pages = iter(pages)
+    while True:
+        chunk = list(itertools.islice(pages, chunk_size))
+        if not chunk:
+            break
+        reused = _journaled_pages([page_title for page_title, _ in chunk], wiki_wiki, journal, incremental) if journal else set()
+        if reused:
+            logging.info(f"Reusing {len(reused)}/{len(chunk)} pages from the crawl journal")
+        todo = [(page_title, seed) for page_title, seed in chunk if page_title not in reused]
+
+        if concurrency <= 1:
+            crawled = [crawl_page(page_title, seed, wiki_wiki, journal, writer) for page_title, seed in todo]
+        else:
+            logging.info(f"Extracting links from {len(todo)} pages with concurrency {concurrency}")
+            crawled = asyncio.run(_crawl_concurrently(todo, wiki_wiki, concurrency, journal, writer))
+        crawled = {page_title: data for (page_title, _), data in zip(todo, crawled)}
+
+        for page_title, seed in chunk:
+            if page_title in reused:
+                data = {'links': journal.get(page_title)['links'], 'topic': seed['topic'], 'url': seed['url']}
+                METRICS.incr("pages_total", source="journal")
+                if writer:
+                    writer.write_note(page_title, data)
+            else:
+                data = crawled[page_title]
+            yield page_title, data
+
+def crawl_breadth_first(seed_pages, wiki_wiki, depth=0, max_pages=None, concurrency=1, journal=None, incremental=False, writer=None):
+    """Espande il vault in ampiezza a partire dalle pagine seme, fino a `depth` salti.
+
+    `seed_pages` è un dizionario {pagina: {'url', 'topic'}} o un iterabile di coppie
+    (pagina, {'url', 'topic'}), consumato man mano (ad esempio da iter_category_pages); le pagine
+    scoperte ereditano il topic della pagina da cui sono state raggiunte. Ogni livello viene
+    elaborato con crawl_pages e i titoli già visitati (canonici, dopo i redirect) non vengono
+    riaccodati. Restituisce, man mano che sono pronte, le coppie (pagina, dati) come crawl_pages.
+    """
+    crawled_count = 0
+    visited = set()  # Serve solo a filtrare i collegamenti scoperti, quindi non all'ultimo livello
+    frontier = list(seed_pages.items()) if isinstance(seed_pages, dict) else seed_pages
+    for level in range(depth + 1):
+        if max_pages is not None:
+            remaining = max(max_pages - crawled_count, 0)
+            frontier = frontier[:remaining] if isinstance(frontier, list) else itertools.islice(frontier, remaining)
+        if isinstance(frontier, list):
+            if not frontier:
+                break
+            logging.info(f"Crawling level {level}: {len(frontier)} pages")
+        else:
+            logging.info(f"Crawling level {level}: streaming seed pages")
+        discovered = {}
+        for page_title, data in crawl_pages(frontier, wiki_wiki, concurrency=concurrency, journal=journal,
+                                            incremental=incremental, writer=writer):
+            crawled_count += 1
+            yield page_title, data
+            if level == depth:
+                continue
+            visited.add(page_title)
+            for info in wiki_wiki.titles_info(data['links']).values():
+                target = info['target']
+                if info['exists'] and info['ns'] == NAMESPACE_MAIN and target not in visited and target not in discovered:
+                    discovered[target] = {'url': info['fullurl'], 'topic': data['topic']}
+        # Un seme elencato dopo la pagina che lo collega è già stato visitato a questo livello
+        frontier = [(target, seed) for target, seed in discovered.items() if target not in visited]
+        visited.update(discovered)
+
+def iter_category_pages(category_name, wiki_wiki):
+    """Restituisce le pagine di una categoria di Wikipedia come coppie (titolo, URL), man mano che l'API le elenca.
+
+    I membri arrivano a blocchi (`cmcontinue`) e vengono risolti a gruppi di MAX_TITLES_PER_QUERY:
+    la prima pagina è disponibile dopo poche richieste e in memoria resta un solo blocco, anche
+    per categorie con decine di migliaia di membri.
+    """
     logging.info(f"Retrieving pages from category: {category_name}")
-    category = wiki_wiki.page(category_name)
-    time.sleep(0.1)  # Add delay
-    pages_with_urls = {}
-    if category.exists():
-        for member in category.categorymembers.values():
-            if member.namespace == wikipediaapi.Namespace.MAIN:
-                page = wiki_wiki.page(member.title)
-                time.sleep(0.1)  # Add delay
-                if page.exists():
-                    pages_with_urls[member.title] = page.fullurl
-    logging.info(f"Found {len(pages_with_urls)} pages in category: {category_name}")
-    return pages_with_urls
+    found = 0
+    for batch in wiki_wiki.iter_category_members(category_name):
+        titles = [member['title'] for member in batch if member['ns'] == NAMESPACE_MAIN]
+        for group in chunked(titles, MAX_TITLES_PER_QUERY):
+            with METRICS.timer("stage_seconds", stage="category_members"):
+                resolved = wiki_wiki.resolve_titles(group)
+            for page_title, page_url in resolved.items():
+                found += 1
+                yield page_title, page_url
+    if found:
+        logging.info(f"Found {found} pages in category: {category_name}")
+    else:
+        logging.warning(f"No pages found in category '{category_name}' or category does not exist.")
 
 def parse_input_file(file_path):
     """Legge il file di input e restituisce un dizionario {pagina: main_topic}."""
@@ -56,46 +178,16 @@ def parse_input_file(file_path):
     logging.info(f"Parsed {len(page_map)} entries from input file")
     return page_map
 
-def save_markdown_files(page_links_map, output_dir="ObsidianNotes"):
+def save_markdown_files(page_links_map, output_dir="ObsidianNotes", category_urls=None):
     """Crea file Markdown per Obsidian organizzati in cartelle di categoria."""
     logging.info(f"Saving Markdown files to directory: {output_dir}")
-    os.makedirs(output_dir, exist_ok=True)
-    topic_files = {}
-
+    writer = MarkdownWriter(output_dir, category_urls=category_urls)
     for page_title, data in page_links_map.items():
-        internal_links_with_urls = data['links']
-        page_url = data['url']
-        main_topic = data['topic']
-
-        category_dir = os.path.join(output_dir, main_topic)
-        os.makedirs(category_dir, exist_ok=True)
-        file_path = os.path.join(category_dir, f"{page_title}.md")
-
-        with open(file_path, "w", encoding="utf-8") as md_file:
-            md_file.write(f"# {page_title}\n\n")
-            md_file.write(f"Pagina Wikipedia: [{page_title}]({page_url})\n\n")
-            if internal_links_with_urls:
-                md_file.write("## Collegamenti:\n")
-                for link_title, link_url in internal_links_with_urls.items():
-                    md_file.write(f"- [[{link_title}]]({link_url})\n")
-
-        if main_topic not in topic_files:
-            topic_files[main_topic] = []
-        topic_files[main_topic].append(page_title)
-
-    for topic, pages in topic_files.items():
-        topic_file_path = os.path.join(output_dir, f"{topic}.md")
-        with open(topic_file_path, "w", encoding="utf-8") as topic_md:
-            topic_md.write(f"# {topic}\n\n")
-            if args.category and args.category[1] == topic:
-                category_url = f"https://it.wikipedia.org/wiki/Categoria:{category_name_for_url_pass_to_save.replace(' ', '_')}"
-                topic_md.write(f"Pagina categoria Wikipedia: [{topic}]({category_url})\n\n")
-            topic_md.write("## Pagine associate:\n")
-            for page in pages:
-                md_file_path = os.path.join(topic, page)
-                topic_md.write(f"- [[{md_file_path}]]\n")
-
+        writer.write_note(page_title, data)
+        writer.add_to_index(data['topic'], page_title)
+    summary = writer.finish()
     logging.info(f"Markdown files saved in directory: {output_dir}")
+    return summary
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Genera file Markdown da Wikipedia con tutti i suoi collegamenti interni.")
@@ -103,8 +195,25 @@ if __name__ == "__main__":
     group.add_argument("--list", help="Percorso del file di input con lista di URL e categorie.")
     group.add_argument("--category", nargs=2, metavar=('WIKIPEDIA_CATEGORY', 'OUTPUT_CATEGORY'), help="Nome Categoria Wikipedia e Nome Categoria Output. Es: --category Categoria:Orologeria Orologi")
     group.add_argument("--url", help="URL di Wikipedia e categoria nel formato <URL:Categoria>.")
+    group.add_argument("--from-export", help="Rigenera i file Markdown da un'esportazione creata con --export, senza accesso alla rete.")
     parser.add_argument("--user_agent", default="WikiLinksToMD_User", help="User agent per le richieste a Wikipedia API.")
+    parser.add_argument("--api_url", default=None, help="Endpoint MediaWiki API alternativo (es. un server locale di test).")
+    parser.add_argument("--cache-dir", default=None, help="Cartella della cache su disco delle risposte di Wikipedia (disattivata se omessa).")
+    parser.add_argument("--cache-ttl", type=int, default=DEFAULT_CACHE_TTL, help="Validità in secondi delle voci in cache prima del controllo di revisione (predefinito: 86400).")
+    parser.add_argument("--offline", action="store_true", help="Usa solo i dati in cache, senza richieste di rete. Richiede --cache-dir.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Numero di pagine elaborate in parallelo per --list e --category (predefinito: 1).")
+    parser.add_argument("--max-rps", type=float, default=DEFAULT_MAX_RPS, help="Numero massimo di richieste al secondo verso Wikipedia API, condiviso da tutti i worker (predefinito: 10).")
+    parser.add_argument("--depth", type=int, default=0, help="Profondità della visita in ampiezza a partire da --category o --url (predefinito: 0, solo le pagine seme).")
+    parser.add_argument("--max-pages", type=int, default=None, help="Numero massimo di pagine da elaborare nella visita in ampiezza.")
+    parser.add_argument("--journal", default=None, help=f"Percorso del journal di checkpoint del crawl (predefinito: <output_dir>/{JOURNAL_FILE_NAME}).")
+    parser.add_argument("--resume", action="store_true", help="Riprende un crawl interrotto saltando le pagine già registrate nel journal.")
+    parser.add_argument("--incremental", action="store_true", help="Rielabora solo le pagine del journal la cui revisione è cambiata.")
+    parser.add_argument("--fresh", action="store_true", help="Ricomincia il crawl da capo, sovrascrivendo il journal esistente.")
+    parser.add_argument("--export", default=None, help="Esporta anche pagine, topic, URL e archi del crawl in questo file (.jsonl, .sqlite, .parquet).")
+    parser.add_argument("--export-format", choices=EXPORT_FORMATS, default=None, help="Formato di --export e --from-export (predefinito: dedotto dall'estensione).")
     parser.add_argument("--output_dir", default="ObsidianNotes", help="Cartella di output per i file Markdown.")
+    parser.add_argument("--metrics", default=None, help="Salva contatori e latenze per stadio in questo file a fine esecuzione (JSON, oppure formato Prometheus con estensione .prom).")
+    parser.add_argument("--profile", default=None, help="Profila l'esecuzione con cProfile e salva le statistiche in questo file (.prof, apribile con snakeviz o flameprof).")
     parser.add_argument("--verbose", action="store_true", help="Abilita logging dettagliato.")
 
     args = parser.parse_args()
@@ -114,51 +223,106 @@ if __name__ == "__main__":
     else:
         logging.basicConfig(level=logging.WARNING)
 
-    wiki_wiki = wikipediaapi.Wikipedia(user_agent=args.user_agent, language='it')
-    page_links_map = {}
-    category_name_for_url_pass_to_save = None
+    if args.offline and not args.cache_dir:
+        parser.error("--offline richiede --cache-dir.")
+    if args.list and (args.depth or args.max_pages is not None):
+        parser.error("--depth e --max-pages sono disponibili solo con --category o --url.")
+    if args.fresh and (args.resume or args.incremental):
+        parser.error("--fresh non può essere usato con --resume o --incremental.")
+
+    # Metriche e profilo vengono salvati anche quando il programma termina con sys.exit
+    run_context = ExitStack()
+    atexit.register(run_context.close)
+    run_context.callback(METRICS.log_summary)
+    if args.metrics:
+        run_context.callback(METRICS.dump, args.metrics)
+    if args.profile:
+        run_context.enter_context(profiling(args.profile))
+
+    journal_path = args.journal or os.path.join(args.output_dir, JOURNAL_FILE_NAME)
+    try:
+        journal = None if args.from_export else CrawlJournal(journal_path, resume=args.resume or args.incremental,
+                                                             fresh=args.fresh)
+    except FileExistsError as e:
+        parser.error(f"{e}: usare --resume o --incremental per riprenderlo, --fresh per ricominciare da capo "
+                     f"oppure --journal per un altro percorso.")
+    cache = WikiCache(args.cache_dir, ttl=args.cache_ttl) if args.cache_dir else None
+    exporter = CrawlExporter(args.export, export_format=args.export_format) if args.export else None
+    wiki_wiki = WikiClient(args.user_agent, language='it', api_url=args.api_url, max_rps=args.max_rps,
+                           cache=cache, offline=args.offline, pool_size=max(args.concurrency, 1))
+    category_urls = {}
+    crawled_pages = []
 
     output_dir = args.output_dir
+    writer = MarkdownWriter(output_dir, category_urls=category_urls)
 
-    if args.list:
-        file_path = args.list
-        if not os.path.exists(file_path):
-            logging.error(f"File di input non trovato: {file_path}")
-            sys.exit(1)
-        page_map = parse_input_file(file_path)
-        for page_title, main_topic in page_map.items():
-            logging.info(f"Extracting links from file: {page_title}")
-            links = extract_links_from_page(page_title, wiki_wiki)
-            page_links_map[page_title] = {'links': links, 'topic': main_topic, 'url': f"https://it.wikipedia.org/wiki/{page_title.replace(' ', '_')}"}
-
-    elif args.category:
-        category_name_arg = args.category
-        if len(category_name_arg) != 2:
-            logging.error("Errore: --category richiede due argomenti: NOME_CATEGORIA_WIKIPEDIA NOME_CATEGORIA_OUTPUT.")
-            sys.exit(1)
-        category_wiki_name, main_topic = category_name_arg
-        category_name_for_url_pass_to_save = category_wiki_name
-
-        pages_with_urls = get_category_pages_with_url(category_wiki_name, wiki_wiki)
-        if not pages_with_urls:
-            logging.warning(f"No pages found in category '{category_wiki_name}' or category does not exist.")
-
-        for page_title, page_url in pages_with_urls.items():
-            logging.info(f"Extracting links from category '{category_wiki_name}': {page_title}")
-            links = extract_links_from_page(page_title, wiki_wiki)
-            page_links_map[page_title] = {'links': links, 'topic': main_topic, 'url': page_url}
-
-    elif args.url:
-        url_category_arg = args.url
-        parts = url_category_arg.rsplit(":", 1)
-        if len(parts) != 2:
-            logging.error("Errore: Formato URL non valido. Usare URL:Categoria.")
-            sys.exit(1)
-        wikipedia_url, main_topic = parts
-        page_title = wikipedia_url.split("/")[-1].replace("_", " ")
-        logging.info(f"Extracting links from URL: {page_title}")
-        links = extract_links_from_page(page_title, wiki_wiki)
-        page_links_map[page_title] = {'links': links, 'topic': main_topic, 'url': wikipedia_url}
+    try:
+        if args.list:
+            file_path = args.list
+            if not os.path.exists(file_path):
+                logging.error(f"File di input non trovato: {file_path}")
+                sys.exit(1)
+            page_map = parse_input_file(file_path)
+            pages = [(page_title, {'topic': main_topic, 'url': f"https://it.wikipedia.org/wiki/{page_title.replace(' ', '_')}"})
+                     for page_title, main_topic in page_map.items()]
+            crawled_pages = crawl_pages(pages, wiki_wiki, concurrency=args.concurrency, journal=journal,
+                                        incremental=args.incremental, writer=writer)
 
-    save_markdown_files(page_links_map, output_dir=output_dir)
+        elif args.category:
+            category_name_arg = args.category
+            if len(category_name_arg) != 2:
+                logging.error("Errore: --category richiede due argomenti: NOME_CATEGORIA_WIKIPEDIA NOME_CATEGORIA_OUTPUT.")
+                sys.exit(1)
+            category_wiki_name, main_topic = category_name_arg
+            category_urls[main_topic] = f"https://it.wikipedia.org/wiki/Categoria:{category_wiki_name.replace(' ', '_')}"
+
+            # I membri vengono elencati mentre le prime pagine sono già in elaborazione
+            seed_pages = ((page_title, {'url': page_url, 'topic': main_topic})
+                          for page_title, page_url in iter_category_pages(category_wiki_name, wiki_wiki))
+            crawled_pages = crawl_breadth_first(seed_pages, wiki_wiki, depth=args.depth, max_pages=args.max_pages,
+                                                concurrency=args.concurrency, journal=journal,
+                                                incremental=args.incremental, writer=writer)
+
+        elif args.url:
+            url_category_arg = args.url
+            parts = url_category_arg.rsplit(":", 1)
+            if len(parts) != 2:
+                logging.error("Errore: Formato URL non valido. Usare URL:Categoria.")
+                sys.exit(1)
+            wikipedia_url, main_topic = parts
+            page_title = wikipedia_url.split("/")[-1].replace("_", " ")
+            logging.info(f"Extracting links from URL: {page_title}")
+            seed_pages = {page_title: {'url': wikipedia_url, 'topic': main_topic}}
+            crawled_pages = crawl_breadth_first(seed_pages, wiki_wiki, depth=args.depth, max_pages=args.max_pages,
+                                                concurrency=args.concurrency, journal=journal,
+                                                incremental=args.incremental, writer=writer)
+
+        elif args.from_export:
+            exported_pages, exported_category_urls = read_export(args.from_export, export_format=args.export_format)
+            category_urls.update(exported_category_urls)
+            for page_title, data in exported_pages:
+                writer.write_note(page_title, data)
+            crawled_pages = exported_pages
+
+        # Le note vengono scritte man mano; qui si raccolgono solo i titoli per gli indici di categoria
+        for page_title, data in crawled_pages:
+            writer.add_to_index(data['topic'], page_title)
+            if exporter:
+                exporter.add_page(page_title, data)
+    except OfflineCacheMiss as e:
+        logging.error(f"Modalità offline: {e}")
+        sys.exit(1)
+    finally:
+        # Anche quando l'esecuzione si interrompe (es. OfflineCacheMiss) le pagine già elaborate
+        # finiscono negli indici e nell'esportazione, che viene chiusa correttamente
+        logging.info(f"Resolved {len(wiki_wiki.resolved)} unique titles for {wiki_wiki.title_lookups} title lookups")
+        if journal:
+            journal.close()
+        if cache:
+            cache.close()
+        if exporter:
+            exporter.close(category_urls)
+        writer.finish()
+
+    logging.info(f"Markdown files saved in directory: {output_dir}")
     logging.info("Processo completato!")
\ No newline at end of file
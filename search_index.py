@@ -0,0 +1,300 @@
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_index.sqlite3")  # Condiviso con LabelingLLM
+SCHEMA_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_CHARS = 200
+SOURCE_NOTE = "note"
+SOURCE_ARTICLE = "article"
+
+TOKEN_RE = re.compile(r"\w+")
+MARKDOWN_URL_RE = re.compile(r"\]\(https?://.*\)$")
+ACCENTED = {"a": "aàáâä", "e": "eèéêë", "i": "iìíîï", "o": "oòóôö", "u": "uùúûü", "c": "cç", "n": "nñ"}
+
+# Articoli, preposizioni e forme elise ("dell'", "nell'") restano fuori dall'indice
+STOPWORDS = frozenset("""
+    il lo la i gli le un uno una di a da in con su per tra fra e ed o od che chi non si ne ci vi
+    del dello della dei degli delle al allo alla ai agli alle dal dallo dalla dai dagli dalle
+    nel nello nella nei negli nelle sul sullo sulla sui sugli sulle dell all dall nell sull
+    quell quest è sono era erano stato stata stati essere ha hanno aveva come anche più ma se
+    questo questa quello quella suo sua suoi sue loro lui lei cui dopo
+""".split())
+
+
+def fold(text):
+    """Minuscole senza accenti: "Perché" e "perche" diventano lo stesso termine."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+FOLDED_STOPWORDS = frozenset(fold(word) for word in STOPWORDS)
+
+
+def tokenize(text):
+    """Divide il testo in termini: senza accenti, senza stopword e lettere isolate (l', d'), numeri inclusi."""
+    return [token for token in TOKEN_RE.findall(fold(text))
+            if (len(token) > 1 or token.isdigit()) and token not in FOLDED_STOPWORDS]
+
+
+def _term_pattern(term):
+    """Espressione regolare che trova `term` nel testo originale, con o senza accenti."""
+    return "".join(f"[{ACCENTED[char]}]" if char in ACCENTED else re.escape(char) for char in term)
+
+
+def note_text(markdown):
+    """Restituisce (titolo, testo) di una nota del vault, senza URL e sintassi Markdown."""
+    title = None
+    lines = []
+    for line in markdown.splitlines():
+        if line.startswith("# ") and title is None:
+            title = line[2:].strip()
+        line = MARKDOWN_URL_RE.sub("]", line.strip())
+        line = line.replace("[[", "").replace("]]", "").replace("[", "").replace("]", "").lstrip("#- ")
+        if line:
+            lines.append(line)
+    return title, "\n".join(lines)
+
+
+class SearchIndex:
+    """Indice invertito persistente (SQLite) con ranking BM25 su note del vault e articoli.
+
+    Ogni documento ha una chiave (il percorso della nota o l'URL canonico dell'articolo) e una
+    firma: aggiungere di nuovo un documento con la stessa firma non costa nulla, uno cambiato
+    sostituisce solo le proprie voci. Il testo originale è conservato per gli estratti dei risultati.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = threading.RLock()  # L'indice è aggiornato dai thread della pipeline di etichettatura
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # L'indice si ricostruisce dalle sorgenti: con uno schema diverso si riparte da zero
+            self.conn.executescript("DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS documents;")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                source TEXT NOT NULL,
+                title TEXT NOT NULL,
+                location TEXT,
+                metadata TEXT,
+                signature TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                indexed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);
+        """)
+
+    def _remove(self, doc_id):
+        self.conn.execute("DELETE FROM postings WHERE doc = ?", (doc_id,))
+        self.conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+    def _index(self, key, text, title, source, location, metadata, signature):
+        row = self.conn.execute("SELECT id, signature FROM documents WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            if row[1] == signature:
+                return False
+            self._remove(row[0])
+        counts = {}
+        terms = tokenize(f"{title}\n{text}")
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        cursor = self.conn.execute(
+            "INSERT INTO documents (key, source, title, location, metadata, signature, length, text, indexed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, source, title, location, json.dumps(metadata or {}, ensure_ascii=False), signature,
+             len(terms), text, time.time()),
+        )
+        self.conn.executemany("INSERT INTO postings (term, doc, tf) VALUES (?, ?, ?)",
+                              ((term, cursor.lastrowid, tf) for term, tf in counts.items()))
+        return True
+
+    def add_document(self, key, text, title, source=SOURCE_ARTICLE, location=None, metadata=None, signature=None):
+        """Indicizza (o reindicizza, se è cambiato) un documento; restituisce False se era già aggiornato.
+
+        Senza `signature` la firma è l'hash del testo e dei metadati.
+        """
+        if signature is None:
+            signature = hashlib.sha1(json.dumps([title, text, metadata], ensure_ascii=False).encode("utf-8")).hexdigest()
+        with self.lock, self.conn:
+            return self._index(key, text, title, source, location, metadata, signature)
+
+    def remove_document(self, key):
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT id FROM documents WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._remove(row[0])
+
+    def update_vault(self, vault_dir):
+        """Allinea l'indice alle note del vault; restituisce (aggiornate, rimosse, invariate).
+
+        Sono indicizzate le note delle cartelle di categoria, non gli indici di categoria alla
+        radice del vault. Una nota è reindicizzata solo se data di modifica o dimensione sono
+        cambiate; le note cancellate escono dall'indice.
+        """
+        updated = unchanged = 0
+        with self.lock, self.conn:
+            known = dict(self.conn.execute("SELECT key, signature FROM documents WHERE source = ?", (SOURCE_NOTE,)))
+            seen = set()
+            for root, _, files in os.walk(vault_dir):
+                if root == vault_dir:
+                    continue
+                for file_name in sorted(files):
+                    if not file_name.endswith(".md"):
+                        continue
+                    file_path = os.path.join(root, file_name)
+                    key = os.path.relpath(file_path, vault_dir).replace(os.sep, "/")
+                    stat = os.stat(file_path)
+                    signature = f"{stat.st_mtime_ns}:{stat.st_size}"
+                    seen.add(key)
+                    if known.get(key) == signature:
+                        unchanged += 1
+                        continue
+                    with open(file_path, "r", encoding="utf-8") as note:
+                        title, text = note_text(note.read())
+                    self._index(key, text, title or file_name[:-3], SOURCE_NOTE, file_path,
+                                {"topic": os.path.basename(root)}, signature)
+                    updated += 1
+            removed = [key for key in known if key not in seen]
+            for key in removed:
+                self._remove(self.conn.execute("SELECT id FROM documents WHERE key = ?", (key,)).fetchone()[0])
+        logging.info(f"Vault {vault_dir} indexed: {updated} updated, {len(removed)} removed, {unchanged} unchanged")
+        return updated, len(removed), unchanged
+
+    def stats(self):
+        """Restituisce numero di documenti per sorgente e numero di termini distinti."""
+        with self.lock:
+            sources = dict(self.conn.execute("SELECT source, COUNT(*) FROM documents GROUP BY source"))
+            terms = self.conn.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+        return {"documents": sources, "terms": terms}
+
+    def search(self, query, limit=10, source=None):
+        """Restituisce i `limit` documenti più pertinenti per `query` secondo BM25.
+
+        Ogni risultato è un dizionario con 'key', 'source', 'title', 'location', 'metadata',
+        'score' e 'snippet', l'estratto del testo con più termini della query.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        scores = {}
+        with self.lock:
+            doc_count, average_length = self.conn.execute("SELECT COUNT(*), AVG(length) FROM documents").fetchone()
+            if not doc_count:
+                return []
+            average_length = average_length or 1
+            for term in terms:
+                df = self.conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+                if not df:
+                    continue
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                sql = ("SELECT p.doc, p.tf, d.length FROM postings p JOIN documents d ON d.id = p.doc "
+                       "WHERE p.term = ?")
+                params = (term,)
+                if source is not None:
+                    sql += " AND d.source = ?"
+                    params += (source,)
+                for doc_id, tf, length in self.conn.execute(sql, params):
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+            results = []
+            for doc_id, score in heapq.nlargest(limit, scores.items(), key=lambda item: item[1]):
+                key, doc_source, title, location, metadata, text = self.conn.execute(
+                    "SELECT key, source, title, location, metadata, text FROM documents WHERE id = ?", (doc_id,)
+                ).fetchone()
+                results.append({"key": key, "source": doc_source, "title": title, "location": location,
+                                 "metadata": json.loads(metadata), "score": score, "snippet": snippet(text, terms)})
+        return results
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def snippet(text, terms, width=SNIPPET_CHARS):
+    """Estratto di `width` caratteri con più termini distinti della query, evidenziati tra « »."""
+    pattern = re.compile(r"\b(?:" + "|".join(_term_pattern(term) for term in terms) + r")\b", re.IGNORECASE)
+    matches = [(match.start(), match.end(), fold(match.group())) for match in itertools.islice(pattern.finditer(text), 200)]
+    start = 0
+    if matches:
+        best = 0
+        for position, _, _ in matches:
+            covered = {term for other, end, term in matches if position <= other and end <= position + width}
+            if len(covered) > best:
+                best = len(covered)
+                start = max(position - width // 4, 0)
+    end = min(start + width, len(text))
+    if start > 0:
+        start = text.find(" ", start, start + 20) + 1 or start  # Non tagliare la prima parola
+    excerpt = pattern.sub(lambda match: f"«{match.group()}»", text[start:end])
+    excerpt = " ".join(excerpt.split())
+    return f"{'…' if start > 0 else ''}{excerpt}{'…' if end < len(text) else ''}"
+
+
+def _print_results(results):
+    for rank, result in enumerate(results, 1):
+        details = [result["source"]]
+        metadata = result["metadata"]
+        details += [str(metadata[field]) for field in ("topic", "stato", "luogo", "data") if metadata.get(field)]
+        print(f"{rank:>2}. {result['title']}  [{', '.join(details)}]  {result['score']:.2f}")
+        print(f"    {result['location'] or result['key']}")
+        print(f"    {result['snippet']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ricerca full-text (BM25) su note del vault e articoli etichettati.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help=f"File SQLite dell'indice (predefinito: {DEFAULT_INDEX_PATH}).")
+    parser.add_argument("--verbose", action="store_true", help="Abilita logging dettagliato.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    update_parser = commands.add_parser("update", help="Aggiorna l'indice con le note nuove o modificate del vault.")
+    update_parser.add_argument("--vault", default="ObsidianNotes", help="Cartella del vault da indicizzare.")
+    query_parser = commands.add_parser("query", help="Cerca casi per persone, luoghi, anni o altre parole.")
+    query_parser.add_argument("text", nargs="+")
+    query_parser.add_argument("--limit", type=int, default=10, help="Numero di risultati.")
+    query_parser.add_argument("--source", choices=[SOURCE_NOTE, SOURCE_ARTICLE], default=None,
+                              help="Limita la ricerca alle note del vault o agli articoli.")
+    commands.add_parser("stats", help="Documenti e termini presenti nell'indice.")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    index = SearchIndex(args.index)
+    try:
+        if args.command == "update":
+            updated, removed, unchanged = index.update_vault(args.vault)
+            print(f"{updated} note indicizzate, {removed} rimosse, {unchanged} invariate.")
+        elif args.command == "query":
+            start = time.perf_counter()
+            results = index.search(" ".join(args.text), limit=args.limit, source=args.source)
+            elapsed = (time.perf_counter() - start) * 1000
+            _print_results(results)
+            print(f"{len(results)} risultati in {elapsed:.1f} ms.")
+        elif args.command == "stats":
+            print(json.dumps(index.stats(), indent=2, ensure_ascii=False))
+    finally:
+        index.close()
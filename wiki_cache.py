@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import METRICS
+
+DEFAULT_CACHE_TTL = 24 * 60 * 60  # Un giorno, in secondi
+SCHEMA_VERSION = 3
+
+
+class WikiCache:
+    """Cache SQLite su disco per esistenza, URL, collegamenti e membri di categoria delle pagine.
+
+    Ogni voce ha un TTL: una voce scaduta dei collegamenti viene riutilizzata se la revisione
+    della pagina non è cambiata, altrimenti viene scartata e riscaricata.
+    """
+
+    def __init__(self, cache_dir, ttl=DEFAULT_CACHE_TTL):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "wiki_cache.sqlite3")
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()  # La connessione è condivisa tra i thread del crawler
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # È solo una cache: con uno schema diverso la si ricostruisce da zero
+            self.conn.executescript("DROP TABLE IF EXISTS titles; DROP TABLE IF EXISTS links; DROP TABLE IF EXISTS categories; "
+                                    "DROP TABLE IF EXISTS category_batches;")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS titles (
+                title TEXT PRIMARY KEY,
+                page_exists INTEGER NOT NULL,
+                fullurl TEXT,
+                revid INTEGER,
+                ns INTEGER,
+                target TEXT,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS links (
+                title TEXT PRIMARY KEY,
+                page_exists INTEGER NOT NULL,
+                revid INTEGER,
+                links TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS categories (
+                title TEXT PRIMARY KEY,
+                page_exists INTEGER NOT NULL,
+                batches INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS category_batches (
+                title TEXT NOT NULL,
+                batch INTEGER NOT NULL,
+                members TEXT NOT NULL,
+                PRIMARY KEY (title, batch)
+            );
+        """)
+        logging.info(f"Using Wikipedia cache: {self.path} (ttl {ttl}s)")
+
+    def is_fresh(self, fetched_at):
+        """Indica se una voce salvata al tempo `fetched_at` è ancora entro il TTL."""
+        return time.time() - fetched_at < self.ttl
+
+    def _count(self, entry):
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        METRICS.incr("cache_lookups_total", cache="wikipedia", result="miss" if entry is None else "hit")
+        return entry
+
+    def get_title(self, title):
+        """Restituisce {'exists', 'fullurl', 'revid', 'ns', 'target', 'fetched_at'} per un titolo, o None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT page_exists, fullurl, revid, ns, target, fetched_at FROM titles WHERE title = ?", (title,)
+            ).fetchone()
+            if row is None:
+                return self._count(None)
+            return self._count({"exists": bool(row[0]), "fullurl": row[1], "revid": row[2], "ns": row[3],
+                                "target": row[4], "fetched_at": row[5]})
+
+    def put_titles(self, infos):
+        """Salva {titolo: {'exists', 'fullurl', 'revid', 'ns', 'target'}} e invalida i collegamenti di revisioni superate."""
+        with self.lock:
+            now = time.time()
+            for title, info in infos.items():
+                self.conn.execute(
+                    "DELETE FROM links WHERE title = ? AND (revid IS NOT ? OR page_exists != ?)",
+                    (title, info["revid"], int(info["exists"])),
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO titles (title, page_exists, fullurl, revid, ns, target, fetched_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (title, int(info["exists"]), info["fullurl"], info["revid"], info["ns"], info["target"], now),
+                )
+            self.conn.commit()
+
+    def get_links(self, title):
+        """Restituisce {'exists', 'revid', 'links', 'fetched_at'} per una pagina, o None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT page_exists, revid, links, fetched_at FROM links WHERE title = ?", (title,)
+            ).fetchone()
+            if row is None:
+                return self._count(None)
+            return self._count({"exists": bool(row[0]), "revid": row[1], "links": json.loads(row[2]), "fetched_at": row[3]})
+
+    def put_links(self, title, exists, revid, links):
+        """Salva la lista dei collegamenti ({'title', 'ns'}) di una pagina insieme alla sua revisione."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO links (title, page_exists, revid, links, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (title, int(exists), revid, json.dumps(links, ensure_ascii=False), time.time()),
+            )
+            self.conn.commit()
+
+    def touch_links(self, title):
+        """Rinnova il TTL dei collegamenti di una pagina la cui revisione non è cambiata."""
+        with self.lock:
+            self.conn.execute("UPDATE links SET fetched_at = ? WHERE title = ?", (time.time(), title))
+            self.conn.commit()
+
+    def get_category(self, title):
+        """Restituisce {'exists', 'batches', 'fetched_at'} per una categoria enumerata per intero, o None.
+
+        I membri si leggono un blocco alla volta con iter_category_batches.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT page_exists, batches, fetched_at FROM categories WHERE title = ?", (title,)
+            ).fetchone()
+            if row is None:
+                return self._count(None)
+            return self._count({"exists": bool(row[0]), "batches": row[1], "fetched_at": row[2]})
+
+    def iter_category_batches(self, title, batches):
+        """Restituisce uno dopo l'altro i `batches` blocchi di membri {'title', 'ns'} salvati per una categoria."""
+        for batch in range(batches):
+            with self.lock:
+                row = self.conn.execute(
+                    "SELECT members FROM category_batches WHERE title = ? AND batch = ?", (title, batch)
+                ).fetchone()
+            yield json.loads(row[0]) if row else []
+
+    def put_category_batch(self, title, batch, members):
+        """Salva un blocco di membri (una risposta dell'API); il primo blocco cancella quelli precedenti.
+
+        La categoria diventa leggibile dalla cache solo con finish_category, a enumerazione completa.
+        """
+        with self.lock:
+            if batch == 0:
+                self.conn.execute("DELETE FROM categories WHERE title = ?", (title,))
+                self.conn.execute("DELETE FROM category_batches WHERE title = ?", (title,))
+            self.conn.execute("INSERT OR REPLACE INTO category_batches (title, batch, members) VALUES (?, ?, ?)",
+                              (title, batch, json.dumps(members, ensure_ascii=False)))
+            self.conn.commit()
+
+    def finish_category(self, title, exists, batches):
+        """Segna come completa l'enumerazione di una categoria salvata in `batches` blocchi."""
+        with self.lock:
+            if batches == 0:
+                self.conn.execute("DELETE FROM category_batches WHERE title = ?", (title,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO categories (title, page_exists, batches, fetched_at) VALUES (?, ?, ?, ?)",
+                (title, int(exists), batches, time.time()),
+            )
+            self.conn.commit()
+
+    def close(self):
+        logging.info(f"Wikipedia cache: {self.hits} hits, {self.misses} misses")
+        self.conn.close()
@@ -0,0 +1,308 @@
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+from metrics import METRICS
+
+WIKI_API_URL = "https://{language}.wikipedia.org/w/api.php"
+MAX_TITLES_PER_QUERY = 50  # Limite MediaWiki per i client non-bot
+NAMESPACE_MAIN = 0
+DEFAULT_MAX_RPS = 10.0  # Equivalente al vecchio ritardo fisso di 0,1 secondi
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class OfflineCacheMiss(Exception):
+    """Sollevata in modalità offline quando un dato richiesto non è presente in cache."""
+
+
+def chunked(items, size):
+    """Divide una lista in blocchi consecutivi di al più `size` elementi."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class TokenBucket:
+    """Limitatore di frequenza token-bucket condiviso tra thread.
+
+    `acquire()` prenota un token e attende il tempo necessario: i token possono andare in
+    negativo, così più thread in attesa vengono serviti in ordine senza superare `rate`.
+    """
+
+    def __init__(self, rate, capacity=1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            METRICS.observe("rate_limit_wait_seconds", wait, limiter="mediawiki")
+            time.sleep(wait)
+
+
+class WikiClient:
+    """Client minimale per la MediaWiki Action API, con richieste multi-titolo e cache opzionale.
+
+    Se è presente una `WikiCache` tutte le letture passano prima dalla cache; con `offline=True`
+    i dati vengono serviti esclusivamente dalla cache, senza alcuna richiesta di rete.
+    """
+
+    def __init__(self, user_agent, language="it", api_url=None, max_rps=DEFAULT_MAX_RPS, session=None,
+                 cache=None, offline=False, max_retries=4, backoff=1.0, pool_size=10):
+        self.api_url = api_url or WIKI_API_URL.format(language=language)
+        self.limiter = TokenBucket(max_rps)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+        self.session.headers["User-Agent"] = user_agent
+        self.cache = cache
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.resolved = {}  # Tabella dei titoli risolti, condivisa da tutte le pagine del crawl
+        self.in_flight = {}
+        self.title_lookups = 0
+        self.page_revids = {}  # Revisione delle pagine di cui sono stati letti i collegamenti
+        if offline and cache is None:
+            raise ValueError("La modalità offline richiede una cache.")
+
+    def _get(self, params):
+        """Esegue una singola richiesta GET all'API e restituisce il JSON.
+
+        Ogni tentativo passa dal limitatore globale; le risposte 429/5xx e gli errori di rete
+        vengono ritentati con backoff esponenziale, rispettando `Retry-After` se presente.
+        """
+        params = dict(params, format="json", formatversion=1)
+        host = urlparse(self.api_url).netloc
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(self.api_url, params=params, timeout=30)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                METRICS.incr("http_requests_total", host=host, status="error")
+                if attempt == self.max_retries:
+                    raise
+                wait = self.backoff * 2 ** attempt
+                logging.warning(f"Request failed ({e}), retrying in {wait:.1f}s")
+            else:
+                METRICS.observe("http_request_seconds", time.perf_counter() - start, host=host)
+                METRICS.incr("http_requests_total", host=host, status=response.status_code)
+                METRICS.incr("http_response_bytes_total", len(response.content), host=host)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+                retry_after = response.headers.get("Retry-After", "")
+                wait = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt
+                logging.warning(f"HTTP {response.status_code} from MediaWiki API, retrying in {wait:.1f}s")
+            METRICS.observe("retry_wait_seconds", wait, host=host)
+            time.sleep(wait)
+
+    def query(self, params):
+        """Esegue una query seguendo i blocchi `continue` e restituisce ogni risposta parziale."""
+        continuation = {}
+        while True:
+            data = self._get(dict(params, action="query", **continuation))
+            if "error" in data:
+                raise RuntimeError(f"MediaWiki API error: {data['error'].get('info', data['error'])}")
+            yield data.get("query", {})
+            if "continue" not in data:
+                break
+            continuation = data["continue"]
+
+    def _is_usable(self, entry):
+        return entry is not None and (self.offline or self.cache.is_fresh(entry["fetched_at"]))
+
+    def _fetch_titles_info(self, batch):
+        """Interroga l'API per un blocco di titoli e restituisce {titolo: info}.
+
+        `info` contiene 'exists', 'fullurl', 'revid', 'ns' e 'target', il titolo canonico
+        ottenuto dopo normalizzazione e redirect.
+        """
+        aliases = {}
+        pages = {}
+        for chunk in self.query({"titles": "|".join(batch), "prop": "info", "inprop": "url", "redirects": 1}):
+            for key in ("normalized", "converted", "redirects"):
+                for entry in chunk.get(key, []):
+                    aliases[entry["from"]] = entry["to"]
+            for page in chunk.get("pages", {}).values():
+                pages.setdefault(page["title"], {}).update(page)
+
+        infos = {}
+        for title in batch:
+            target = title
+            seen = set()
+            while target in aliases and target not in seen:
+                seen.add(target)
+                target = aliases[target]
+            page = pages.get(target, {})
+            exists = page.get("pageid", 0) > 0 and "fullurl" in page
+            infos[title] = {
+                "exists": exists,
+                "fullurl": page["fullurl"] if exists else None,
+                "revid": page.get("lastrevid") if exists else None,
+                "ns": page.get("ns"),
+                "target": target,
+            }
+        return infos
+
+    def _claim_titles(self, titles):
+        """Suddivide i titoli tra già risolti, in corso in un altro thread e da risolvere ora."""
+        claimed = []
+        pending = []
+        with self.lock:
+            for title in titles:
+                self.title_lookups += 1
+                if title in self.resolved:
+                    continue
+                if title in self.in_flight:
+                    pending.append(self.in_flight[title])
+                else:
+                    self.in_flight[title] = threading.Event()
+                    claimed.append(title)
+        return claimed, pending
+
+    def _lookup_titles(self, titles, batch_size):
+        """Risolve i titoli indicati passando dalla cache su disco e poi dall'API."""
+        infos = {}
+        to_fetch = []
+        for title in titles:
+            entry = self.cache.get_title(title) if self.cache else None
+            if self.cache and self._is_usable(entry):
+                infos[title] = entry
+            else:
+                to_fetch.append(title)
+
+        if to_fetch and self.offline:
+            raise OfflineCacheMiss(f"{len(to_fetch)} titoli non presenti in cache (es. '{to_fetch[0]}').")
+
+        for batch in chunked(to_fetch, batch_size):
+            fetched = self._fetch_titles_info(batch)
+            if self.cache:
+                self.cache.put_titles(fetched)
+            infos.update(fetched)
+        if to_fetch:
+            logging.info(f"Fetched info for {len(to_fetch)}/{len(titles)} titles in {-(-len(to_fetch) // batch_size)} batch queries")
+        return infos
+
+    def titles_info(self, titles, batch_size=MAX_TITLES_PER_QUERY):
+        """Restituisce {titolo: info} per ogni titolo (vedi `_fetch_titles_info`).
+
+        I titoli vengono cercati nell'ordine nella tabella in memoria condivisa da tutto il crawl,
+        nella cache su disco e infine nell'API: ogni titolo distinto viene risolto una sola volta,
+        anche quando più thread lo richiedono contemporaneamente.
+        """
+        titles = list(dict.fromkeys(titles))
+        claimed, pending = self._claim_titles(titles)
+        try:
+            infos = self._lookup_titles(claimed, batch_size) if claimed else {}
+            with self.lock:
+                self.resolved.update(infos)
+        finally:
+            with self.lock:
+                for title in claimed:
+                    self.in_flight.pop(title).set()
+        for event in pending:
+            event.wait()
+
+        missing = [title for title in titles if title not in self.resolved]
+        if missing:
+            # Titoli la cui risoluzione è fallita in un altro thread: li si risolve qui
+            infos = self._lookup_titles(missing, batch_size)
+            with self.lock:
+                self.resolved.update(infos)
+        return {title: self.resolved[title] for title in titles if title in self.resolved}
+
+    def resolve_titles(self, titles, batch_size=MAX_TITLES_PER_QUERY):
+        """Verifica esistenza, segue i redirect e recupera l'URL canonico di più titoli per richiesta.
+
+        Restituisce un dizionario {titolo: fullurl} con i soli titoli esistenti, nello stesso
+        ordine di `titles`: è lo stesso risultato di `wiki_wiki.page(titolo).exists()` e
+        `.fullurl` interrogati uno per volta.
+        """
+        infos = self.titles_info(titles, batch_size=batch_size)
+        return {title: info["fullurl"] for title, info in infos.items() if info["exists"]}
+
+    def page_links(self, title):
+        """Restituisce (esiste, lista di {'title', 'ns'} dei collegamenti) per una pagina, seguendo i redirect."""
+        if self.cache:
+            entry = self.cache.get_links(title)
+            if self._is_usable(entry):
+                self.page_revids[title] = entry["revid"]
+                return entry["exists"], entry["links"]
+            if self.offline:
+                raise OfflineCacheMiss(f"Collegamenti di '{title}' non presenti in cache.")
+            if entry is not None:
+                # Voce scaduta: se la revisione è la stessa i collegamenti sono ancora validi
+                info = self.titles_info([title]).get(title)
+                if info is not None and info["exists"] == entry["exists"] and info["revid"] == entry["revid"]:
+                    self.cache.touch_links(title)
+                    self.page_revids[title] = entry["revid"]
+                    return entry["exists"], entry["links"]
+
+        exists = False
+        revid = None
+        links = []
+        params = {"titles": title, "prop": "info|links", "pllimit": "max", "redirects": 1}
+        for chunk in self.query(params):
+            for page in chunk.get("pages", {}).values():
+                if page.get("pageid", 0) > 0:
+                    exists = True
+                    revid = page.get("lastrevid", revid)
+                    links.extend({"title": link["title"], "ns": link["ns"]} for link in page.get("links", []))
+
+        if self.cache:
+            self.cache.put_links(title, exists, revid, links)
+        self.page_revids[title] = revid
+        return exists, links
+
+    def iter_category_members(self, category_name):
+        """Restituisce i membri di una categoria a blocchi (liste di {'title', 'ns'}), uno per risposta dell'API.
+
+        Segue `cmcontinue` senza accumulare la categoria: il primo blocco è disponibile dopo una
+        sola richiesta. Con la cache attiva ogni blocco viene salvato appena ricevuto e una
+        categoria già in cache viene riletta un blocco alla volta. Un'enumerazione interrotta
+        non viene riutilizzata. I membri di una categoria cambiano senza che cambi la revisione
+        della pagina di categoria, quindi in cache scadono solo per TTL.
+        """
+        if self.cache:
+            entry = self.cache.get_category(category_name)
+            if self._is_usable(entry):
+                yield from self.cache.iter_category_batches(category_name, entry["batches"])
+                return
+            if self.offline:
+                raise OfflineCacheMiss(f"Membri di '{category_name}' non presenti in cache.")
+
+        exists = False
+        batches = 0
+        params = {"titles": category_name, "prop": "info", "redirects": 1,
+                  "list": "categorymembers", "cmtitle": category_name, "cmlimit": "max"}
+        for chunk in self.query(params):
+            for page in chunk.get("pages", {}).values():
+                if page.get("pageid", 0) > 0:
+                    exists = True
+            batch = [{"title": member["title"], "ns": member["ns"]} for member in chunk.get("categorymembers", [])]
+            if batch:
+                if self.cache:
+                    self.cache.put_category_batch(category_name, batches, batch)
+                batches += 1
+                yield batch
+
+        if self.cache:
+            self.cache.finish_category(category_name, exists, batches)